@@ -0,0 +1,221 @@
+"""
+Concurrent retrieval of the chunks of every metadata category of a document.
+
+Each category runs its own RetrieverAgent loop. The loops run concurrently, at most `max_concurrency`
+at a time, and share one ChunkManager. The wall time per document is then close to that of the
+slowest category instead of the sum of all of them. Their retrieval tool calls go through one
+CoalescingRetriever, which gathers the queries made within a short window into a single
+`RetrieverManager.retrieve_chunks_batch` call: one embedding batch and one reranker batch for all loops.
+
+In the notebook, where an event loop is already running:
+
+    orchestrator = RetrievalOrchestrator(retriever_manager, chunk_manager, agent_factory, max_concurrency=4)
+    runs = await orchestrator.run(metadata_categories)
+    print(orchestrator.summary())
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set
+
+# Seconds a retrieval query waits for queries of other loops before its batch is run.
+COALESCE_WINDOW = 0.02
+# A batch is run without waiting for the window once it holds this many distinct queries.
+COALESCE_MAX_BATCH_SIZE = 32
+# Retrieved results kept for repeated queries, most recently used first.
+COALESCE_MAX_RESULTS = 1024
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+class CoalescingRetriever:
+    """
+    Async front of a RetrieverManager that merges concurrent queries into batched calls.
+
+    Distinct queries of all callers within COALESCE_WINDOW form one batch. A query that is already
+    pending, being retrieved or was retrieved before is not retrieved again, since the index does not
+    change during a run. Retrieved results are kept, at most `max_results` of them, until `clear` is
+    called or the retriever manager is replaced; RetrievalOrchestrator.run clears them before every
+    document. Batches run one at a time in a worker thread, so the embedding and reranker models are
+    never called from two threads and the event loop stays free; queries arriving during a batch make
+    up the next one.
+    """
+
+    def __init__(self, retriever_manager, window: float = COALESCE_WINDOW,
+                 max_batch_size: int = COALESCE_MAX_BATCH_SIZE, max_results: int = COALESCE_MAX_RESULTS) -> None:
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.max_results = max_results
+        self.queries = 0  # queries asked by the callers
+        self.retrieved = 0  # queries retrieved; the difference was shared with other callers
+        self.batches = 0
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._results: "OrderedDict[str, str]" = OrderedDict()
+        self._generation = 0  # incremented by clear, so a batch started before it does not store its results
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._batch_lock: Optional[asyncio.Lock] = None
+        self._batch_tasks: Set[asyncio.Task] = set()  # the event loop only keeps weak references to tasks
+        self.retriever_manager = retriever_manager
+
+    @property
+    def retriever_manager(self):
+        return self._retriever_manager
+
+    @retriever_manager.setter
+    def retriever_manager(self, retriever_manager) -> None:
+        # Results retrieved from the index of another document would be stale.
+        self._retriever_manager = retriever_manager
+        self.clear()
+
+    def clear(self) -> None:
+        """Forget the retrieved results and unfinished queries, e.g. before retrieving from another document."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        # Futures of a cancelled run may belong to a closed event loop; they are dropped, not awaited again.
+        self._pending = {}
+        self._in_flight = {}
+        self._results.clear()
+        self._generation += 1
+        if not self._batch_tasks:
+            # The lock binds to the event loop it is first used in, and the next run may use another one.
+            self._batch_lock = None
+
+    async def _submit(self, query: str) -> str:
+        loop = asyncio.get_running_loop()
+        self.queries += 1
+        if query in self._results:
+            self._results.move_to_end(query)
+            return self._results[query]
+        future = self._pending.get(query, self._in_flight.get(query))
+        if future is None:
+            future = loop.create_future()
+            self._pending[query] = future
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.window, self._flush)
+        # Shielded, so a caller that is cancelled does not cancel the result of the others.
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            self._in_flight.update(batch)
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch: Dict[str, asyncio.Future]) -> None:
+        if self._batch_lock is None:
+            self._batch_lock = asyncio.Lock()
+        try:
+            async with self._batch_lock:
+                queries = list(batch)
+                generation = self._generation
+                self.batches += 1
+                self.retrieved += len(queries)
+                try:
+                    results = await asyncio.to_thread(self.retriever_manager.retrieve_chunks_batch, queries)
+                except Exception as e:
+                    results = [f"Retrieval failed: {type(e).__name__}: {e}"] * len(queries)
+                else:
+                    if generation == self._generation:
+                        self._results.update(zip(queries, results))
+                        while len(self._results) > self.max_results:
+                            self._results.popitem(last=False)
+                for query, result in zip(queries, results):
+                    if self._in_flight.get(query) is batch[query]:
+                        del self._in_flight[query]
+                    if not batch[query].done():
+                        batch[query].set_result(result)
+        finally:
+            # Callers of a batch that did not finish, e.g. cancelled with its run, are not left waiting.
+            for future in batch.values():
+                if not future.done():
+                    future.cancel()
+
+    async def retrieve_chunks(self, query: str) -> str:
+        "Given a query retrieves top k chunks from the vector db and concatanate them together along with their id before returning. Useful for querying the case study vector database."
+        return await self._submit(query)
+
+    async def retrieve_chunks_batch(self, queries: List[str]) -> List[str]:
+        "Retrieves and reranks the top k chunks for several queries at once, in the format of `retrieve_chunks`."
+        return list(await asyncio.gather(*(self._submit(query) for query in queries)))
+
+
+@dataclass
+class CategoryRun:
+    category: str
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+class RetrievalOrchestrator:
+    """
+    Runs one retrieval agent per metadata category concurrently.
+
+    `agent_factory(retriever, chunk_manager)` returns a fresh agent for a category; it should use
+    `retriever` (a CoalescingRetriever) for its async retrieval tools and the shared, thread-safe
+    `chunk_manager` for its chunk tools. The agent needs an `aextract_metadata_chunks(category,
+    initial_query)` coroutine. A category that fails is recorded in its CategoryRun and does not stop
+    the others.
+    """
+
+    def __init__(self, retriever_manager, chunk_manager, agent_factory: Callable[[CoalescingRetriever, Any], Any],
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, coalesce_window: float = COALESCE_WINDOW) -> None:
+        self.chunk_manager = chunk_manager
+        self.agent_factory = agent_factory
+        self.max_concurrency = max_concurrency
+        self.retriever = CoalescingRetriever(retriever_manager, window=coalesce_window)
+        self.runs: Dict[str, CategoryRun] = {}
+        self.seconds = 0.0
+
+    async def _run_category(self, semaphore: asyncio.Semaphore, category: str, initial_query: str) -> CategoryRun:
+        async with semaphore:
+            run = CategoryRun(category)
+            start = time.perf_counter()
+            try:
+                agent = self.agent_factory(self.retriever, self.chunk_manager)
+                await agent.aextract_metadata_chunks(category, initial_query)
+            except Exception as e:
+                run.error = f"{type(e).__name__}: {e}"
+            run.seconds = time.perf_counter() - start
+            return run
+
+    async def run(self, categories: Dict[str, str], retriever_manager=None) -> Dict[str, CategoryRun]:
+        """
+        Retrieves the chunks of every category. Results and unfinished queries of earlier runs are not reused.
+
+        Args:
+            categories (Dict[str, str]): Metadata category mapped to its initial query.
+            retriever_manager: RetrieverManager of the document, replacing the previous one if given.
+
+        Returns:
+            Dict[str, CategoryRun]: Time and error, if any, of each category.
+        """
+        if retriever_manager is not None:
+            self.retriever.retriever_manager = retriever_manager
+        else:
+            self.retriever.clear()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        start = time.perf_counter()
+        runs = await asyncio.gather(*(self._run_category(semaphore, category, initial_query)
+                                      for category, initial_query in categories.items()))
+        self.seconds = time.perf_counter() - start
+        self.runs = {run.category: run for run in runs}
+        return self.runs
+
+    def summary(self) -> str:
+        slowest = max(self.runs.values(), key=lambda run: run.seconds, default=None)
+        lines = [f"{len(self.runs)} categories in {self.seconds:.1f}s "
+                 f"(slowest {slowest.seconds if slowest else 0:.1f}s, "
+                 f"sequential {sum(run.seconds for run in self.runs.values()):.1f}s); "
+                 f"{self.retriever.queries} retrieval queries in {self.retriever.batches} batches, "
+                 f"{self.retriever.queries - self.retriever.retrieved} shared"]
+        lines += [f"  {run.category}: {run.error}" for run in self.runs.values() if run.error]
+        return "\n".join(lines)
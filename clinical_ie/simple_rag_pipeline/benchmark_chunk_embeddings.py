@@ -0,0 +1,108 @@
+"""
+Benchmark of semantic chunk embeddings: pooled from the splitter's sentence windows against embedded.
+
+For each PDF, the semantic splitter runs once; the chunks are then embedded from their text (with
+metadata, as VectorStoreIndex embeds them) and pooled from the sentence-window embeddings. Reported
+per document: texts embedded and model calls of each path, the cosine similarity between pooled and
+embedded chunk vectors, and how many of the top-k chunks for the metadata category queries the
+pooled vectors retrieve compared with the embedded ones. Needs the embedding model:
+
+    python -m clinical_ie.simple_rag_pipeline.benchmark_chunk_embeddings clinical_ie/MACCR --top-k 3
+"""
+import argparse
+import os
+import statistics
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from clinical_ie.simple_rag_pipeline.document_processor import DocumentProcessor
+from clinical_ie.simple_rag_pipeline.ingestion import iter_pdf_files
+from clinical_ie.simple_rag_pipeline.rag_utils import (PDF_READER_METHOD, QUERY_INSTRUCTION, get_embedding_model,
+                                                       get_node_parser)
+from clinical_ie.simple_rag_pipeline.semantic_splitter import EmbeddingCache
+
+# The metadata categories the RetrieverAgent searches for.
+CATEGORY_QUERIES = ["Life Style", "Family History", "Social History", "Medical/Surgical History", "Signs and Symptoms",
+                    "Comorbidities", "Diagnostic Techniques and Procedures", "Diagnosis", "Pathology",
+                    "Pharmacological Therapy", "Interventional Therapy", "Patient Outcome Assessment", "Age", "Gender"]
+
+
+def _normalized(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def compare_document(pdf_file: str, embed_model, query_matrix: np.ndarray, top_k: int) -> Dict[str, float]:
+    documents = DocumentProcessor().prepare_single_document(pdf_file=pdf_file, method=PDF_READER_METHOD)
+
+    cache = EmbeddingCache()
+    start = time.perf_counter()
+    pooled_nodes = get_node_parser(embed_model, "semantic", chunk_embedding="pooled",
+                                   embedding_cache=cache).get_nodes_from_documents(documents)
+    pooled_seconds = time.perf_counter() - start
+    windows, pooled_calls = cache.misses, cache.model_calls
+
+    # Same splits from the cached windows; only the chunk texts reach the model.
+    start = time.perf_counter()
+    embedded_nodes = get_node_parser(embed_model, "semantic", chunk_embedding="embed",
+                                     embedding_cache=cache).get_nodes_from_documents(documents)
+    chunk_seconds = time.perf_counter() - start
+    assert [node.text for node in pooled_nodes] == [node.text for node in embedded_nodes]
+
+    pooled = _normalized([node.embedding for node in pooled_nodes])
+    embedded = _normalized([node.embedding for node in embedded_nodes])
+    k = min(top_k, len(pooled))
+    overlaps = []
+    for query in query_matrix:
+        pooled_top = set(np.argsort(-(pooled @ query))[:k].tolist())
+        embedded_top = set(np.argsort(-(embedded @ query))[:k].tolist())
+        overlaps.append(len(pooled_top & embedded_top) / k)
+    cosines = np.sum(pooled * embedded, axis=1)
+    return {
+        "chunks": len(pooled_nodes),
+        # Stock splitter + VectorStoreIndex: one call per page for the windows, then every chunk again.
+        "baseline_texts": windows + len(pooled_nodes),
+        "baseline_calls": len(documents) + 1,
+        "pooled_texts": windows,
+        "pooled_calls": pooled_calls,
+        "pooled_seconds": pooled_seconds,
+        "chunk_embedding_seconds": chunk_seconds,
+        "mean_cosine": float(cosines.mean()),
+        "min_cosine": float(cosines.min()),
+        "top_k_overlap": statistics.mean(overlaps),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("source", help="PDF file or directory of PDFs")
+    parser.add_argument("--top-k", type=int, default=3, help="Chunks compared per category query")
+    args = parser.parse_args()
+
+    embed_model = get_embedding_model()
+    query_matrix = _normalized(embed_model.get_text_embedding_batch(
+        [f"{QUERY_INSTRUCTION}{query}" for query in CATEGORY_QUERIES]))
+    pdf_files = [args.source] if os.path.isfile(args.source) else list(iter_pdf_files(args.source))
+
+    results: List[Dict[str, float]] = []
+    for pdf_file in pdf_files:
+        result = compare_document(pdf_file, embed_model, query_matrix, args.top_k)
+        results.append(result)
+        print(f"{os.path.basename(pdf_file)[:48]:<48}  chunks {result['chunks']:>4}  "
+              f"texts {result['baseline_texts']:>5} -> {result['pooled_texts']:>5}  "
+              f"calls {result['baseline_calls']:>3} -> {result['pooled_calls']:>3}  "
+              f"cosine {result['mean_cosine']:.3f} (min {result['min_cosine']:.3f})  "
+              f"top-{args.top_k} overlap {result['top_k_overlap']:.2f}")
+    if results:
+        baseline_texts = sum(result["baseline_texts"] for result in results)
+        pooled_texts = sum(result["pooled_texts"] for result in results)
+        print(f"\n{len(results)} documents: {baseline_texts} -> {pooled_texts} texts embedded "
+              f"({1 - pooled_texts / baseline_texts:.0%} fewer), "
+              f"mean cosine {statistics.mean(result['mean_cosine'] for result in results):.3f}, "
+              f"mean top-{args.top_k} overlap {statistics.mean(result['top_k_overlap'] for result in results):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Micro-benchmark of the document cleaning steps: the fused cleaner against the unfused reference.
+
+Runs on the pages of the bundled MACCR case report (needs pymupdf) and on a synthetic corpus of
+the same text repeated with extra citations, bullets and hyphenated words:
+
+    python -m clinical_ie.simple_rag_pipeline.benchmark_cleaning --repeat 20 --corpus-mb 20
+"""
+import argparse
+import random
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from clinical_ie.simple_rag_pipeline.test_text_cleaning import (pdf_pages, reference_basic_clean,
+                                                                 reference_clean)
+from clinical_ie.simple_rag_pipeline.text_cleaning_helpers import basic_clean, compile_cleaner
+
+DOCUMENT_OPTIONS = dict(extra_whitespace=True, broken_paragraphs=True, bullets=True, ascii=True,
+                        lowercase=False, citations=True, merge_split_words=True)
+SYNTHETIC_SNIPPETS = ["The patient [12] was treated", "with mesalazine\n", "• Colonoscopy revealed", "a tu-\nmor",
+                      "in the rectum [3][4].", "\xa0", "  ", "CEA 4.2 ng/mL", "\n\n12\n\n", "inflam- matory",
+                      "cholangio­carcinoma", "Fig. 2"]
+
+
+def synthetic_corpus(pages: List[str], megabytes: float, seed: int = 0) -> List[str]:
+    """Pages of about 4 KB mixing the sample pages with snippets that hit every cleaning rule."""
+    rng = random.Random(seed)
+    corpus: List[str] = []
+    size = 0
+    while size < megabytes * 1_000_000:
+        parts = [rng.choice(pages)] if pages else []
+        while sum(len(part) for part in parts) < 4000:
+            parts.append(rng.choice(SYNTHETIC_SNIPPETS))
+        page = " ".join(parts)
+        corpus.append(page)
+        size += len(page)
+    return corpus
+
+
+def time_pipeline(pipeline: Callable[[str], str], pages: List[str], repeat: int) -> float:
+    """Median time to clean every page once, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page in pages:
+            pipeline(page)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def run(repeat: int, corpus_mb: float) -> Dict[str, Dict[str, float]]:
+    fused = compile_cleaner(**DOCUMENT_OPTIONS)
+    pipelines = {
+        "reference": lambda page: reference_clean(reference_basic_clean(page), **DOCUMENT_OPTIONS),
+        "fused": lambda page: fused(basic_clean(page)),
+    }
+    sample = pdf_pages()
+    workloads = {"MACCR sample": sample, f"synthetic {corpus_mb:g} MB": synthetic_corpus(sample, corpus_mb)}
+    results: Dict[str, Dict[str, float]] = {}
+    for workload, pages in workloads.items():
+        if not pages:
+            print(f"Skipping {workload}: pymupdf is not installed")
+            continue
+        for page in pages:
+            assert pipelines["fused"](page) == pipelines["reference"](page)
+        megabytes = sum(len(page) for page in pages) / 1_000_000
+        timings = {name: time_pipeline(pipeline, pages, repeat) for name, pipeline in pipelines.items()}
+        results[workload] = {**{f"{name}_ms": ms for name, ms in timings.items()},
+                             "fused_mb_per_s": megabytes / (timings["fused"] / 1000),
+                             "speedup": timings["reference"] / timings["fused"]}
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per workload")
+    parser.add_argument("--corpus-mb", type=float, default=10.0, help="Size of the synthetic corpus")
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.corpus_mb)
+    width = max((len(name) for name in results), default=8)
+    print(f"{'workload'.ljust(width)}  {'reference':>11}  {'fused':>11}  {'fused MB/s':>10}  {'speedup':>7}")
+    for name, timing in results.items():
+        print(f"{name.ljust(width)}  {timing['reference_ms']:>9.2f}ms  {timing['fused_ms']:>9.2f}ms  "
+              f"{timing['fused_mb_per_s']:>10.1f}  {timing['speedup']:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
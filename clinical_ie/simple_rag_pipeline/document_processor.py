@@ -1,62 +1,73 @@
 import os
 import re
-from typing import List
-from functools import partial
+from typing import Iterator, List
 
+import pymupdf
 from llama_index.core import SimpleDirectoryReader, Document
-from clinical_ie.simple_rag_pipeline.text_cleaning_helpers import clean as advanced_clean
-
-def is_int(s: str) -> bool:
-    "Check if the input string can be converted to an integer."
-    try:
-        int(s)
-        return True
-    except ValueError:
-        return False
+from clinical_ie.simple_rag_pipeline.text_cleaning_helpers import basic_clean, compile_cleaner
 
+REFERENCES_HEADER_RE = re.compile(r'(?:References|Reference|Reference:|References:|Bibliography|Bibliographical References)\s*\n',
+                                  flags=re.IGNORECASE)
 
 class DocumentProcessor:
     """Handles document preparation and cleaning."""
     
     def __init__(self, debug: bool = False):
         self.debug = debug
-        self.cleaning_func = partial(advanced_clean,
-                                     extra_whitespace=True,
-                                     broken_paragraphs=True,
-                                     bullets=True,
-                                     ascii=True,
-                                     lowercase=False,
-                                     citations=True,
-                                     merge_split_words=True)
+        self.cleaning_func = compile_cleaner(extra_whitespace=True,
+                                             broken_paragraphs=True,
+                                             bullets=True,
+                                             ascii=True,
+                                             lowercase=False,
+                                             citations=True,
+                                             merge_split_words=True)
 
     def basic_clean(self, txt: str) -> str:
         """Applies basic cleaning operations to the provided text."""
-        txt = txt.replace('-\n', '')  # remove line hyphenated words
-        txt = re.sub(r'(?<!\n)\n(?!\n|[A-Z0-9])', ' ', txt)  # remove unnecessary line break
-        txt = '\n\n'.join([line for line in txt.split('\n') if not is_int(line)])  # remove lines that only have numbers
-        return txt
+        return basic_clean(txt)
         
 
     def extract_reference_section_text(self, page_text):
         found_references = False
-        pattern = r'(?:References|Reference|Reference:|References:|Bibliography|Bibliographical References)\s*\n'
+        match = REFERENCES_HEADER_RE.search(page_text)
         
-        if re.search(pattern, page_text, flags=re.IGNORECASE):
+        if match:
             found_references = True
-            modified_text = re.sub(pattern + r'.*', '', page_text, flags=re.IGNORECASE | re.DOTALL)
+            modified_text = page_text[:match.start()]  # drop the header and everything after it
         else:
             modified_text = page_text  # No change if no reference section is found
         
         return modified_text, found_references    
 
 
+    def stream_pages(self, pdf_file: str) -> Iterator[Document]:
+        """
+        Yields the cleaned pages of a PDF one at a time, extracting each page's text only when it is requested.
+
+        Pages are read with pymupdf and cleaned like in `prepare_single_document`. Extraction stops at the
+        page with the reference section header, so the bibliography pages are never read.
+        """
+        with pymupdf.open(pdf_file) as pdf:
+            total_pages = pdf.page_count
+            for page in pdf:
+                text = self.basic_clean(page.get_text())
+                text, found_references = self.extract_reference_section_text(text)
+                metadata = {"page_label": str(page.number + 1), "file_name": os.path.basename(pdf_file),
+                            "file_path": pdf_file, "total_pages": total_pages}
+                yield Document(text=self.cleaning_func(text), metadata=metadata)
+                if found_references:
+                    return
+
     def prepare_single_document(self, pdf_file: str, method: str = "simple") -> List[Document]:
         """Prepares a single document from a PDF file located at the specified path."""
         if not os.path.isfile(pdf_file) or not pdf_file.endswith('.pdf'):
             raise ValueError(f"The file {pdf_file} is not a valid PDF file")
 
-        documents = []
-        if method == "simple":
+        if method == "pymupdf":
+            cleaned_docs = list(self.stream_pages(pdf_file))
+            total_pages = cleaned_docs[0].metadata["total_pages"] if cleaned_docs else 0
+
+        elif method == "simple":
             documents = SimpleDirectoryReader(input_files=[pdf_file]).load_data()
             cleaned_docs = []
             found_references = None
@@ -67,9 +78,10 @@ class DocumentProcessor:
                 doc.text, found_references = self.extract_reference_section_text(doc.text)
                 doc.text = self.cleaning_func(doc.text)
                 cleaned_docs.append(doc)
+            total_pages = len(documents)
 
         else:
-            raise ValueError(f"Invalid Method: {method} not supported. Pick 'simple' or 'manual_parsing'")
+            raise ValueError(f"Invalid Method: {method} not supported. Pick 'simple' or 'pymupdf'")
     
-        print(f'Found {len(documents)} total number of pages from the document {pdf_file}, after cleaning {len(cleaned_docs)} left')
+        print(f'Found {total_pages} total number of pages from the document {pdf_file}, after cleaning {len(cleaned_docs)} left')
         return cleaned_docs
\ No newline at end of file
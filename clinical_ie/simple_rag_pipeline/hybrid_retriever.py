@@ -0,0 +1,75 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import BaseNode, NodeWithScore, QueryBundle
+from llama_index.retrievers.bm25 import BM25Retriever
+
+# Constant of reciprocal-rank fusion: a node's fused score is the sum of 1 / (RRF_K + rank) over the retrievers.
+RRF_K = 60
+
+
+@dataclass
+class FusedResult:
+    node: NodeWithScore
+    score: float
+    dense_rank: Optional[int] = None  # 0-based rank in the dense results, None if not retrieved
+    sparse_rank: Optional[int] = None
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense retrieval over a vector index fused with BM25 over the same nodes by reciprocal-rank fusion.
+
+    BM25 finds exact clinical terms, drug and lab names and abbreviations that embeddings blur; the
+    dense retriever finds paraphrases. Fusion works on ranks only, so the two score scales never need
+    calibrating. The instruction prefix of embedding queries is stripped before BM25 sees the query.
+    A prebuilt sparse retriever, e.g. a BM25Retriever loaded from disk, can be passed instead of the nodes.
+    """
+
+    def __init__(self, dense_retriever: BaseRetriever, nodes: Optional[List[BaseNode]], similarity_top_k: int,
+                 query_instruction: str = "", rrf_k: int = RRF_K,
+                 sparse_retriever: Optional[BaseRetriever] = None) -> None:
+        self.dense_retriever = dense_retriever
+        if sparse_retriever is None:
+            sparse_retriever = BM25Retriever.from_defaults(nodes=nodes, similarity_top_k=similarity_top_k)
+        self.sparse_retriever = sparse_retriever
+        self.similarity_top_k = similarity_top_k
+        self.query_instruction = query_instruction
+        self.rrf_k = rrf_k
+        super().__init__()
+
+    def retrieve_fused(self, query: "str | QueryBundle") -> List[FusedResult]:
+        """Fused results, best first, with the rank each retriever gave them."""
+        query_bundle = QueryBundle(query_str=query) if isinstance(query, str) else query
+        sparse_query = query_bundle.query_str
+        if self.query_instruction and sparse_query.startswith(self.query_instruction):
+            sparse_query = sparse_query[len(self.query_instruction):]
+
+        fused: Dict[str, FusedResult] = {}
+        for attribute, results in (("dense_rank", self.dense_retriever.retrieve(query_bundle)),
+                                   ("sparse_rank", self.sparse_retriever.retrieve(sparse_query))):
+            for rank, result in enumerate(results):
+                entry = fused.setdefault(result.node.node_id, FusedResult(result, 0.0))
+                entry.score += 1.0 / (self.rrf_k + rank + 1)
+                setattr(entry, attribute, rank)
+        ranked = sorted(fused.values(), key=lambda entry: -entry.score)[:self.similarity_top_k]
+        for entry in ranked:
+            entry.node = NodeWithScore(node=entry.node.node, score=entry.score)
+        return ranked
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return [entry.node for entry in self.retrieve_fused(query_bundle)]
+
+
+def is_confident(results: List[FusedResult], top_k: int) -> bool:
+    """
+    True if both retrievers put each of the top k fused results in their own top k.
+
+    When the dense and the sparse ranking agree on the top k, a cross-encoder rerank rarely changes
+    which chunks are kept, so it can be skipped.
+    """
+    top = results[:top_k]
+    return len(top) == top_k and all(entry.dense_rank is not None and entry.dense_rank < top_k
+                                     and entry.sparse_rank is not None and entry.sparse_rank < top_k
+                                     for entry in top)
@@ -0,0 +1,356 @@
+"""
+Batch ingestion of a corpus of case reports into chunk embeddings.
+
+PDF extraction, cleaning and (for the "simple" parsing method) sentence splitting run in a process
+pool, one document per task. Chunks of finished documents are embedded together in large batches in
+the main process, and every document is appended to the output directory as soon as it is embedded:
+
+    output_dir/nodes.jsonl      one line per chunk: id, text, metadata and embedding
+    output_dir/manifest.jsonl   one line per document: status, page and chunk counts, timing or error
+
+A document that fails is recorded in the manifest and does not stop the run. When a worker process
+dies, e.g. of a crash in the PDF library, the pool is restarted and the documents it was working on
+are retried one at a time; only a document that crashes a worker on its own is recorded as failed.
+Documents whose content hash was already ingested are skipped, so an interrupted run resumes where
+it stopped, and a PDF that changed is ingested again; its earlier chunks are no longer loaded.
+
+    python -m clinical_ie.simple_rag_pipeline.ingestion clinical_ie/MACCR/ maccr_index/ --workers 8
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from llama_index.core import VectorStoreIndex
+from llama_index.core.schema import BaseNode, MetadataMode, TextNode
+
+from clinical_ie.simple_rag_pipeline.document_processor import DocumentProcessor
+from clinical_ie.simple_rag_pipeline.rag_utils import (PDF_READER_METHOD, SIMPLE_CHUNK_OVERLAP, SIMPLE_CHUNK_SIZE,
+                                                       file_hash, get_embedding_model, get_node_parser)
+
+NODES_FILE = "nodes.jsonl"
+MANIFEST_FILE = "manifest.jsonl"
+# Chunks embedded per call of the embedding model; pages split per batch for semantic parsing.
+DEFAULT_EMBED_BATCH_SIZE = 256
+# Documents queued per worker, bounding the memory held by finished but not yet embedded documents.
+TASKS_PER_WORKER = 4
+PROGRESS_INTERVAL = 10.0  # seconds
+
+_processor: Optional[DocumentProcessor] = None
+
+
+@dataclass
+class PreparedDocument:
+    pdf_file: str
+    sha256: str = ""
+    pages: int = 0
+    nodes: List[BaseNode] = field(default_factory=list)
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class IngestionStats:
+    documents: int = 0
+    skipped: int = 0
+    failed: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+
+    @property
+    def documents_per_second(self) -> float:
+        return self.documents / self.seconds if self.seconds else 0.0
+
+
+def iter_pdf_files(source: Union[str, Iterable[str]]) -> List[str]:
+    """PDF files of a directory, searched recursively, or of a list of paths, in sorted order."""
+    if isinstance(source, str):
+        if os.path.isfile(source):
+            return [source]
+        return sorted(os.path.join(root, name) for root, _, names in os.walk(source)
+                      for name in names if name.lower().endswith(".pdf"))
+    return list(source)
+
+
+def _prepare(pdf_file: str, node_parser_type: str, sha256: str) -> PreparedDocument:
+    """Worker task: extract and clean one PDF, and split it unless splitting needs the embedding model."""
+    global _processor
+    start = time.perf_counter()
+    prepared = PreparedDocument(pdf_file, sha256)
+    try:
+        if _processor is None:
+            _processor = DocumentProcessor()
+        documents = _processor.prepare_single_document(pdf_file=pdf_file, method=PDF_READER_METHOD)
+        prepared.pages = len(documents)
+        if node_parser_type == "simple":
+            node_parser = get_node_parser(None, parsing_method="simple",
+                                          chunk_size=SIMPLE_CHUNK_SIZE, chunk_overlap=SIMPLE_CHUNK_OVERLAP)
+            prepared.nodes = node_parser.get_nodes_from_documents(documents)
+        else:
+            prepared.nodes = documents  # split in the main process, where the embedding model is loaded
+    except Exception as e:
+        prepared.error = f"{type(e).__name__}: {e}"
+    prepared.seconds = time.perf_counter() - start
+    return prepared
+
+
+def _ingested(output_dir: str) -> Dict[str, Dict[str, Any]]:
+    """Latest successful manifest entry of every document in the output directory, by path."""
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    entries = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # the last line of an interrupted run
+            if entry["status"] == "ok":
+                entries[entry["pdf_file"]] = entry
+    return entries
+
+
+def _completed(output_dir: str) -> Dict[str, str]:
+    """Content hashes of the current versions of the documents already ingested, mapped to their path."""
+    return {entry["sha256"]: pdf_file for pdf_file, entry in _ingested(output_dir).items()}
+
+
+class CorpusWriter:
+    """Appends embedded documents to the node and manifest files, flushing after every document."""
+
+    def __init__(self, output_dir: str) -> None:
+        os.makedirs(output_dir, exist_ok=True)
+        self.nodes = open(os.path.join(output_dir, NODES_FILE), "a")
+        self.manifest = open(os.path.join(output_dir, MANIFEST_FILE), "a")
+
+    def write(self, prepared: PreparedDocument) -> None:
+        # Ties the chunks to their manifest entry: chunks of a run interrupted before the entry was
+        # written, or of an earlier version of the PDF, are not loaded.
+        ingestion_id = uuid.uuid4().hex
+        if prepared.error is None:
+            for node in prepared.nodes:
+                record = {"id": node.node_id, "text": node.get_content(), "metadata": node.metadata,
+                          "embedding": node.embedding, "sha256": prepared.sha256, "ingestion_id": ingestion_id}
+                self.nodes.write(json.dumps(record) + "\n")
+            self.nodes.flush()
+        entry = {"pdf_file": prepared.pdf_file, "sha256": prepared.sha256, "ingestion_id": ingestion_id,
+                 "status": "ok" if prepared.error is None else "failed", "pages": prepared.pages,
+                 "chunks": len(prepared.nodes) if prepared.error is None else 0,
+                 "seconds": round(prepared.seconds, 3), "error": prepared.error}
+        self.manifest.write(json.dumps(entry) + "\n")
+        self.manifest.flush()
+
+    def close(self) -> None:
+        self.nodes.close()
+        self.manifest.close()
+
+
+def _embed(documents: List[PreparedDocument], embed_model, node_parser=None) -> None:
+    """Split (with a semantic node parser) and embed the chunks of several documents with one batched model call."""
+    for prepared in documents:
+        if prepared.error is None and node_parser is not None:
+            try:
+                prepared.nodes = node_parser.get_nodes_from_documents(prepared.nodes)
+            except Exception as e:
+                prepared.error = f"{type(e).__name__}: {e}"
+    # Semantic chunks are already embedded by the splitter, unless it leaves them to the index.
+    nodes = [node for prepared in documents if prepared.error is None for node in prepared.nodes
+             if node.embedding is None]
+    if not nodes:
+        return
+    start = time.perf_counter()
+    try:
+        # With the metadata the index embeds too, so the vectors match those of rag_utils.build_index.
+        embeddings = embed_model.get_text_embedding_batch([node.get_content(metadata_mode=MetadataMode.EMBED)
+                                                           for node in nodes])
+    except Exception as e:
+        for prepared in documents:
+            prepared.error = prepared.error or f"embedding failed: {type(e).__name__}: {e}"
+        return
+    for node, embedding in zip(nodes, embeddings):
+        node.embedding = embedding
+    # Spread the embedding time over the documents by chunk count, so per-document timings add up.
+    seconds = time.perf_counter() - start
+    for prepared in documents:
+        if prepared.error is None:
+            prepared.seconds += seconds * len(prepared.nodes) / len(nodes)
+
+
+def ingest_corpus(source: Union[str, Iterable[str]], output_dir: str, embed_model=None,
+                  node_parser_type: str = "simple", workers: Optional[int] = None,
+                  embed_batch_size: int = DEFAULT_EMBED_BATCH_SIZE) -> IngestionStats:
+    """
+    Extracts, cleans, splits and embeds a corpus of PDFs, appending the chunks to `output_dir`.
+
+    Args:
+        source (str | Iterable[str]): Directory searched recursively for PDFs, or a list of PDF paths.
+        output_dir (str): Directory of the node and manifest files; created if needed.
+        embed_model: Embedding model, loaded with `get_embedding_model` if not given.
+        node_parser_type (str): 'simple' (split in the workers) or 'semantic' (split with the embedding model).
+        workers (int): Worker processes, defaults to the number of CPUs.
+        embed_batch_size (int): Chunks collected before the embedding model is called; pages for semantic
+            parsing, which splits the collected pages and embeds their sentence windows in one batch.
+
+    Returns:
+        IngestionStats: Counts of ingested, skipped and failed documents, chunks written and elapsed time.
+    """
+    if node_parser_type not in ("simple", "semantic"):
+        raise ValueError(f'Invalid Parsing Method: {node_parser_type}, choose one of "semantic", "simple"')
+    embed_model = embed_model or get_embedding_model()
+    workers = workers or os.cpu_count() or 1
+    pdf_files = iter_pdf_files(source)
+    done = _completed(output_dir)
+    # One parser for the whole run, so its embedding cache is shared by all batches.
+    node_parser = get_node_parser(embed_model, parsing_method="semantic") if node_parser_type == "semantic" else None
+
+    stats = IngestionStats()
+    writer = CorpusWriter(output_dir)
+    start = last_report = time.perf_counter()
+    batch: List[PreparedDocument] = []
+    pending: List[Tuple[str, str]] = []
+    for pdf_file in pdf_files:
+        try:
+            sha256 = file_hash(pdf_file)
+        except OSError as e:
+            batch.append(PreparedDocument(pdf_file, error=f"{type(e).__name__}: {e}"))
+            continue
+        if sha256 in done:
+            stats.skipped += 1
+        else:
+            pending.append((pdf_file, sha256))
+
+    def flush() -> None:
+        _embed(batch, embed_model, node_parser)
+        for prepared in batch:
+            if prepared.error is None and prepared.sha256 in done:
+                stats.skipped += 1  # same content as a document ingested under another path
+                continue
+            writer.write(prepared)
+            stats.documents += 1
+            if prepared.error is None:
+                done[prepared.sha256] = prepared.pdf_file
+                stats.chunks += len(prepared.nodes)
+            else:
+                stats.failed += 1
+                print(f"Failed to ingest {prepared.pdf_file}: {prepared.error}")
+        batch.clear()
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        queue = deque(pending)
+        futures: Dict[Any, Tuple[str, str]] = {}
+        # Documents in flight when a worker process died; one of them may have caused it, so each is retried alone.
+        isolated: List[Tuple[str, str]] = []
+        while True:
+            broken = False
+            suspects: List[Tuple[str, str]] = []
+            try:
+                if isolated:
+                    if not futures:
+                        futures[executor.submit(_prepare, isolated[0][0], node_parser_type, isolated[0][1])] = isolated[0]
+                        isolated.pop(0)
+                else:
+                    while queue and len(futures) < workers * TASKS_PER_WORKER:
+                        futures[executor.submit(_prepare, queue[0][0], node_parser_type, queue[0][1])] = queue[0]
+                        queue.popleft()
+            except BrokenProcessPool:
+                broken = True  # the document was not submitted and stays queued
+            else:
+                if not futures:
+                    break
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = futures.pop(future)
+                    try:
+                        batch.append(future.result())
+                    except BrokenProcessPool:
+                        broken = True
+                        suspects.append(task)
+                    except Exception as e:
+                        batch.append(PreparedDocument(task[0], task[1], error=f"{type(e).__name__}: {e}"))
+            if broken:
+                # A dead worker breaks the whole pool: restart it and retry everything that was in flight.
+                suspects += futures.values()
+                futures.clear()
+                executor.shutdown(wait=True, cancel_futures=True)
+                executor = ProcessPoolExecutor(max_workers=workers)
+                if len(suspects) == 1:
+                    pdf_file, sha256 = suspects[0]
+                    batch.append(PreparedDocument(pdf_file, sha256, error="BrokenProcessPool: the worker process "
+                                                  "died while preparing this document"))
+                else:
+                    isolated.extend(suspects)
+            if sum(len(prepared.nodes) for prepared in batch) >= embed_batch_size:
+                flush()
+
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                elapsed = now - start
+                print(f"{stats.documents + len(batch)}/{len(pending)} documents, "
+                      f"{stats.documents / elapsed:.2f} docs/s, {stats.chunks / elapsed:.1f} chunks/s, "
+                      f"{stats.failed} failed")
+        flush()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        writer.close()
+
+    stats.seconds = time.perf_counter() - start
+    print(f"Ingested {stats.documents} documents ({stats.failed} failed, {stats.skipped} skipped) into "
+          f"{stats.chunks} chunks in {stats.seconds:.1f}s, {stats.documents_per_second:.2f} docs/s")
+    return stats
+
+
+def load_corpus_nodes(output_dir: str) -> List[TextNode]:
+    """Nodes of the current version of every document of an ingested corpus, with their stored embeddings."""
+    current = {entry["ingestion_id"] for entry in _ingested(output_dir).values()}
+    nodes = []
+    with open(os.path.join(output_dir, NODES_FILE)) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record["ingestion_id"] not in current:
+                continue
+            nodes.append(TextNode(id_=record["id"], text=record["text"], metadata=record["metadata"],
+                                  embedding=record["embedding"]))
+    return nodes
+
+
+def load_corpus_index(output_dir: str, embed_model=None) -> VectorStoreIndex:
+    """
+    Vector index over an ingested corpus. The chunks keep their stored embeddings; only queries are embedded.
+
+    Args:
+        output_dir (str): Output directory of `ingest_corpus`.
+        embed_model: Embedding model for queries, the one the corpus was embedded with.
+
+    Returns:
+        VectorStoreIndex: The index, e.g. for `.as_retriever(similarity_top_k=10)`.
+    """
+    return VectorStoreIndex(load_corpus_nodes(output_dir), embed_model=embed_model)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingest a directory of case report PDFs into chunk embeddings")
+    parser.add_argument("source", help="Directory of PDFs, searched recursively")
+    parser.add_argument("output_dir", help="Directory for nodes.jsonl and manifest.jsonl")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes, defaults to the CPU count")
+    parser.add_argument("--parsing-method", default="simple", choices=["simple", "semantic"])
+    parser.add_argument("--embed-batch-size", type=int, default=DEFAULT_EMBED_BATCH_SIZE,
+                        help="Chunks per embedding call; pages per batch for semantic parsing")
+    args = parser.parse_args()
+    ingest_corpus(args.source, args.output_dir, node_parser_type=args.parsing_method,
+                  workers=args.workers, embed_batch_size=args.embed_batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import json
+import os
+from typing import Any, List, Optional, Sequence
+
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import BasePydanticVectorStore, VectorStoreQuery, VectorStoreQueryResult
+
+from clinical_ie.simple_rag_pipeline.vector_quantization import QuantizedIndex
+
+# Directory of the store's arrays inside a persisted storage context.
+QUANTIZED_STORE_DIR = "quantized_vectors"
+IDS_FILE = "ids.json"
+
+
+class QuantizedVectorStore(BasePydanticVectorStore):
+    """
+    llama-index vector store over a `QuantizedIndex`: one contiguous float32, int8 or binary matrix
+    searched with NumPy instead of a Python loop over per-node embedding lists.
+
+    Only embeddings and node ids are kept here; the index keeps the nodes in its docstore.
+    Metadata filters are not supported.
+    """
+
+    stores_text: bool = False
+    is_embedding_query: bool = True
+    mode: str = "int8"
+    rescore_multiplier: Optional[int] = None
+
+    _index: QuantizedIndex = PrivateAttr()
+    _node_ids: List[str] = PrivateAttr()
+    _ref_doc_ids: List[Optional[str]] = PrivateAttr()
+
+    def __init__(self, mode: str = "int8", rescore_multiplier: Optional[int] = None,
+                 index: Optional[QuantizedIndex] = None, node_ids: Optional[List[str]] = None,
+                 ref_doc_ids: Optional[List[Optional[str]]] = None) -> None:
+        super().__init__(mode=mode, rescore_multiplier=rescore_multiplier)
+        self._index = index if index is not None else QuantizedIndex(mode, rescore_multiplier)
+        self._node_ids = node_ids or []
+        self._ref_doc_ids = ref_doc_ids or []
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "QuantizedVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return self._index
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        self._index.add([node.get_embedding() for node in nodes])
+        node_ids = [node.node_id for node in nodes]
+        self._node_ids.extend(node_ids)
+        self._ref_doc_ids.extend(node.ref_doc_id for node in nodes)
+        return node_ids
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        self._index.remove([position for position, node_ref_doc_id in enumerate(self._ref_doc_ids)
+                            if node_ref_doc_id == ref_doc_id])
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.filters is not None:
+            raise ValueError("Metadata filters are not supported by the quantized vector store")
+        if query.query_embedding is None:
+            raise ValueError("The quantized vector store needs a query embedding")
+        positions, scores = self._index.search(query.query_embedding, query.similarity_top_k)
+        return VectorStoreQueryResult(ids=[self._node_ids[position] for position in positions],
+                                      similarities=scores.tolist())
+
+    def persist(self, persist_path: str, fs: Optional[Any] = None) -> None:
+        """Saves the arrays next to the other files of the storage context, in QUANTIZED_STORE_DIR."""
+        directory = os.path.join(os.path.dirname(persist_path), QUANTIZED_STORE_DIR)
+        self._index.save(directory)
+        with open(os.path.join(directory, IDS_FILE), "w") as f:
+            json.dump({"node_ids": self._node_ids, "ref_doc_ids": self._ref_doc_ids}, f)
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, mmap: bool = True) -> "QuantizedVectorStore":
+        """Loads a store saved by `persist`; with `mmap`, the float vectors used for rescoring stay on disk."""
+        directory = os.path.join(persist_dir, QUANTIZED_STORE_DIR)
+        index = QuantizedIndex.load(directory, mmap=mmap)
+        with open(os.path.join(directory, IDS_FILE)) as f:
+            ids = json.load(f)
+        return cls(mode=index.mode, rescore_multiplier=index.rescore_multiplier, index=index,
+                   node_ids=ids["node_ids"], ref_doc_ids=ids["ref_doc_ids"])
@@ -1,21 +1,58 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
 from sentence_transformers import CrossEncoder
 
-from llama_index.core import VectorStoreIndex
-from llama_index.core.node_parser import (SemanticSplitterNodeParser, SentenceSplitter)
+from llama_index.core import StorageContext, VectorStoreIndex, load_index_from_storage
+from llama_index.core.node_parser import SentenceSplitter
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.core.settings import Settings
+from llama_index.retrievers.bm25 import BM25Retriever
 
 from clinical_ie.simple_rag_pipeline.document_processor import DocumentProcessor
+from clinical_ie.simple_rag_pipeline.hybrid_retriever import HybridRetriever
+from clinical_ie.simple_rag_pipeline.quantized_store import QuantizedVectorStore
+from clinical_ie.simple_rag_pipeline.semantic_splitter import CachedSemanticSplitterNodeParser, EmbeddingCache
 
 
 EMBEDDING_MODEL_PATH = "mixedbread-ai/mxbai-embed-large-v1"
 RERANKER_MODEL_PATH = "mixedbread-ai/mxbai-rerank-base-v1"
+# Prefix of retrieval queries for the mxbai embedding model; chunks are embedded without it.
+QUERY_INSTRUCTION = "Represent this sentence for searching relevant passages: "
+
+# "pymupdf" streams pages and stops at the references; "simple" extracts every page with SimpleDirectoryReader.
+PDF_READER_METHOD = "pymupdf"
+SEMANTIC_BUFFER_SIZE = 1
+SEMANTIC_BREAKPOINT_PERCENTILE = 95
+# How semantic chunks are embedded: "embed", "pooled" from the splitter's sentence windows, or "none" (see semantic_splitter).
+SEMANTIC_CHUNK_EMBEDDING = "embed"
+SIMPLE_CHUNK_SIZE = 376
+SIMPLE_CHUNK_OVERLAP = 128
+
+# Built indexes are persisted here, one directory per cache key. Set to None to always rebuild.
+INDEX_CACHE_DIR = ".index_cache"
+# Part of the cache key; bump it when document cleaning or splitting changes, so stale indexes are rebuilt.
+INDEX_CACHE_VERSION = 1
+# Sentence-window and chunk embeddings, by content hash, shared by all indexes in the cache directory.
+EMBEDDING_CACHE_FILE = "embeddings.jsonl"
+# Subdirectory of a cached index holding the BM25 index of its nodes, for the hybrid retriever.
+BM25_DIR = "bm25"
+# "simple" is llama-index's in-memory store; "float", "int8" and "binary" use QuantizedVectorStore.
+VECTOR_STORE = "simple"
+VECTOR_STORES = ("simple", "float", "int8", "binary")
 
 
 def get_node_parser(embed_model, parsing_method: str = "semantic", **kwargs):
     """Returns a node parser based on the specified parsing method."""
     if parsing_method == "semantic":
-        return SemanticSplitterNodeParser(buffer_size=1, breakpoint_percentile_threshold=95, embed_model=embed_model)
+        return CachedSemanticSplitterNodeParser(buffer_size=SEMANTIC_BUFFER_SIZE,
+                                                breakpoint_percentile_threshold=SEMANTIC_BREAKPOINT_PERCENTILE,
+                                                embed_model=embed_model,
+                                                chunk_embedding=kwargs.get("chunk_embedding", SEMANTIC_CHUNK_EMBEDDING),
+                                                embedding_cache=kwargs.get("embedding_cache"))
     elif parsing_method == "simple":
         chunk_size = kwargs.get("chunk_size")
         chunk_overlap = kwargs.get("chunk_overlap")
@@ -46,40 +83,195 @@ def load_reranker_model() -> CrossEncoder:
     return CrossEncoder(RERANKER_MODEL_PATH)
 
 
-def get_retriever_(pdf_file, node_parser_type,Settings,top_k, **kwargs):
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def index_cache_key(pdf_file: str, embed_model, node_parser_type: str, vector_store: str = VECTOR_STORE, **kwargs) -> dict:
+    """Everything the built index depends on: the PDF content, the embedding model, the node parser settings and the vector store."""
+    if node_parser_type == "semantic":
+        parser_params = {"buffer_size": SEMANTIC_BUFFER_SIZE,
+                         "breakpoint_percentile_threshold": SEMANTIC_BREAKPOINT_PERCENTILE,
+                         "chunk_embedding": kwargs.get("chunk_embedding", SEMANTIC_CHUNK_EMBEDDING)}
+    else:
+        parser_params = {"chunk_size": kwargs.get("chunk_size"), "chunk_overlap": kwargs.get("chunk_overlap")}
+    return {
+        "version": INDEX_CACHE_VERSION,
+        "pdf_sha256": file_hash(pdf_file),
+        "pdf_reader": PDF_READER_METHOD,
+        "embed_model": getattr(embed_model, "model_name", type(embed_model).__name__),
+        "node_parser_type": node_parser_type,
+        "parser_params": parser_params,
+        "vector_store": vector_store,
+    }
+
+
+def index_persist_dir(cache_dir: str, key: dict) -> str:
+    """Directory of the cached index with this cache key."""
+    return os.path.join(cache_dir, hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()[:32])
+
+
+def get_storage_context(vector_store: str = VECTOR_STORE, persist_dir=None) -> StorageContext:
+    """Storage context with the chosen vector store, empty or loaded from a persisted index."""
+    if vector_store not in VECTOR_STORES:
+        raise ValueError(f'Invalid Vector Store: {vector_store}, choose one of {", ".join(VECTOR_STORES)}')
+    if vector_store == "simple":
+        return StorageContext.from_defaults(persist_dir=persist_dir)
+    store = (QuantizedVectorStore.from_persist_dir(persist_dir) if persist_dir is not None
+             else QuantizedVectorStore(mode=vector_store))
+    return StorageContext.from_defaults(persist_dir=persist_dir, vector_store=store)
+
+
+def build_index(pdf_file, node_parser_type, Settings, vector_store=VECTOR_STORE, **kwargs) -> VectorStoreIndex:
         """
-        Sets up the entire RAG pipeline, from document preparation to indexing.
+        Prepares, splits and embeds a PDF into an in-memory vector index.
 
         Args:
-            pdf_paths (str): Path to the directory containing PDF files.
+            pdf_file (str): Path to the PDF file.
             node_parser_type (str): Method to use for parsing documents ('semantic', 'simple', etc.).
-            **kwargs: Additional arguments for specific parsers and retrievers.
+            vector_store (str): 'simple', or 'float', 'int8', 'binary' for a QuantizedVectorStore.
+            **kwargs: Additional arguments for specific parsers.
 
         Returns:
-            VectorIndex: A configured query pipeline ready to run queries.
+            VectorStoreIndex: The index over the document's nodes.
         """
 
         document_processor = DocumentProcessor()
 
         # Step 1: Prepare documents
-        documents = document_processor.prepare_single_document(pdf_file=pdf_file)
+        documents = document_processor.prepare_single_document(pdf_file=pdf_file, method=PDF_READER_METHOD)
 
         # Step 2: Run ingestion pipeline
         node_parser = get_node_parser(Settings.embed_model, parsing_method=node_parser_type, **kwargs)
         nodes = node_parser.get_nodes_from_documents(documents)
 
         # Step 3: prepare vector index
-        return VectorStoreIndex(nodes).as_retriever(similarity_top_k=top_k)
+        return VectorStoreIndex(nodes, storage_context=get_storage_context(vector_store))
+
+
+def load_or_build_index(pdf_file, node_parser_type, Settings, cache_dir=INDEX_CACHE_DIR, vector_store=VECTOR_STORE,
+                        **kwargs) -> VectorStoreIndex:
+        """
+        Loads the index of a PDF from the on-disk cache, or builds and caches it.
+
+        The cache key covers the PDF content hash, the embedding model name, the node parser type and
+        its parameters and the vector store, so a cached index is only reused when nothing it depends on
+        has changed. Loading reads the stored nodes and embeddings and does not run the embedding model;
+        a quantized store memory-maps its float vectors. When a semantic index is built, the sentence
+        embeddings of the splitter come from EMBEDDING_CACHE_FILE in the cache directory.
+
+        Args:
+            pdf_file (str): Path to the PDF file.
+            node_parser_type (str): Method to use for parsing documents ('semantic', 'simple', etc.).
+            cache_dir (str): Directory of cached indexes, or None to always build.
+            vector_store (str): 'simple', or 'float', 'int8', 'binary' for a QuantizedVectorStore.
+            **kwargs: Additional arguments for specific parsers.
+
+        Returns:
+            VectorStoreIndex: The cached or newly built index.
+        """
+        if cache_dir is None:
+            return build_index(pdf_file, node_parser_type, Settings, vector_store=vector_store, **kwargs)
+
+        key = index_cache_key(pdf_file, Settings.embed_model, node_parser_type, vector_store=vector_store, **kwargs)
+        persist_dir = index_persist_dir(cache_dir, key)
+        if os.path.isdir(persist_dir):
+            print(f'Loading cached index for {pdf_file} from {persist_dir}')
+            return load_index_from_storage(get_storage_context(vector_store, persist_dir=persist_dir))
 
-def get_retriever(pdf_file, embed_model, node_parsing_method,top_k):
+        if node_parser_type == "semantic":
+            kwargs.setdefault("embedding_cache", EmbeddingCache(os.path.join(cache_dir, EMBEDDING_CACHE_FILE)))
+        index = build_index(pdf_file, node_parser_type, Settings, vector_store=vector_store, **kwargs)
+        # Persist to a temporary directory and rename it, so an interrupted run never leaves a partial index behind.
+        os.makedirs(cache_dir, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(dir=cache_dir, prefix=".tmp-")
+        try:
+            index.storage_context.persist(persist_dir=staging_dir)
+            with open(os.path.join(staging_dir, "cache_key.json"), "w") as f:
+                json.dump({**key, "pdf_file": pdf_file}, f, indent=2)
+            os.replace(staging_dir, persist_dir)
+        except OSError:
+            # Another process cached the same index first.
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        return index
+
+
+def load_or_build_bm25(index: VectorStoreIndex, top_k: int, persist_dir=None) -> BM25Retriever:
+        """
+        BM25 retriever over the nodes of an index, loaded from `persist_dir/BM25_DIR` or built and saved there.
+
+        Args:
+            index (VectorStoreIndex): Index whose docstore holds the nodes.
+            top_k (int): Number of nodes to retrieve.
+            persist_dir (str): Directory of the cached index, or None to build without saving.
+
+        Returns:
+            BM25Retriever: The sparse retriever of the hybrid retriever.
+        """
+        bm25_dir = os.path.join(persist_dir, BM25_DIR) if persist_dir is not None else None
+        if bm25_dir is not None and os.path.isdir(bm25_dir):
+            retriever = BM25Retriever.from_persist_dir(bm25_dir)
+            retriever.similarity_top_k = top_k
+            return retriever
+
+        retriever = BM25Retriever.from_defaults(nodes=list(index.docstore.docs.values()), similarity_top_k=top_k)
+        if bm25_dir is not None:
+            staging_dir = tempfile.mkdtemp(dir=persist_dir, prefix=".tmp-")
+            try:
+                retriever.persist(staging_dir)
+                os.replace(staging_dir, bm25_dir)
+            except OSError:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+        return retriever
+
+
+def get_retriever_(pdf_file, node_parser_type,Settings,top_k, cache_dir=INDEX_CACHE_DIR, retriever_mode="dense",
+                   vector_store=VECTOR_STORE, **kwargs):
+        """
+        Sets up the entire RAG pipeline, from document preparation to indexing.
+
+        Args:
+            pdf_paths (str): Path to the directory containing PDF files.
+            node_parser_type (str): Method to use for parsing documents ('semantic', 'simple', etc.).
+            cache_dir (str): Directory of cached indexes, or None to always rebuild the index.
+            retriever_mode (str): 'dense' for the vector index alone, 'hybrid' to fuse it with BM25.
+            vector_store (str): 'simple', or 'float', 'int8', 'binary' for a QuantizedVectorStore.
+            **kwargs: Additional arguments for specific parsers and retrievers.
+
+        Returns:
+            VectorIndex: A configured query pipeline ready to run queries.
+        """
+        index = load_or_build_index(pdf_file, node_parser_type, Settings, cache_dir=cache_dir, vector_store=vector_store,
+                                    **kwargs)
+        dense_retriever = index.as_retriever(similarity_top_k=top_k)
+        if retriever_mode == "dense":
+            return dense_retriever
+        elif retriever_mode == "hybrid":
+            persist_dir = None
+            if cache_dir is not None:
+                key = index_cache_key(pdf_file, Settings.embed_model, node_parser_type, vector_store=vector_store,
+                                      **kwargs)
+                persist_dir = index_persist_dir(cache_dir, key)
+            sparse_retriever = load_or_build_bm25(index, top_k, persist_dir=persist_dir)
+            return HybridRetriever(dense_retriever, None, similarity_top_k=top_k, query_instruction=QUERY_INSTRUCTION,
+                                   sparse_retriever=sparse_retriever)
+        raise ValueError(f'Invalid Retriever Mode: {retriever_mode}, choose one of "dense", "hybrid"')
+
+def get_retriever(pdf_file, embed_model, node_parsing_method,top_k, cache_dir=INDEX_CACHE_DIR, retriever_mode="dense",
+                  vector_store=VECTOR_STORE):
     Settings.embed_model = embed_model
 
     if node_parsing_method == "semantic":
-        retriever = get_retriever_(pdf_file, node_parsing_method, Settings,top_k)
+        retriever = get_retriever_(pdf_file, node_parsing_method, Settings,top_k, cache_dir=cache_dir,
+                                   retriever_mode=retriever_mode, vector_store=vector_store)
     elif node_parsing_method == "simple":
-        retriever = get_retriever_(pdf_file, node_parsing_method, Settings,top_k, chunk_size = 376, chunk_overlap=128)
+        retriever = get_retriever_(pdf_file, node_parsing_method, Settings,top_k, cache_dir=cache_dir,
+                                   retriever_mode=retriever_mode, vector_store=vector_store,
+                                   chunk_size=SIMPLE_CHUNK_SIZE, chunk_overlap=SIMPLE_CHUNK_OVERLAP)
     
     return retriever
-
-    
-
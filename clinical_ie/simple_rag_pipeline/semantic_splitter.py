@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.node_parser import SemanticSplitterNodeParser
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.schema import BaseNode, Document, MetadataMode
+
+# How chunk embeddings are obtained after splitting:
+# "embed" embeds the chunk text, as VectorStoreIndex would, in one batch with cache lookups;
+# "pooled" averages the sentence-window embeddings the splitter already computed, so chunks are not embedded
+# again; retrieval recall with pooled vectors is not measured yet (see benchmark_chunk_embeddings);
+# "none" leaves chunks without embeddings, for VectorStoreIndex to embed.
+CHUNK_EMBEDDING_MODES = ("embed", "pooled", "none")
+# Embeddings held by an EmbeddingCache without a file, most recently used first.
+MAX_MEMORY_ENTRIES = 10000
+# Records are written with the key first, so the key is read without parsing the embedding.
+_RECORD_START = re.compile(rb'\{"key": "([0-9a-f]{64})"')
+
+
+class EmbeddingCache:
+    """
+    Text embeddings keyed by the SHA-256 of the model name and the text.
+
+    With a path, entries are appended to a JSON lines file and found again on the next run, so
+    re-splitting a document after a change of cleaning or chunking only embeds the new sentences.
+    Only the byte offset of each entry is held in memory; embeddings are read from the file when they
+    are looked up. Without a path, the `max_entries` most recently used embeddings are kept in memory.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = MAX_MEMORY_ENTRIES) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self._offsets: Dict[str, int] = {}
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.model_calls = 0
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                offset = 0
+                for line in f:
+                    match = _RECORD_START.match(line)
+                    # A line without its end is the last line of an interrupted run.
+                    if match is not None and line.endswith(b"}\n"):
+                        self._offsets[match.group(1).decode()] = offset
+                    offset += len(line)
+
+    @staticmethod
+    def key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{text}".encode()).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._offsets) + len(self._memory)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._offsets or key in self._memory
+
+    def _read(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found = {}
+        for key in keys:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                found[key] = self._memory[key].tolist()
+        # Sorted by offset, so the entries of one document are read in one pass over the file.
+        on_disk = sorted({key for key in keys if key in self._offsets}, key=self._offsets.__getitem__)
+        if on_disk:
+            with open(self.path, "rb") as f:
+                for key in on_disk:
+                    f.seek(self._offsets[key])
+                    found[key] = json.loads(f.readline())["embedding"]
+        return found
+
+    def _store(self, entries: Dict[str, List[float]]) -> None:
+        if self.path is None:
+            for key, embedding in entries.items():
+                self._memory[key] = np.asarray(embedding, dtype=np.float32)
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a+b") as f:
+            offset = f.seek(0, os.SEEK_END)
+            if offset:
+                f.seek(offset - 1)
+                if f.read(1) != b"\n":
+                    # Start after the partial line of an interrupted run instead of appending to it.
+                    offset += f.write(b"\n")
+            for key, embedding in entries.items():
+                self._offsets[key] = offset
+                offset += f.write((json.dumps({"key": key, "embedding": embedding}) + "\n").encode())
+
+    def get_text_embedding_batch(self, embed_model, texts: List[str]) -> List[List[float]]:
+        """
+        Embeddings of texts, looked up in the cache; the missing texts are embedded in one batched call.
+
+        Args:
+            embed_model: llama-index embedding model.
+            texts (List[str]): Texts to embed.
+
+        Returns:
+            List[List[float]]: One embedding per text, in order.
+        """
+        model_name = getattr(embed_model, "model_name", type(embed_model).__name__)
+        keys = [self.key(model_name, text) for text in texts]
+        missing = {key: text for key, text in zip(keys, texts) if key not in self}
+        self.hits += len(keys) - sum(1 for key in keys if key in missing)
+        self.misses += len(missing)
+        found = self._read([key for key in keys if key not in missing])
+        if missing:
+            self.model_calls += 1
+            embeddings = embed_model.get_text_embedding_batch(list(missing.values()))
+            new_entries = dict(zip(missing, embeddings))
+            self._store(new_entries)
+            found.update(new_entries)
+        return [found[key] for key in keys]
+
+
+class CachedSemanticSplitterNodeParser(SemanticSplitterNodeParser):
+    """
+    SemanticSplitterNodeParser that embeds once per document set and reuses its work for the chunks.
+
+    The sentence windows of all documents are embedded in one batch through an EmbeddingCache, instead
+    of one model call per page. Breakpoints are the same as the parent's. Chunk embeddings are then
+    embedded through the cache, pooled from the windows of their sentences, or left to the index,
+    depending on `chunk_embedding`; the index does not re-embed nodes that already have an embedding.
+    """
+
+    chunk_embedding: str = Field(default="embed", description="One of CHUNK_EMBEDDING_MODES.")
+
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, embedding_cache: Optional[EmbeddingCache] = None, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        if self.chunk_embedding not in CHUNK_EMBEDDING_MODES:
+            raise ValueError(f'Invalid Chunk Embedding: {self.chunk_embedding}, '
+                             f'choose one of {", ".join(CHUNK_EMBEDDING_MODES)}')
+        self._cache = embedding_cache if embedding_cache is not None else EmbeddingCache()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedSemanticSplitterNodeParser"
+
+    @property
+    def embedding_cache(self) -> EmbeddingCache:
+        return self._cache
+
+    def _parse_nodes(self, nodes: Sequence[BaseNode], show_progress: bool = False, **kwargs: Any) -> List[BaseNode]:
+        return self.build_semantic_nodes_from_documents(nodes, show_progress)
+
+    def _sentence_groups(self, distances: List[float]) -> List[range]:
+        # The breakpoint rule of SemanticSplitterNodeParser._build_node_chunks, as ranges of sentence positions.
+        threshold = np.percentile(distances, self.breakpoint_percentile_threshold)
+        groups = []
+        start = 0
+        for index, distance in enumerate(distances):
+            if distance > threshold:
+                groups.append(range(start, index + 1))
+                start = index + 1
+        groups.append(range(start, len(distances) + 1))
+        return groups
+
+    def build_semantic_nodes_from_documents(self, documents: Sequence[Document],
+                                            show_progress: bool = False) -> List[BaseNode]:
+        sentence_groups = [self._build_sentence_groups(self.sentence_splitter(doc.text)) for doc in documents]
+        embeddings = self._cache.get_text_embedding_batch(
+            self.embed_model, [s["combined_sentence"] for sentences in sentence_groups for s in sentences])
+
+        all_nodes: List[BaseNode] = []
+        offset = 0
+        for doc, sentences in zip(documents, sentence_groups):
+            window_embeddings = embeddings[offset:offset + len(sentences)]
+            offset += len(sentences)
+            for sentence, embedding in zip(sentences, window_embeddings):
+                sentence["combined_sentence_embedding"] = embedding
+            distances = self._calculate_distances_between_sentence_groups(sentences)
+            if not distances:
+                # As in the parent: a document of one sentence (or none) is a single chunk.
+                nodes = build_nodes_from_splits([" ".join(s["sentence"] for s in sentences)], doc, id_func=self.id_func)
+                if self.chunk_embedding == "pooled" and window_embeddings:
+                    nodes[0].embedding = list(window_embeddings[0])
+                all_nodes.extend(nodes)
+                continue
+
+            groups = self._sentence_groups(distances)
+            chunks = ["".join(sentences[i]["sentence"] for i in group) for group in groups]
+            nodes = build_nodes_from_splits(chunks, doc, id_func=self.id_func)
+            if self.chunk_embedding == "pooled":
+                window_matrix = np.asarray(window_embeddings, dtype=np.float32)
+                for node, group in zip(nodes, groups):
+                    pooled = window_matrix[group.start:group.stop].mean(axis=0)
+                    node.embedding = (pooled / (np.linalg.norm(pooled) or 1.0)).tolist()
+            all_nodes.extend(nodes)
+        return all_nodes
+
+    def _postprocess_parsed_nodes(self, nodes: List[BaseNode], parent_doc_map: Dict[str, Document]) -> List[BaseNode]:
+        nodes = super()._postprocess_parsed_nodes(nodes, parent_doc_map)
+        if self.chunk_embedding == "embed":
+            # After post-processing, so the text includes the inherited metadata exactly as the index would embed it.
+            embeddings = self._cache.get_text_embedding_batch(
+                self.embed_model, [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes])
+            for node, embedding in zip(nodes, embeddings):
+                node.embedding = embedding
+        return nodes
@@ -0,0 +1,70 @@
+import unittest
+from typing import List
+
+try:
+    from llama_index.core.retrievers import BaseRetriever
+    from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+    from clinical_ie.simple_rag_pipeline.hybrid_retriever import RRF_K, HybridRetriever, is_confident
+except ImportError:  # llama-index is not installed
+    BaseRetriever = object
+    HybridRetriever = None
+
+INSTRUCTION = "Represent this query: "
+
+
+class FixedRetriever(BaseRetriever):
+    """Returns the same node ids, in order, for every query, and records the query strings it saw."""
+
+    def __init__(self, node_ids: List[str]) -> None:
+        self.node_ids = node_ids
+        self.queries: List[str] = []
+        super().__init__()
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        self.queries.append(query_bundle.query_str)
+        return [NodeWithScore(node=TextNode(id_=node_id, text=f"text of {node_id}"), score=1.0 - rank / 10)
+                for rank, node_id in enumerate(self.node_ids)]
+
+
+@unittest.skipIf(HybridRetriever is None, "the clinical_ie requirements are not installed")
+class TestHybridRetriever(unittest.TestCase):
+
+    def hybrid(self, dense_ids, sparse_ids, top_k):
+        self.dense = FixedRetriever(dense_ids)
+        self.sparse = FixedRetriever(sparse_ids)
+        return HybridRetriever(self.dense, None, similarity_top_k=top_k, query_instruction=INSTRUCTION,
+                               sparse_retriever=self.sparse)
+
+    def test_reciprocal_rank_fusion_order(self):
+        hybrid = self.hybrid(["a", "b", "c", "d"], ["c", "a", "e"], top_k=4)
+        results = hybrid.retrieve_fused(f"{INSTRUCTION}rectal tumor")
+
+        self.assertEqual([entry.node.node.node_id for entry in results], ["a", "c", "b", "e"])
+        self.assertEqual([(entry.dense_rank, entry.sparse_rank) for entry in results],
+                         [(0, 1), (2, 0), (1, None), (None, 2)])
+        self.assertAlmostEqual(results[0].score, 1 / (RRF_K + 1) + 1 / (RRF_K + 2))
+        self.assertEqual([entry.node.score for entry in results], [entry.score for entry in results])
+        # Only the embedding query carries the instruction.
+        self.assertEqual(self.dense.queries, [f"{INSTRUCTION}rectal tumor"])
+        self.assertEqual(self.sparse.queries, ["rectal tumor"])
+        self.assertEqual([n.node.node_id for n in hybrid.retrieve(f"{INSTRUCTION}rectal tumor")], ["a", "c", "b", "e"])
+
+    def test_ties_keep_dense_order(self):
+        results = self.hybrid(["a", "b"], ["b", "a"], top_k=2).retrieve_fused("query")
+        self.assertEqual([entry.node.node.node_id for entry in results], ["a", "b"])
+
+    def test_is_confident_when_both_rankings_agree_on_the_top_k(self):
+        agree = self.hybrid(["a", "b", "c", "d"], ["b", "a", "d"], top_k=4).retrieve_fused("query")
+        self.assertTrue(is_confident(agree, 2))
+        # The fused top 3 is a, b, d; d is only fourth in the dense ranking.
+        self.assertFalse(is_confident(agree, 3))
+
+        # The fused top 2 is a, b; b is only third in the sparse ranking.
+        disagree = self.hybrid(["a", "b"], ["c", "a", "b"], top_k=4).retrieve_fused("query")
+        self.assertFalse(is_confident(disagree, 2))
+        self.assertFalse(is_confident(self.hybrid(["a"], ["a"], top_k=4).retrieve_fused("query"), 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    from llama_index.core.schema import MetadataMode, TextNode
+
+    from clinical_ie.simple_rag_pipeline import ingestion
+    from clinical_ie.simple_rag_pipeline.test_rag_utils import FakeEmbedding
+except ImportError:  # llama-index and sentence-transformers are not installed
+    ingestion = None
+
+
+def prepare_text(pdf_file, node_parser_type, sha256):
+    """Stand-in for ingestion._prepare: one chunk per line of a text file; "crash" kills the worker process."""
+    with open(pdf_file) as f:
+        lines = f.read().splitlines()
+    if lines and lines[0] == "crash":
+        os._exit(1)
+    nodes = [TextNode(text=line, metadata={"file_name": os.path.basename(pdf_file)}) for line in lines]
+    return ingestion.PreparedDocument(pdf_file, sha256, pages=1, nodes=nodes)
+
+
+@unittest.skipIf(ingestion is None, "the clinical_ie requirements are not installed")
+class TestIngestion(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.source = os.path.join(directory.name, "pdfs")
+        self.output_dir = os.path.join(directory.name, "corpus")
+        os.makedirs(self.source)
+        self.embed_model = FakeEmbedding()
+        patcher = mock.patch.object(ingestion, "_prepare", prepare_text)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_pdf(self, name, *lines):
+        with open(os.path.join(self.source, name), "w") as f:
+            f.write("\n".join(lines))
+        return os.path.join(self.source, name)
+
+    def ingest(self, workers=2):
+        return ingestion.ingest_corpus(self.source, self.output_dir, embed_model=self.embed_model, workers=workers)
+
+    def manifest(self):
+        with open(os.path.join(self.output_dir, ingestion.MANIFEST_FILE)) as f:
+            return [json.loads(line) for line in f]
+
+    def test_corpus_round_trip(self):
+        self.write_pdf("a.pdf", "age 72 years", "ulcerative colitis")
+        self.write_pdf("b.pdf", "rectal tumor")
+        stats = self.ingest()
+
+        self.assertEqual((stats.documents, stats.failed, stats.skipped, stats.chunks), (2, 0, 0, 3))
+        self.assertEqual(sorted((os.path.basename(entry["pdf_file"]), entry["status"], entry["chunks"])
+                                for entry in self.manifest()), [("a.pdf", "ok", 2), ("b.pdf", "ok", 1)])
+        nodes = ingestion.load_corpus_nodes(self.output_dir)
+        self.assertEqual(sorted(node.text for node in nodes), ["age 72 years", "rectal tumor", "ulcerative colitis"])
+        for node in nodes:
+            self.assertEqual(node.embedding, FakeEmbedding.vector(node.get_content(metadata_mode=MetadataMode.EMBED)))
+            self.assertNotEqual(node.embedding, FakeEmbedding.vector(node.text))
+        self.assertEqual({node.metadata["file_name"] for node in nodes}, {"a.pdf", "b.pdf"})
+
+    def test_resume_skips_ingested_content_and_reingests_changed_pdfs(self):
+        pdf_file = self.write_pdf("a.pdf", "first version")
+        self.write_pdf("b.pdf", "unchanged")
+        self.ingest()
+        texts = self.embed_model.texts
+
+        stats = self.ingest()
+        self.assertEqual((stats.documents, stats.skipped), (0, 2))
+        self.assertEqual(self.embed_model.texts, texts)
+
+        self.write_pdf("a.pdf", "second version")
+        self.write_pdf("copy of b.pdf", "unchanged")
+        stats = self.ingest()
+        self.assertEqual((stats.documents, stats.skipped), (1, 2))
+        self.assertEqual(ingestion._completed(self.output_dir)[ingestion.file_hash(pdf_file)], pdf_file)
+        self.assertEqual(sorted(node.text for node in ingestion.load_corpus_nodes(self.output_dir)),
+                         ["second version", "unchanged"])
+
+    def test_interrupted_writes_are_ignored(self):
+        self.write_pdf("a.pdf", "age 72 years")
+        self.ingest()
+        # Chunks written without their manifest entry, and a partial manifest line.
+        writer = ingestion.CorpusWriter(self.output_dir)
+        writer.nodes.write(json.dumps({"id": "orphan", "text": "orphan", "metadata": {}, "embedding": [0.0],
+                                       "sha256": "0", "ingestion_id": "interrupted"}) + "\n")
+        writer.manifest.write('{"pdf_file": "b.pdf", "sha')
+        writer.close()
+
+        self.assertEqual(list(ingestion._completed(self.output_dir).values()), [os.path.join(self.source, "a.pdf")])
+        self.assertEqual([node.text for node in ingestion.load_corpus_nodes(self.output_dir)], ["age 72 years"])
+
+    def test_worker_crash_fails_only_the_crashing_document(self):
+        for i in range(6):
+            self.write_pdf(f"{i}.pdf", f"document {i}")
+        self.write_pdf("3.pdf", "crash")
+        stats = self.ingest(workers=2)
+
+        self.assertEqual((stats.documents, stats.failed, stats.chunks), (6, 1, 5))
+        failed = [entry for entry in self.manifest() if entry["status"] == "failed"]
+        self.assertEqual([os.path.basename(entry["pdf_file"]) for entry in failed], ["3.pdf"])
+        self.assertTrue(failed[0]["error"].startswith("BrokenProcessPool"))
+        self.assertEqual(sorted(node.text for node in ingestion.load_corpus_nodes(self.output_dir)),
+                         [f"document {i}" for i in range(6) if i != 3])
+
+    def test_semantic_parsing_reuses_one_parser_across_batches(self):
+        self.write_pdf("a.pdf", "Colonoscopy showed a rectal tumor. Biopsy revealed adenocarcinoma. He had surgery.")
+        self.write_pdf("b.pdf", "Colonoscopy showed a rectal tumor. Biopsy revealed adenocarcinoma. He died.")
+        build_parser = ingestion.get_node_parser
+        parsers = []
+
+        def get_node_parser(*args, **kwargs):
+            parsers.append(build_parser(*args, **kwargs))
+            return parsers[-1]
+
+        with mock.patch.object(ingestion, "get_node_parser", get_node_parser):
+            stats = ingestion.ingest_corpus(self.source, self.output_dir, embed_model=self.embed_model,
+                                            node_parser_type="semantic", workers=1, embed_batch_size=1)
+        self.assertEqual((stats.documents, stats.failed), (2, 0))
+        self.assertEqual(len(parsers), 1)
+        # One batch per document: the window of the first sentence, the same in both documents, is embedded once.
+        self.assertEqual(parsers[0].embedding_cache.hits, 1)
+        self.assertTrue(all(node.embedding is not None for node in ingestion.load_corpus_nodes(self.output_dir)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from typing import List
+from unittest import mock
+
+import numpy as np
+
+try:
+    from llama_index.core.base.embeddings.base import BaseEmbedding
+    from llama_index.core.settings import Settings
+
+    from clinical_ie.simple_rag_pipeline import rag_utils
+except ImportError:  # llama-index and sentence-transformers are not installed
+    BaseEmbedding = object
+    rag_utils = None
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), "..", "MACCR",
+                          "Tsuchiya et al. - 2017 - A case of concomitant colitic cancer and intrahepa.pdf")
+FAKE_DIMENSION = 32
+
+
+class FakeEmbedding(BaseEmbedding):
+    """Deterministic bag-of-words embedding that counts the model calls and the texts it embedded."""
+
+    model_name: str = "fake-embedding"
+    calls: int = 0
+    texts: int = 0
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeEmbedding"
+
+    @staticmethod
+    def vector(text: str) -> List[float]:
+        vector = np.zeros(FAKE_DIMENSION, dtype=np.float32)
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % FAKE_DIMENSION] += 1.0
+        return (vector / (np.linalg.norm(vector) or 1.0)).tolist()
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        return [self.vector(text) for text in texts]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self.vector(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self.vector(query)
+
+
+@unittest.skipIf(rag_utils is None, "the clinical_ie requirements are not installed")
+class TestIndexCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.embed_model = FakeEmbedding()
+        Settings.embed_model = self.embed_model
+
+    def pdf(self, name: str, content: bytes) -> str:
+        path = os.path.join(self.directory.name, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_key_changes_with_every_input(self):
+        pdf_file = self.pdf("a.pdf", b"%PDF first")
+        simple = {"chunk_size": 376, "chunk_overlap": 128}
+        key = rag_utils.index_cache_key(pdf_file, self.embed_model, "simple", **simple)
+        self.assertEqual(key, rag_utils.index_cache_key(pdf_file, FakeEmbedding(), "simple", **simple))
+
+        variants = [
+            rag_utils.index_cache_key(self.pdf("b.pdf", b"%PDF second"), self.embed_model, "simple", **simple),
+            rag_utils.index_cache_key(pdf_file, FakeEmbedding(model_name="other"), "simple", **simple),
+            rag_utils.index_cache_key(pdf_file, self.embed_model, "simple", chunk_size=512, chunk_overlap=128),
+            rag_utils.index_cache_key(pdf_file, self.embed_model, "simple", chunk_size=376, chunk_overlap=64),
+            rag_utils.index_cache_key(pdf_file, self.embed_model, "simple", vector_store="int8", **simple),
+            rag_utils.index_cache_key(pdf_file, self.embed_model, "semantic"),
+        ]
+        with mock.patch.object(rag_utils, "PDF_READER_METHOD", "simple"):
+            variants.append(rag_utils.index_cache_key(pdf_file, self.embed_model, "simple", **simple))
+        with mock.patch.object(rag_utils, "INDEX_CACHE_VERSION", rag_utils.INDEX_CACHE_VERSION + 1):
+            variants.append(rag_utils.index_cache_key(pdf_file, self.embed_model, "simple", **simple))
+        for variant in variants:
+            self.assertNotEqual(variant, key)
+        self.assertNotEqual(rag_utils.index_cache_key(pdf_file, self.embed_model, "semantic"),
+                            rag_utils.index_cache_key(pdf_file, self.embed_model, "semantic", chunk_embedding="none"))
+
+    def check_second_call_loads_without_embedding(self, vector_store: str):
+        cache_dir = os.path.join(self.directory.name, "cache")
+        built = rag_utils.load_or_build_index(SAMPLE_PDF, "simple", Settings, cache_dir=cache_dir,
+                                              vector_store=vector_store, chunk_size=376, chunk_overlap=128)
+        self.assertGreater(self.embed_model.texts, 0)
+        calls = self.embed_model.calls
+
+        loaded = rag_utils.load_or_build_index(SAMPLE_PDF, "simple", Settings, cache_dir=cache_dir,
+                                               vector_store=vector_store, chunk_size=376, chunk_overlap=128)
+        self.assertEqual(self.embed_model.calls, calls)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+        self.assertEqual(sorted(loaded.docstore.docs), sorted(built.docstore.docs))
+
+        query = "colonoscopy every year"
+        top = [n.node.node_id for n in built.as_retriever(similarity_top_k=3).retrieve(query)]
+        self.assertEqual([n.node.node_id for n in loaded.as_retriever(similarity_top_k=3).retrieve(query)], top)
+
+    def test_second_call_loads_from_disk_without_embedding(self):
+        self.check_second_call_loads_without_embedding("simple")
+
+    def test_second_call_loads_quantized_store_without_embedding(self):
+        self.check_second_call_loads_without_embedding("int8")
+
+    def test_hybrid_retriever_loads_persisted_bm25(self):
+        cache_dir = os.path.join(self.directory.name, "cache")
+        query = f"{rag_utils.QUERY_INSTRUCTION}ulcerative colitis colonoscopy"
+        built = rag_utils.get_retriever(SAMPLE_PDF, self.embed_model, "simple", 3, cache_dir=cache_dir,
+                                        retriever_mode="hybrid")
+        persist_dir, = os.listdir(cache_dir)
+        self.assertTrue(os.path.isdir(os.path.join(cache_dir, persist_dir, rag_utils.BM25_DIR)))
+
+        with mock.patch.object(rag_utils.BM25Retriever, "from_defaults") as from_defaults:
+            loaded = rag_utils.get_retriever(SAMPLE_PDF, self.embed_model, "simple", 5, cache_dir=cache_dir,
+                                             retriever_mode="hybrid")
+        from_defaults.assert_not_called()
+        self.assertEqual(loaded.sparse_retriever.similarity_top_k, 5)
+        loaded.sparse_retriever.similarity_top_k = loaded.similarity_top_k = 3
+        self.assertEqual([(entry.node.node.node_id, entry.sparse_rank) for entry in loaded.retrieve_fused(query)],
+                         [(entry.node.node.node_id, entry.sparse_rank) for entry in built.retrieve_fused(query)])
+
+
+if __name__ == '__main__':
+    unittest.main()
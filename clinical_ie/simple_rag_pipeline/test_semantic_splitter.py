@@ -0,0 +1,137 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+try:
+    from llama_index.core import Document
+    from llama_index.core.node_parser import SemanticSplitterNodeParser
+    from llama_index.core.schema import MetadataMode
+
+    from clinical_ie.simple_rag_pipeline.semantic_splitter import CachedSemanticSplitterNodeParser, EmbeddingCache
+    from clinical_ie.simple_rag_pipeline.test_rag_utils import FakeEmbedding
+except ImportError:  # llama-index is not installed
+    CachedSemanticSplitterNodeParser = None
+
+CASE_REPORTS = [
+    "A 72-year-old man was admitted with abdominal pain. He had a history of ulcerative colitis for 20 years. "
+    "Colonoscopy showed a rectal tumor. Biopsy revealed adenocarcinoma. The tumor was resected. "
+    "Computed tomography showed a mass in the liver. The liver mass was an intrahepatic cholangiocarcinoma. "
+    "He received chemotherapy after surgery. He is alive without recurrence two years later.",
+    "A 45-year-old woman presented with fever and cough. Chest radiography showed an infiltrate. "
+    "Sputum culture grew Streptococcus pneumoniae. She was treated with antibiotics. The fever resolved. "
+    "She smokes ten cigarettes a day. Her mother had breast cancer. She was discharged on day seven.",
+]
+
+
+@unittest.skipIf(CachedSemanticSplitterNodeParser is None, "the clinical_ie requirements are not installed")
+class TestCachedSemanticSplitter(unittest.TestCase):
+
+    def setUp(self):
+        self.embed_model = FakeEmbedding()
+        self.documents = [Document(text=text, metadata={"file_name": f"{i}.pdf"}) for i, text in enumerate(CASE_REPORTS)]
+
+    def parser(self, chunk_embedding=None, cache=None):
+        kwargs = {"chunk_embedding": chunk_embedding} if chunk_embedding is not None else {}
+        return CachedSemanticSplitterNodeParser(buffer_size=1, breakpoint_percentile_threshold=80,
+                                                embed_model=self.embed_model, embedding_cache=cache, **kwargs)
+
+    def test_chunks_match_the_parent_splitter(self):
+        parent = SemanticSplitterNodeParser(buffer_size=1, breakpoint_percentile_threshold=80,
+                                            embed_model=FakeEmbedding())
+        expected = [node.text for node in parent.get_nodes_from_documents(self.documents)]
+        nodes = self.parser().get_nodes_from_documents(self.documents)
+        self.assertGreater(len(expected), len(self.documents))
+        self.assertEqual([node.text for node in nodes], expected)
+
+    def test_chunks_are_embedded_by_default_in_one_batch(self):
+        parser = self.parser()
+        nodes = parser.get_nodes_from_documents(self.documents)
+        # One batch for the sentence windows of both documents, one for their chunks.
+        self.assertEqual(parser.embedding_cache.model_calls, 2)
+        for node in nodes:
+            self.assertEqual(node.embedding, FakeEmbedding.vector(node.get_content(metadata_mode=MetadataMode.EMBED)))
+
+    def test_pooled_chunk_embeddings_average_the_sentence_windows(self):
+        parser = self.parser("pooled")
+        nodes = parser.get_nodes_from_documents(self.documents[:1])
+        self.assertEqual(parser.embedding_cache.model_calls, 1)
+
+        sentences = parser._build_sentence_groups(parser.sentence_splitter(CASE_REPORTS[0]))
+        windows = np.array([FakeEmbedding.vector(sentence["combined_sentence"]) for sentence in sentences])
+        for sentence, window in zip(sentences, windows):
+            sentence["combined_sentence_embedding"] = window.tolist()
+        groups = parser._sentence_groups(parser._calculate_distances_between_sentence_groups(sentences))
+        self.assertEqual(len(groups), len(nodes))
+        for node, group in zip(nodes, groups):
+            pooled = windows[group.start:group.stop].mean(axis=0)
+            np.testing.assert_allclose(node.embedding, pooled / np.linalg.norm(pooled), rtol=1e-5)
+
+    def test_chunks_left_to_the_index(self):
+        nodes = self.parser("none").get_nodes_from_documents(self.documents)
+        self.assertTrue(all(node.embedding is None for node in nodes))
+        with self.assertRaises(ValueError):
+            self.parser("mean")
+
+    def test_cache_embeds_each_text_once(self):
+        cache = EmbeddingCache()
+        self.parser(cache=cache).get_nodes_from_documents(self.documents)
+        texts, calls = self.embed_model.texts, self.embed_model.calls
+        nodes = self.parser(cache=cache).get_nodes_from_documents(self.documents)
+        self.assertEqual((self.embed_model.texts, self.embed_model.calls), (texts, calls))
+        self.assertEqual(cache.misses, texts)
+        self.assertEqual(cache.hits, texts)
+        self.assertTrue(all(node.embedding is not None for node in nodes))
+
+
+@unittest.skipIf(CachedSemanticSplitterNodeParser is None, "the clinical_ie requirements are not installed")
+class TestEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "cache", "embeddings.jsonl")
+        self.embed_model = FakeEmbedding()
+
+    def test_file_is_indexed_by_offset_and_read_on_lookup(self):
+        texts = ["rectal tumor", "liver mass", "rectal tumor"]
+        cache = EmbeddingCache(self.path)
+        self.assertEqual(cache.get_text_embedding_batch(self.embed_model, texts),
+                         [FakeEmbedding.vector(text) for text in texts])
+        self.assertEqual((len(cache), self.embed_model.texts), (2, 2))
+
+        reopened = EmbeddingCache(self.path)
+        self.assertEqual(len(reopened), 2)
+        embeddings = reopened.get_text_embedding_batch(self.embed_model, ["liver mass", "fever", "rectal tumor"])
+        self.assertEqual(embeddings, [FakeEmbedding.vector(text) for text in ["liver mass", "fever", "rectal tumor"]])
+        self.assertEqual((reopened.hits, reopened.misses, self.embed_model.texts), (2, 1, 3))
+        self.assertEqual(len(EmbeddingCache(self.path)), 3)
+
+    def test_interrupted_line_is_skipped_and_not_appended_to(self):
+        EmbeddingCache(self.path).get_text_embedding_batch(self.embed_model, ["rectal tumor"])
+        with open(self.path, "a") as f:
+            f.write('{"key": "' + "0" * 64 + '", "embedding": [0.1, ')
+
+        cache = EmbeddingCache(self.path)
+        self.assertEqual(len(cache), 1)
+        cache.get_text_embedding_batch(self.embed_model, ["liver mass"])
+        reopened = EmbeddingCache(self.path)
+        self.assertEqual(len(reopened), 2)
+        self.assertEqual(reopened.get_text_embedding_batch(self.embed_model, ["liver mass", "rectal tumor"]),
+                         [FakeEmbedding.vector("liver mass"), FakeEmbedding.vector("rectal tumor")])
+        self.assertEqual(self.embed_model.texts, 2)
+
+    def test_memory_cache_keeps_the_most_recently_used_entries(self):
+        cache = EmbeddingCache(max_entries=2)
+        cache.get_text_embedding_batch(self.embed_model, ["a", "b"])
+        cache.get_text_embedding_batch(self.embed_model, ["a", "c"])
+        self.assertEqual(len(cache), 2)
+        self.assertIn(EmbeddingCache.key("fake-embedding", "a"), cache)
+        self.assertNotIn(EmbeddingCache.key("fake-embedding", "b"), cache)
+        self.assertEqual(cache.get_text_embedding_batch(self.embed_model, ["b"]), [FakeEmbedding.vector("b")])
+        self.assertEqual(self.embed_model.texts, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import random
+import re
+import unittest
+
+from clinical_ie.simple_rag_pipeline.text_cleaning_helpers import (UNICODE_BULLETS_RE, basic_clean, clean,
+                                                                   compile_cleaner)
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), "..", "MACCR",
+                          "Tsuchiya et al. - 2017 - A case of concomitant colitic cancer and intrahepa.pdf")
+
+# Characters that exercise every cleaner: whitespace runs, citations, hyphens, bullets and non-ASCII text.
+FUZZ_ALPHABET = list("ab AZ09[]-\n\n\xa0\t*•·é") + ["[1]", "[12]", "[123]", "[1234]", "- \n", "• ", "K",
+                                                  "a-", "é-", " - ", "-\n\n"]
+
+
+# The cleaning pipeline as it was before the passes were fused, kept as the reference.
+
+def reference_clean(text, extra_whitespace=False, broken_paragraphs=False, bullets=False, ascii=False,
+                    lowercase=False, citations=False, merge_split_words=False):
+    cleaned_text = text.lower() if lowercase else text
+    cleaned_text = cleaned_text.encode("ascii", "ignore").decode() if ascii else cleaned_text
+    cleaned_text = re.sub("\\[\\d{1,3}\\]", "", cleaned_text) if citations else cleaned_text
+    if extra_whitespace:
+        cleaned_text = re.sub(r"[\xa0\n]", " ", cleaned_text)
+        cleaned_text = re.sub(r"([ ]{2,})", " ", cleaned_text).strip()
+    if bullets and UNICODE_BULLETS_RE.match(cleaned_text) is not None:
+        cleaned_text = UNICODE_BULLETS_RE.sub(" ", cleaned_text, 1).strip()
+    cleaned_text = re.sub(r'(\w+)-\s+(\w+)', r'\1\2', cleaned_text) if merge_split_words else cleaned_text
+    return cleaned_text.strip()
+
+
+def reference_basic_clean(txt):
+    def is_int(s):
+        try:
+            int(s)
+            return True
+        except ValueError:
+            return False
+    txt = txt.replace('-\n', '')
+    txt = re.sub(r'(?<!\n)\n(?!\n|[A-Z0-9])', ' ', txt)
+    return '\n\n'.join([line for line in txt.split('\n') if not is_int(line)])
+
+
+def pdf_pages():
+    try:
+        import pymupdf
+    except ImportError:
+        return []
+    with pymupdf.open(SAMPLE_PDF) as pdf:
+        return [page.get_text() for page in pdf]
+
+
+class TestTextCleaning(unittest.TestCase):
+    OPTION_NAMES = ("extra_whitespace", "broken_paragraphs", "bullets", "ascii", "lowercase", "citations",
+                    "merge_split_words")
+
+    def all_options(self):
+        for mask in range(1 << len(self.OPTION_NAMES)):
+            yield {name: bool(mask >> i & 1) for i, name in enumerate(self.OPTION_NAMES)}
+
+    def assert_equivalent(self, texts):
+        for options in self.all_options():
+            for text in texts:
+                self.assertEqual(clean(text, **options), reference_clean(text, **options), (text, options))
+
+    def test_clean_matches_reference_on_handwritten_cases(self):
+        self.assert_equivalent([
+            "", "   ", "ITEM 1.     BUSINESS", "a [1] b", "a[1]b", "a [1][2] b", "[1] start", "end [2]",
+            "[[1]2]", "[1[2]]", "a [1234] b", "x [1]\n\n[2]  y", "import- ant", "a- b- c", "self-\ncontrol",
+            "•  This is an excellent point!", "- item", "** two bullets", "\xa0lead\xa0trail\xa0",
+            "Caf\xe9 [3] Kelvin", "tab\t\tkept  [4]\n",
+        ])
+
+    def test_clean_matches_reference_on_random_text(self):
+        rng = random.Random(0)
+        texts = ["".join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(0, 40))) for _ in range(300)]
+        self.assert_equivalent(texts)
+
+    @unittest.skipUnless(pdf_pages(), "pymupdf is not installed")
+    def test_document_cleaning_matches_reference_on_sample_pdf(self):
+        options = dict(extra_whitespace=True, broken_paragraphs=True, bullets=True, ascii=True,
+                       lowercase=False, citations=True, merge_split_words=True)
+        cleaner = compile_cleaner(**options)
+        for page in pdf_pages():
+            self.assertEqual(basic_clean(page), reference_basic_clean(page))
+            self.assertEqual(cleaner(basic_clean(page)), reference_clean(reference_basic_clean(page), **options))
+
+    def test_basic_clean_matches_reference(self):
+        rng = random.Random(1)
+        alphabet = list("ab A0 -\n\n+_") + ["12", "\n3\n", " 7 ", "-\n", "١"]
+        texts = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40))) for _ in range(500)]
+        for text in texts:
+            self.assertEqual(basic_clean(text), reference_basic_clean(text), text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from clinical_ie.simple_rag_pipeline.vector_quantization import MODES, QuantizedIndex
+
+try:
+    from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+    from llama_index.core.vector_stores.types import VectorStoreQuery
+
+    from clinical_ie.simple_rag_pipeline.quantized_store import QuantizedVectorStore
+except ImportError:  # llama-index is not installed
+    QuantizedVectorStore = None
+
+DIMENSIONS = 128
+
+
+def embeddings(rows: int, seed: int = 0) -> np.ndarray:
+    """Normalized vectors around 20 topic centroids, like chunk embeddings of a few documents."""
+    centroids = np.random.default_rng(0).normal(size=(20, DIMENSIONS))
+    generator = np.random.default_rng(seed)
+    vectors = centroids[generator.integers(0, 20, rows)] + 0.5 * generator.normal(size=(rows, DIMENSIONS))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def exact_top(vectors: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(vectors @ (query / np.linalg.norm(query))), kind="stable")[:k]
+
+
+class TestQuantizedIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.vectors = embeddings(2000)
+        self.queries = embeddings(20, seed=1)
+
+    def index(self, mode, vectors=None, **kwargs):
+        index = QuantizedIndex(mode, **kwargs)
+        index.add(self.vectors if vectors is None else vectors)
+        return index
+
+    def recall(self, index, k=10):
+        found = [len(set(index.search(query, k)[0]) & set(exact_top(self.vectors, query, k)))
+                 for query in self.queries]
+        return sum(found) / (k * len(self.queries))
+
+    def test_search_order_matches_exact_search(self):
+        index = self.index("float")
+        for query in self.queries:
+            positions, scores = index.search(query, 10)
+            np.testing.assert_array_equal(positions, exact_top(self.vectors, query, 10))
+            np.testing.assert_allclose(scores, self.vectors[positions] @ query, rtol=1e-5)
+
+    def test_quantized_search_rescores_with_exact_similarities(self):
+        for mode, min_recall in (("int8", 1.0), ("binary", 0.95)):
+            with self.subTest(mode=mode):
+                index = self.index(mode)
+                self.assertGreaterEqual(self.recall(index), min_recall)
+                for query in self.queries:
+                    positions, scores = index.search(query, 10)
+                    np.testing.assert_allclose(scores, self.vectors[positions] @ query, rtol=1e-5)
+                    self.assertTrue(np.all(np.diff(scores) <= 0))
+
+    def test_quantized_search_without_float_vectors_is_approximate(self):
+        self.assertGreaterEqual(self.recall(self.index("int8", keep_float=False)), 0.95)
+        # Sign bits alone rank coarsely, but far above the 10 / 2000 recall of a random ranking.
+        self.assertGreaterEqual(self.recall(self.index("binary", keep_float=False)), 0.2)
+        positions, scores = self.index("int8", keep_float=False).search(self.queries[0], 10)
+        self.assertTrue(np.all(np.diff(scores) <= 0))
+        np.testing.assert_allclose(scores, self.vectors[positions] @ self.queries[0], atol=0.02)
+
+    def test_removed_rows_are_not_returned(self):
+        for mode in MODES:
+            with self.subTest(mode=mode):
+                index = self.index(mode)
+                removed = exact_top(self.vectors, self.queries[0], 5)
+                index.remove(removed)
+                self.assertEqual(len(index), len(self.vectors) - 5)
+                positions, _ = index.search(self.queries[0], 10)
+                # Positions of the other rows are unchanged.
+                np.testing.assert_array_equal(positions, exact_top(self.vectors, self.queries[0], 15)[5:])
+
+    def test_k_larger_than_the_row_count(self):
+        for mode in MODES:
+            with self.subTest(mode=mode):
+                index = self.index(mode, self.vectors[:5])
+                index.remove([2])
+                positions, scores = index.search(self.queries[0], 10)
+                self.assertEqual(sorted(positions), [0, 1, 3, 4])
+                self.assertTrue(np.all(np.isfinite(scores)))
+                self.assertTrue(np.all(np.diff(scores) <= 0))
+
+    def test_search_after_all_rows_are_removed(self):
+        for mode in MODES:
+            with self.subTest(mode=mode):
+                index = self.index(mode, self.vectors[:5])
+                index.remove(range(5))
+                positions, scores = index.search(self.queries[0], 3)
+                self.assertEqual((len(positions), len(scores)), (0, 0))
+        positions, _ = QuantizedIndex("int8").search(self.queries[0], 3)
+        self.assertEqual(len(positions), 0)
+
+    def test_save_and_load_with_memory_mapping(self):
+        for mode in MODES:
+            with self.subTest(mode=mode), tempfile.TemporaryDirectory() as directory:
+                index = self.index(mode)
+                index.remove([0, 1])
+                index.save(directory)
+
+                loaded = QuantizedIndex.load(directory, mmap=True)
+                # Float mode reads every row per search, so only the rescoring vectors are memory-mapped.
+                self.assertEqual(isinstance(loaded.vectors, np.memmap), mode != "float")
+                if mode != "float":
+                    self.assertLess(loaded.nbytes, index.nbytes)
+                self.assertEqual(len(loaded), len(index))
+                for query in self.queries:
+                    expected = index.search(query, 10)
+                    actual = loaded.search(query, 10)
+                    np.testing.assert_array_equal(actual[0], expected[0])
+                    np.testing.assert_allclose(actual[1], expected[1], rtol=1e-6)
+
+                loaded.add(self.vectors[:3])
+                self.assertEqual(len(loaded), len(index) + 3)
+                self.assertEqual(loaded.search(self.vectors[0], 1)[0][0], len(self.vectors))
+
+    def test_int8_batch_outside_the_first_range_is_requantized(self):
+        first = self.vectors[:1000].copy()
+        first[:, DIMENSIONS // 2:] *= 0.01  # a narrow range in half of the dimensions
+        first /= np.linalg.norm(first, axis=1, keepdims=True)
+        stored = np.concatenate([first, self.vectors[1000:]])
+        for keep_float in (True, False):
+            with self.subTest(keep_float=keep_float):
+                index = QuantizedIndex("int8", keep_float=keep_float)
+                index.add(first)
+                narrow = index.scales.copy()
+                index.add(self.vectors[1000:])
+
+                self.assertTrue(np.all(index.scales >= narrow))
+                # No code is clipped: every row dequantizes to within one code step of its vector; half a step
+                # when the codes are requantized from the float vectors.
+                error = np.abs(index.codes * index.scales - stored)
+                self.assertTrue(np.all(error <= index.scales * (0.5 if keep_float else 1.0) + 1e-6))
+                for position in (10, 1500):
+                    self.assertEqual(index.search(stored[position], 1)[0][0], position)
+
+
+@unittest.skipIf(QuantizedVectorStore is None, "the clinical_ie requirements are not installed")
+class TestQuantizedVectorStore(unittest.TestCase):
+
+    def nodes(self, vectors, document):
+        return [TextNode(id_=f"{document}-{i}", text=f"chunk {i}", embedding=vector.tolist(),
+                         relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=document)})
+                for i, vector in enumerate(vectors)]
+
+    def test_query_delete_and_persist(self):
+        vectors = embeddings(40)
+        store = QuantizedVectorStore(mode="int8")
+        store.add(self.nodes(vectors[:20], "a") + self.nodes(vectors[20:], "b"))
+        query = VectorStoreQuery(query_embedding=vectors[25].tolist(), similarity_top_k=3)
+        result = store.query(query)
+        self.assertEqual(result.ids[0], "b-5")
+        self.assertEqual(result.ids, [["a", "b"][i // 20] + f"-{i % 20}" for i in exact_top(vectors, vectors[25], 3)])
+
+        store.delete("b")
+        self.assertTrue(all(node_id.startswith("a-") for node_id in store.query(query).ids))
+
+        with tempfile.TemporaryDirectory() as directory:
+            store.persist(os.path.join(directory, "default__vector_store.json"))
+            loaded = QuantizedVectorStore.from_persist_dir(directory)
+            self.assertEqual(loaded.mode, "int8")
+            self.assertEqual(loaded.query(query).ids, store.query(query).ids)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 # Code taken from the Unstructured library https://github.com/Unstructured-IO/unstructured/blob/main/unstructured/cleaners/core.py
 
 import re
+from functools import lru_cache
+from typing import Callable, List
 
 UNICODE_BULLETS = [
     "\u0095",
@@ -40,6 +42,20 @@ DOUBLE_PARAGRAPH_PATTERN_RE = re.compile("(" + PARAGRAPH_PATTERN + "){2}")
 
 E_BULLET_PATTERN = re.compile(r"^e(?=\s)", re.MULTILINE)
 
+LINE_BREAK_SPACE_RE = re.compile(r"[\xa0\n]")
+MULTIPLE_SPACES_RE = re.compile(r"([ ]{2,})")
+HYPHENATED_WORD_RE = re.compile(r'(\w+)-\s+(\w+)')
+CITATION_RE = re.compile(r"\[\d{1,3}\]")
+
+# A hyphen between a word and whitespace followed by a word; the lookbehind sits after the literal "-"
+# so the regex engine can jump from hyphen to hyphen instead of trying every word character.
+HYPHEN_GAP_RE = re.compile(r'-(?<=\w-)\s+(?=\w)')
+WORD_RE = re.compile(r'\w*')
+
+# basic_clean: a line break that does not start a paragraph or a line beginning with a capital or digit.
+# Same as (?<!\n)\n(?!\n|[A-Z0-9]), starting with the literal newline for the same reason.
+SOFT_LINE_BREAK_RE = re.compile(r'\n(?<!\n\n)(?![\nA-Z0-9])')
+
 
 def clean_non_ascii_chars(text) -> str:
     """Cleans non-ascii characters from unicode string.
@@ -73,8 +89,8 @@ def clean_extra_whitespace(text: str) -> str:
     -------
     ITEM 1.     BUSINESS -> ITEM 1. BUSINESS
     """
-    cleaned_text = re.sub(r"[\xa0\n]", " ", text)
-    cleaned_text = re.sub(r"([ ]{2,})", " ", cleaned_text)
+    cleaned_text = LINE_BREAK_SPACE_RE.sub(" ", text)
+    cleaned_text = MULTIPLE_SPACES_RE.sub(" ", cleaned_text)
     return cleaned_text.strip()
 
 def group_broken_paragraphs(
@@ -130,13 +146,113 @@ def merge_hyphenated_words(text):
         corrected_text = merge_hyphenated_words("The document was import- ant for the meeting.")
         print(corrected_text)  # Output: "The document was important for the meeting."
     """
-    # Regular expression to find hyphenated words
-    pattern = r'(\w+)-\s+(\w+)'
     # Replace the found patterns by merging the two groups
-    corrected_text = re.sub(pattern, r'\1\2', text)
+    corrected_text = HYPHENATED_WORD_RE.sub(r'\1\2', text)
     return corrected_text
 
-remove_citations = lambda text: re.sub("\[\d{1,3}\]", "", text)
+def remove_citations(text: str) -> str:
+    """Removes numeric citation markers such as [12]."""
+    return CITATION_RE.sub("", text)
+
+def is_int(s: str) -> bool:
+    "Check if the input string can be converted to an integer."
+    try:
+        int(s)
+        return True
+    except ValueError:
+        return False
+
+def _is_int_line(line: str) -> bool:
+    # int() only accepts a sign or a digit after leading whitespace; skip the exception for every other line.
+    first = line.lstrip()[:1]
+    return first != "" and (first in "+-" or first.isdecimal()) and is_int(line)
+
+def basic_clean(txt: str) -> str:
+    """Joins hyphenated and soft-wrapped lines and drops lines that only hold a number, e.g. page numbers."""
+    txt = txt.replace('-\n', '')  # remove line hyphenated words
+    txt = SOFT_LINE_BREAK_RE.sub(' ', txt)  # remove unnecessary line break
+    return '\n\n'.join([line for line in txt.split('\n') if not _is_int_line(line)])  # remove lines that only have numbers
+
+def _collapse_whitespace(text: str) -> str:
+    # str.replace is much faster than a character-class regex for the two single characters.
+    text = text.replace("\n", " ").replace("\xa0", " ")
+    return MULTIPLE_SPACES_RE.sub(" ", text).strip() if "  " in text else text.strip()
+
+def _collapse_whitespace_and_citations(text: str) -> str:
+    return _collapse_whitespace(_remove_citations(text))
+
+def _remove_citations(text: str) -> str:
+    return CITATION_RE.sub("", text) if "[" in text else text
+
+def _lowercase(text: str) -> str:
+    return text.lower()
+
+def _ascii(text: str) -> str:
+    return text if text.isascii() else text.encode("ascii", "ignore").decode()
+
+def _bullets(text: str) -> str:
+    # clean_bullets without its second scan: the first match of a pattern that matches at the start is that one.
+    match = UNICODE_BULLETS_RE.match(text)
+    return text if match is None else text[match.end():].strip()
+
+def _merge_hyphenated(text: str) -> str:
+    # merge_hyphenated_words without backtracking over every word: find the "-<whitespace>" gaps and drop
+    # them. As with its non-overlapping matches, the word after a merged gap cannot start another merge.
+    if "-" not in text:
+        return text
+    parts: List[str] = []
+    last = 0
+    consumed_to = -1
+    for gap in HYPHEN_GAP_RE.finditer(text):
+        if gap.start() == consumed_to:
+            continue
+        parts.append(text[last:gap.start()])
+        last = gap.end()
+        consumed_to = WORD_RE.match(text, last).end()
+    if not parts:
+        return text
+    parts.append(text[last:])
+    return "".join(parts)
+
+
+@lru_cache(maxsize=None)
+def compile_cleaner(
+    extra_whitespace: bool = False,
+    broken_paragraphs: bool = False,
+    bullets: bool = False,
+    ascii: bool = False,
+    lowercase: bool = False,
+    citations: bool = False,
+    merge_split_words: bool = False,
+) -> Callable[[str], str]:
+    """Compiles the enabled cleaning options into the shortest list of precompiled passes.
+
+    Each pass uses a regex that starts with a literal, so the engine searches instead of trying every
+    position, or a plain string method; passes are skipped when the text cannot match them (no "[",
+    no "-", already ASCII). The result is identical to applying the individual cleaners in the order of
+    `clean`. `broken_paragraphs` is accepted for compatibility and, as in `clean`, has no effect.
+    """
+    steps: List[Callable[[str], str]] = []
+    if lowercase:
+        steps.append(_lowercase)
+    if ascii:
+        steps.append(_ascii)
+    if extra_whitespace:
+        # Citations go first: removing one can leave two spaces next to each other.
+        steps.append(_collapse_whitespace_and_citations if citations else _collapse_whitespace)
+    elif citations:
+        steps.append(_remove_citations)
+    if bullets:
+        steps.append(_bullets)
+    if merge_split_words:
+        steps.append(_merge_hyphenated)
+
+    def cleaner(text: str) -> str:
+        for step in steps:
+            text = step(text)
+        return text.strip()
+
+    return cleaner
 
 def clean(
     text: str,
@@ -152,13 +268,5 @@ def clean(
     """Cleans text.
 
     """
-
-    cleaned_text = text.lower() if lowercase else text
-    cleaned_text = (
-        clean_non_ascii_chars(cleaned_text) if ascii else cleaned_text
-    )
-    cleaned_text = remove_citations(cleaned_text) if citations else cleaned_text
-    cleaned_text = clean_extra_whitespace(cleaned_text) if extra_whitespace else cleaned_text
-    cleaned_text = clean_bullets(cleaned_text) if bullets else cleaned_text
-    cleaned_text = merge_hyphenated_words(cleaned_text) if merge_split_words else cleaned_text
-    return cleaned_text.strip()
\ No newline at end of file
+    return compile_cleaner(extra_whitespace, broken_paragraphs, bullets, ascii, lowercase,
+                           citations, merge_split_words)(text)
@@ -0,0 +1,193 @@
+import json
+import os
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+MODES = ("float", "int8", "binary")
+# Candidates per requested result that are rescored with the float vectors after a quantized search. Sign
+# bits rank more coarsely than int8 codes, so binary search needs a longer shortlist for the same recall.
+DEFAULT_RESCORE_MULTIPLIERS = {"float": 1, "int8": 4, "binary": 10}
+# Rows of int8 codes converted to float32 at a time while scoring; blocks that fit in the CPU cache are faster.
+SCORE_BLOCK_ROWS = 1024
+
+FLOAT_FILE = "vectors.npy"
+CODES_FILE = "codes.npy"
+METADATA_FILE = "quantization.json"
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(bits: np.ndarray) -> np.ndarray:
+    # np.bitwise_count needs NumPy 2; the lookup table works everywhere.
+    bitwise_count = getattr(np, "bitwise_count", None)
+    return bitwise_count(bits) if bitwise_count is not None else _POPCOUNT[bits]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class QuantizedIndex:
+    """
+    Cosine-similarity index over one contiguous matrix of embeddings, optionally quantized.
+
+    - "float" scores the float32 matrix with one matrix-vector product.
+    - "int8" keeps one signed byte per dimension, scaled per dimension to the range of the vectors
+      added so far; 4x smaller than float32. A batch outside that range widens the scales and the
+      stored codes are requantized, from the float vectors if they are kept.
+    - "binary" keeps the sign bit of each dimension, packed 8 per byte, and ranks by Hamming
+      distance; 32x smaller than float32.
+
+    Quantized searches shortlist `rescore_multiplier * k` candidates and, if the float vectors are
+    kept, rescore them exactly. Saved float vectors are memory-mapped on load, so only the rows of
+    shortlisted candidates are read from disk.
+    """
+
+    def __init__(self, mode: str = "int8", rescore_multiplier: Optional[int] = None, keep_float: bool = True) -> None:
+        if mode not in MODES:
+            raise ValueError(f'Invalid Quantization Mode: {mode}, choose one of {", ".join(MODES)}')
+        self.mode = mode
+        self.rescore_multiplier = rescore_multiplier or DEFAULT_RESCORE_MULTIPLIERS[mode]
+        self.keep_float = keep_float or mode == "float"
+        self.dimensions: Optional[int] = None
+        self.vectors: Optional[np.ndarray] = None  # float32, normalized
+        self.codes: Optional[np.ndarray] = None  # int8 codes or packed sign bits
+        self.scales: Optional[np.ndarray] = None  # int8 only: value of one code step per dimension
+        self.alive: np.ndarray = np.zeros(0, dtype=bool)
+
+    def __len__(self) -> int:
+        return int(self.alive.sum())
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held in memory; memory-mapped float vectors are not counted."""
+        total = self.alive.nbytes
+        if self.codes is not None:
+            total += self.codes.nbytes
+        if self.vectors is not None and not isinstance(self.vectors, np.memmap):
+            total += self.vectors.nbytes
+        return total
+
+    def _fit_scales(self, vectors: np.ndarray) -> None:
+        scales = np.maximum(np.abs(vectors).max(axis=0), 1e-12) / 127
+        if self.scales is not None:
+            # A relative margin, so float rounding of the range of already added vectors does not requantize.
+            if np.all(scales <= self.scales * (1 + 1e-6)):
+                return
+            scales = np.maximum(scales, self.scales)
+        if self.codes is not None:
+            stored = np.asarray(self.vectors) if self.vectors is not None else self.codes * self.scales
+            self.codes = np.clip(np.rint(stored / scales), -127, 127).astype(np.int8)
+        self.scales = scales.astype(np.float32)
+
+    def _quantize(self, vectors: np.ndarray) -> Optional[np.ndarray]:
+        if self.mode == "int8":
+            self._fit_scales(vectors)
+            return np.clip(np.rint(vectors / self.scales), -127, 127).astype(np.int8)
+        if self.mode == "binary":
+            return np.packbits(vectors > 0, axis=1)
+        return None
+
+    def add(self, vectors: Sequence[Sequence[float]]) -> None:
+        """Append embeddings; they are normalized, so scores are cosine similarities."""
+        vectors = _normalize(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+        if not len(vectors):
+            return
+        if self.dimensions is None:
+            self.dimensions = vectors.shape[1]
+        elif vectors.shape[1] != self.dimensions:
+            raise ValueError(f"Expected {self.dimensions}-dimensional vectors, got {vectors.shape[1]}")
+
+        codes = self._quantize(vectors)
+        if codes is not None:
+            self.codes = codes if self.codes is None else np.concatenate([self.codes, codes])
+        if self.keep_float:
+            self.vectors = vectors if self.vectors is None else np.concatenate([np.asarray(self.vectors), vectors])
+        self.alive = np.concatenate([self.alive, np.ones(len(vectors), dtype=bool)])
+
+    def remove(self, positions: Sequence[int]) -> None:
+        """Exclude rows from search results; positions of the other rows do not change."""
+        self.alive[list(positions)] = False
+
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        if self.mode == "float":
+            return self.vectors @ query
+        if self.mode == "int8":
+            weights = (query * self.scales).astype(np.float32)
+            return np.concatenate([self.codes[start:start + SCORE_BLOCK_ROWS].astype(np.float32) @ weights
+                                   for start in range(0, len(self.codes), SCORE_BLOCK_ROWS)])
+        query_bits = np.packbits(query > 0)
+        # Higher is better: the number of dimensions whose sign agrees with the query.
+        return self.dimensions - _popcount(np.bitwise_xor(self.codes, query_bits)).sum(axis=1, dtype=np.int32)
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int) -> np.ndarray:
+        if k >= len(scores):
+            return np.argsort(-scores, kind="stable")
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def search(self, query: Sequence[float], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k rows most similar to a query.
+
+        Args:
+            query (Sequence[float]): Query embedding.
+            k (int): Number of results.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Row positions, best first, and their cosine similarity; approximate
+            for a quantized index without float vectors.
+        """
+        if self.dimensions is None or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        scores = self._approximate_scores(query).astype(np.float32)
+        scores[~self.alive] = -np.inf
+        k = min(k, len(self))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        if self.mode == "float" or self.vectors is None:
+            top = self._top(scores, k)
+            return top, scores[top]
+        shortlist = self._top(scores, min(k * self.rescore_multiplier, len(self)))
+        exact = np.asarray(self.vectors[np.sort(shortlist)]) @ query
+        order = self._top(exact, k)
+        positions = np.sort(shortlist)[order]
+        return positions, exact[order]
+
+    def save(self, directory: str) -> None:
+        """Write the index as .npy arrays, loadable with memory mapping."""
+        os.makedirs(directory, exist_ok=True)
+        if self.vectors is not None:
+            np.save(os.path.join(directory, FLOAT_FILE), np.asarray(self.vectors))
+        if self.codes is not None:
+            np.save(os.path.join(directory, CODES_FILE), self.codes)
+        metadata = {"mode": self.mode, "rescore_multiplier": self.rescore_multiplier, "dimensions": self.dimensions,
+                    "scales": self.scales.tolist() if self.scales is not None else None,
+                    "alive": self.alive.tolist()}
+        with open(os.path.join(directory, METADATA_FILE), "w") as f:
+            json.dump(metadata, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "QuantizedIndex":
+        """Load a saved index; with `mmap`, the float vectors stay on disk and are paged in on demand."""
+        with open(os.path.join(directory, METADATA_FILE)) as f:
+            metadata = json.load(f)
+        float_path = os.path.join(directory, FLOAT_FILE)
+        index = cls(metadata["mode"], metadata["rescore_multiplier"], keep_float=os.path.exists(float_path))
+        index.dimensions = metadata["dimensions"]
+        index.alive = np.array(metadata["alive"], dtype=bool)
+        if metadata["scales"] is not None:
+            index.scales = np.array(metadata["scales"], dtype=np.float32)
+        if os.path.exists(float_path):
+            # The matrix-vector product of float mode reads every row anyway, so it is loaded into memory.
+            index.vectors = np.load(float_path, mmap_mode="r" if mmap and index.mode != "float" else None)
+        codes_path = os.path.join(directory, CODES_FILE)
+        if os.path.exists(codes_path):
+            index.codes = np.load(codes_path)
+        return index
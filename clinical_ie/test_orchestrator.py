@@ -0,0 +1,224 @@
+import asyncio
+import threading
+import time
+import unittest
+from typing import Dict, List, Tuple
+
+from clinical_ie.orchestrator import CoalescingRetriever, RetrievalOrchestrator
+
+try:
+    from clinical_ie.tools import ChunkManager
+except ImportError:  # llama-index and pydantic are not installed
+    ChunkManager = None
+
+LLM_LATENCY = 0.05  # seconds per scripted LLM turn
+RETRIEVAL_LATENCY = 0.02  # seconds per retrieve_chunks_batch call
+
+
+class ScriptedRetrieverManager:
+    """Stand-in for RetrieverManager of one document: one chunk per query, a fixed blocking latency per batch."""
+
+    def __init__(self, document: str = "first.pdf"):
+        self.document = document
+        self.batches: List[List[str]] = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def retrieve_chunks_batch(self, queries: List[str]) -> List[str]:
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(RETRIEVAL_LATENCY)
+        self.batches.append(list(queries))
+        with self._lock:
+            self.active -= 1
+        return [f"Relevant Chunks:\nid-{query} --> text of {query} in {self.document}" for query in queries]
+
+
+class ScriptedLLM:
+    """Local stand-in for the agent's LLM: replays a fixed list of actions per category, each after a delay."""
+
+    def __init__(self, scripts: Dict[str, List[Tuple[str, object]]]):
+        self.scripts = scripts
+
+    async def next_action(self, category: str, turn: int) -> Tuple[str, object]:
+        await asyncio.sleep(LLM_LATENCY)
+        script = self.scripts[category]
+        return script[turn] if turn < len(script) else ("finish", None)
+
+
+class ScriptedAgent:
+    """A ReAct-style loop over the scripted LLM, calling the same tools as the RetrieverAgent."""
+
+    running = 0
+    max_running = 0
+
+    def __init__(self, llm: ScriptedLLM, retriever: CoalescingRetriever, chunk_manager):
+        self.llm = llm
+        self.retriever = retriever
+        self.chunk_manager = chunk_manager
+        self.observations: List[object] = []
+
+    async def aextract_metadata_chunks(self, category: str, initial_query: str) -> None:
+        ScriptedAgent.running += 1
+        ScriptedAgent.max_running = max(ScriptedAgent.max_running, ScriptedAgent.running)
+        try:
+            turn = 0
+            while True:
+                action, argument = await self.llm.next_action(category, turn)
+                turn += 1
+                if action == "finish":
+                    return
+                if action == "fail":
+                    raise RuntimeError(argument)
+                if action == "retrieve":
+                    self.observations.append(await self.retriever.retrieve_chunks(argument))
+                elif action == "retrieve_batch":
+                    self.observations.append(await self.retriever.retrieve_chunks_batch(argument))
+                elif action == "save":
+                    # Sync tools run in worker threads, as FunctionTool runs them for an async agent.
+                    self.observations.append(await asyncio.to_thread(self.chunk_manager.save_chunks, argument))
+        finally:
+            ScriptedAgent.running -= 1
+
+
+class DictChunkStore:
+    def __init__(self):
+        self.chunks = {}
+        self._lock = threading.Lock()
+
+    def save_chunks(self, chunks_dict):
+        with self._lock:
+            for id, chunk in chunks_dict:
+                self.chunks.setdefault(id, chunk)
+        return "All chunks saved."
+
+
+def category_script(category: str, turns: int) -> List[Tuple[str, object]]:
+    script = [("retrieve", f"{category} query {turn % 2}") for turn in range(turns)]
+    return script + [("save", [(f"id-{category}", f"text of {category}")])]
+
+
+class TestRetrievalOrchestrator(unittest.TestCase):
+
+    def setUp(self):
+        ScriptedAgent.running = ScriptedAgent.max_running = 0
+
+    def run_orchestrator(self, scripts, chunk_manager, max_concurrency):
+        retriever_manager = ScriptedRetrieverManager()
+        llm = ScriptedLLM(scripts)
+        orchestrator = RetrievalOrchestrator(retriever_manager, chunk_manager,
+                                             lambda retriever, chunks: ScriptedAgent(llm, retriever, chunks),
+                                             max_concurrency=max_concurrency)
+        runs = asyncio.run(orchestrator.run({category: f"initial {category}" for category in scripts}))
+        return orchestrator, retriever_manager, runs
+
+    def test_wall_time_approaches_slowest_category(self):
+        scripts = {f"category {i}": category_script(f"category {i}", turns=2 + i % 4) for i in range(15)}
+        orchestrator, retriever_manager, runs = self.run_orchestrator(scripts, DictChunkStore(), max_concurrency=15)
+
+        slowest = max(run.seconds for run in runs.values())
+        sequential = sum(run.seconds for run in runs.values())
+        self.assertTrue(all(run.error is None for run in runs.values()))
+        self.assertLess(orchestrator.seconds, slowest * 1.5)
+        self.assertLess(orchestrator.seconds, sequential / 5)
+        self.assertEqual(len(orchestrator.chunk_manager.chunks), 15)
+
+    def test_concurrent_queries_are_coalesced(self):
+        shared = [("retrieve", "tumor marker"), ("retrieve_batch", ["colonoscopy", "tumor marker"])]
+        scripts = {f"category {i}": shared + category_script(f"category {i}", turns=1) for i in range(8)}
+        orchestrator, retriever_manager, _ = self.run_orchestrator(scripts, DictChunkStore(), max_concurrency=8)
+
+        retrieved = [query for batch in retriever_manager.batches for query in batch]
+        self.assertEqual(orchestrator.retriever.queries, 8 * 4)
+        self.assertEqual(sorted(retrieved), sorted(set(retrieved)))
+        self.assertLessEqual(len(retriever_manager.batches), 6)
+        self.assertEqual(retriever_manager.max_active, 1)
+
+    def test_concurrency_is_bounded_and_failures_are_isolated(self):
+        scripts = {f"category {i}": category_script(f"category {i}", turns=2) for i in range(6)}
+        scripts["category 0"] = [("retrieve", "age"), ("fail", "LLM returned no action")]
+        orchestrator, _, runs = self.run_orchestrator(scripts, DictChunkStore(), max_concurrency=2)
+
+        self.assertEqual(ScriptedAgent.max_running, 2)
+        self.assertEqual(runs["category 0"].error, "RuntimeError: LLM returned no action")
+        self.assertTrue(all(runs[f"category {i}"].error is None for i in range(1, 6)))
+        self.assertIn("category 0: RuntimeError", orchestrator.summary())
+
+    def test_results_are_not_reused_across_documents(self):
+        llm = ScriptedLLM({"age": [("retrieve", "age"), ("retrieve", "age")]})
+        agents = []
+
+        def agent_factory(retriever, chunks):
+            agents.append(ScriptedAgent(llm, retriever, chunks))
+            return agents[-1]
+
+        first, second = ScriptedRetrieverManager("first.pdf"), ScriptedRetrieverManager("second.pdf")
+        orchestrator = RetrievalOrchestrator(first, DictChunkStore(), agent_factory)
+        asyncio.run(orchestrator.run({"age": "age"}))
+        asyncio.run(orchestrator.run({"age": "age"}, retriever_manager=second))
+        asyncio.run(orchestrator.run({"age": "age"}))
+
+        self.assertEqual(agents[0].observations, ["Relevant Chunks:\nid-age --> text of age in first.pdf"] * 2)
+        self.assertEqual(agents[1].observations, ["Relevant Chunks:\nid-age --> text of age in second.pdf"] * 2)
+        self.assertEqual(agents[2].observations, agents[1].observations)
+        # Within a run the repeated query is shared; every run, even with the same manager, retrieves it once.
+        self.assertEqual([first.batches, second.batches], [[["age"]], [["age"], ["age"]]])
+        self.assertEqual(orchestrator.retriever.retrieved, 3)
+
+    def test_cancelled_run_leaves_nothing_for_the_next_one(self):
+        scripts = {f"category {i}": category_script(f"category {i}", turns=3) for i in range(3)}
+        llm = ScriptedLLM({"age": [("retrieve", "age"), ("retrieve", "gender")], **scripts})
+        agents = []
+
+        def agent_factory(retriever, chunks):
+            agents.append(ScriptedAgent(llm, retriever, chunks))
+            return agents[-1]
+
+        retriever_manager = ScriptedRetrieverManager()
+        orchestrator = RetrievalOrchestrator(retriever_manager, DictChunkStore(), agent_factory, coalesce_window=60)
+
+        async def cancelled_run():
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(orchestrator.run({"age": "age"}), LLM_LATENCY * 3)
+
+        # The first query waits for the window when the run is cancelled, with its future and timer on that loop.
+        asyncio.run(cancelled_run())
+        self.assertEqual(retriever_manager.batches, [])
+
+        orchestrator.retriever.window = 0.01
+        runs = asyncio.run(orchestrator.run({"age": "age"}))
+        self.assertIsNone(runs["age"].error)
+        self.assertEqual(agents[1].observations, ["Relevant Chunks:\nid-age --> text of age in first.pdf",
+                                                  "Relevant Chunks:\nid-gender --> text of gender in first.pdf"])
+        # A third run, on yet another event loop, with concurrent batches that contend for the batch lock.
+        runs = asyncio.run(orchestrator.run({category: "" for category in scripts}))
+        self.assertTrue(all(run.error is None for run in runs.values()))
+        self.assertGreater(len(retriever_manager.batches), 2)
+        self.assertEqual(retriever_manager.max_active, 1)
+
+    def test_retrieved_results_are_bounded(self):
+        retriever_manager = ScriptedRetrieverManager()
+        retriever = CoalescingRetriever(retriever_manager, max_results=2)
+
+        async def retrieve(queries):
+            for query in queries:
+                await retriever.retrieve_chunks(query)
+
+        asyncio.run(retrieve(["age", "gender", "age", "diagnosis", "age", "gender"]))
+        # "age" stays the most recently used; "gender" was evicted by "diagnosis" and is retrieved again.
+        self.assertEqual([query for batch in retriever_manager.batches for query in batch],
+                         ["age", "gender", "diagnosis", "gender"])
+
+    @unittest.skipIf(ChunkManager is None, "the clinical_ie requirements are not installed")
+    def test_chunk_manager_is_shared_safely(self):
+        scripts = {f"category {i}": [("save", [("a", "the same chunk text"), (f"id {i}", f"chunk of category {i}")])]
+                   for i in range(10)}
+        chunk_manager = ChunkManager()
+        self.run_orchestrator(scripts, chunk_manager, max_concurrency=10)
+        self.assertEqual(sorted(chunk_manager.get_chunks()), sorted(["a"] + [f"id {i}" for i in range(10)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import re
+import tempfile
+import unittest
+
+try:
+    from llama_index.core import VectorStoreIndex
+    from llama_index.core.schema import TextNode
+
+    from clinical_ie.simple_rag_pipeline.test_rag_utils import FakeEmbedding
+    from clinical_ie.simple_rag_pipeline.rag_utils import QUERY_INSTRUCTION
+    from clinical_ie.tools import ChunkManager, RetrieverManager
+except ImportError:  # llama-index and pydantic are not installed
+    ChunkManager = None
+
+CHUNK_A = ("The patient was a 72-year-old man with a 19-year history of ulcerative colitis who had undergone "
+           "colonoscopy every year at a previous outpatient clinic.")
+CHUNK_B = ("colonoscopy every year at a previous outpatient clinic. After several years of asymptomatic disease, "
+           "a 10-mm tumor was observed in the upper rectum.")
+
+
+@unittest.skipIf(ChunkManager is None, "the clinical_ie requirements are not installed")
+class TestChunkManager(unittest.TestCase):
+
+    def test_same_text_under_another_id_is_an_alias(self):
+        manager = ChunkManager()
+        self.assertEqual(manager.save_chunks([("a", CHUNK_A)]), "All chunks saved.")
+        message = manager.save_chunks([("b", "  " + CHUNK_A.upper().replace(" ", "\n")), ("a", CHUNK_A)])
+        self.assertIn("b (same text as a)", message)
+        self.assertIn("chunk ids ['a'] already exists.", message)
+        self.assertEqual(list(manager.get_chunks()), ["a"])
+        self.assertEqual(manager.get_chunk("b"), CHUNK_A)
+
+    def test_overlapping_chunk_is_stored_whole(self):
+        manager = ChunkManager()
+        manager.save_chunks([("a", CHUNK_A)])
+        message = manager.save_chunks([("b", CHUNK_B), ("c", CHUNK_A[20:])])
+        self.assertIn("chunks ['b'] partly overlap saved chunks and were stored whole.", message)
+        # Almost all of c is in a, so it is a near duplicate.
+        self.assertIn("c (same text as a)", message)
+        self.assertEqual(manager.get_chunks(), {"a": CHUNK_A, "b": CHUNK_B})
+        self.assertEqual(manager.get_chunk("c"), CHUNK_A)
+
+    def test_store_reopens_lazily_per_document(self):
+        with tempfile.TemporaryDirectory() as path:
+            manager = ChunkManager(path, document="first.pdf")
+            manager.save_chunks([("a", CHUNK_A), ("b", CHUNK_A)])
+            manager.open_document("second.pdf")
+            manager.save_chunks([("c", CHUNK_A)])
+            with open(os.path.join(path, "index.jsonl"), "a") as f:
+                f.write('{"id": "partial')
+
+            reopened = ChunkManager(path, document="first.pdf")
+            self.assertEqual(reopened.get_chunks(), {"a": CHUNK_A})
+            self.assertEqual(reopened.get_chunk("b"), CHUNK_A)
+            reopened.open_document("second.pdf")
+            self.assertEqual(reopened.get_chunks(), {"c": CHUNK_A})
+            chunk_d = CHUNK_A + " The margin was unclear on re-examination, and the patient refused further surgery."
+            message = reopened.save_chunks([("d", chunk_d)])
+            self.assertEqual(message, "chunks ['d'] partly overlap saved chunks and were stored whole.")
+            self.assertEqual(reopened.get_chunks(), {"c": CHUNK_A, "d": chunk_d})
+
+            reopened = ChunkManager(path, document="second.pdf")
+            self.assertEqual(reopened.get_chunk("d"), chunk_d)
+            self.assertEqual(reopened.save_chunks([("e", chunk_d.lower())]), "chunks e (same text as d) duplicate "
+                             "saved chunks and were not stored again.")
+
+
+class WordOverlapReranker:
+    """Stand-in for the CrossEncoder: scores a chunk by the query words it contains, and counts its calls."""
+
+    def __init__(self):
+        self.rank_calls = 0
+        self.predict_calls = 0
+
+    @staticmethod
+    def score(query, chunk_text):
+        words = set(re.findall(r"\w+", chunk_text.lower()))
+        return sum(word in words for word in re.findall(r"\w+", query.lower())) - len(chunk_text) / 1000
+
+    def predict(self, pairs, batch_size=32):
+        self.predict_calls += 1
+        return [self.score(query, chunk_text) for query, chunk_text in pairs]
+
+    def rank(self, query, documents, return_documents=True, top_k=None):
+        self.rank_calls += 1
+        ranked = sorted(({"corpus_id": i, "score": self.score(query, text), "text": text}
+                         for i, text in enumerate(documents)), key=lambda r: -r["score"])
+        return ranked[:top_k]
+
+
+CASE_REPORT = ["The patient was a 72-year-old man.", "He had a 19-year history of ulcerative colitis.",
+               "Colonoscopy was performed every year.", "A 10-mm tumor was observed in the upper rectum.",
+               "Biopsy showed adenocarcinoma of the rectum.", "The tumor marker CEA was normal.",
+               "He was treated with mesalazine for colitis.", "His mother had colon cancer.",
+               "He did not smoke or drink alcohol.", "Low anterior resection of the rectum was performed."]
+QUERIES = ["age of the patient", "rectum tumor", "colitis history", "rectum tumor", "family history of cancer"]
+
+
+@unittest.skipIf(ChunkManager is None, "the clinical_ie requirements are not installed")
+class TestRetrieverManager(unittest.TestCase):
+
+    def setUp(self):
+        self.embed_model = FakeEmbedding()
+        nodes = [TextNode(id_=f"chunk-{i}", text=text) for i, text in enumerate(CASE_REPORT)]
+        self.index = VectorStoreIndex(nodes, embed_model=self.embed_model)
+
+    def check_batch_matches_single_queries(self, reranker):
+        manager = RetrieverManager(self.index.as_retriever(similarity_top_k=5), reranker, top_k=3)
+        single = [manager.retrieve_chunks(query) for query in QUERIES]
+        calls = self.embed_model.calls
+        self.assertEqual(manager.retrieve_chunks_batch(QUERIES), single)
+        self.assertEqual(self.embed_model.calls, calls + 1)
+        return single
+
+    def test_batch_matches_single_queries_with_reranker(self):
+        reranker = WordOverlapReranker()
+        single = self.check_batch_matches_single_queries(reranker)
+        self.assertEqual(single[1].splitlines()[1], "chunk-3 --> A 10-mm tumor was observed in the upper rectum.")
+        self.assertEqual((reranker.rank_calls, reranker.predict_calls), (len(QUERIES), 1))
+
+    def test_batch_matches_single_queries_without_reranker(self):
+        single = self.check_batch_matches_single_queries(None)
+        dense = self.index.as_retriever(similarity_top_k=3).retrieve(f"{QUERY_INSTRUCTION}{QUERIES[0]}")
+        self.assertEqual(single[0], RetrieverManager._format_chunks([(n.node.id_, n.node.text) for n in dense]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,67 +1,314 @@
-from typing import Dict, List, Tuple
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Set, Tuple
 from pydantic import BaseModel
 from llama_index.core.output_parsers import PydanticOutputParser
+from llama_index.core.schema import QueryBundle
 
+from clinical_ie.simple_rag_pipeline.hybrid_retriever import HybridRetriever, is_confident
+from clinical_ie.simple_rag_pipeline.rag_utils import QUERY_INSTRUCTION
+
+# (query, chunk) pairs scored per forward pass of the reranker in retrieve_chunks_batch.
+RERANK_BATCH_SIZE = 64
+
+# Chunks are stored as JSON lines in CHUNK_DATA_FILE; CHUNK_INDEX_FILE holds one small line per chunk id
+# (document, content hash, byte offset), so opening a store only reads the index and texts are read on demand.
+CHUNK_DATA_FILE = "chunks.jsonl"
+CHUNK_INDEX_FILE = "index.jsonl"
+# Consecutive words hashed together to find text a new chunk shares with saved chunks of the same document.
+SHINGLE_WORDS = 8
+# A chunk whose words are this much covered by saved chunks is a near duplicate and is not stored again.
+NEAR_DUPLICATE_COVERAGE = 0.9
+CHUNK_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_chunk_text(text: str) -> str:
+    """Lowercased text with whitespace runs collapsed, so formatting differences hash the same."""
+    return " ".join(text.lower().split())
+
+
+@dataclass
+class ChunkRecord:
+    id: str
+    document: str
+    hash: str
+    offset: int = -1  # byte offset of the text in the data file; -1 while it is only in memory
+    length: int = 0
+    alias_of: Optional[str] = None  # id of the saved chunk this one duplicates
 
 
 class ChunkManager:
-    def __init__(self):
-        self.chunks = {}
+    """
+    Store of the chunks the agents found relevant, deduplicated by content.
+
+    A chunk whose normalized text was already saved for the document, or whose words are almost all
+    covered by saved chunks, is recorded as an alias of the saved chunk. A chunk that only partly
+    overlaps saved chunks, as consecutive SentenceSplitter chunks do, is stored whole, so the extraction
+    agent always reads complete sentences.
+
+    With a `path`, chunks are appended to a directory that later runs can reopen; only its index is
+    loaded, and texts are read from disk when asked for. Chunks of several documents can share a store,
+    `document` selects the one the tools work on. All methods are thread-safe.
+    """
+
+    def __init__(self, path: Optional[str] = None, document: str = ""):
+        self.path = path
+        self.document = document
+        self._records: Dict[str, ChunkRecord] = {}
+        self._by_hash: Dict[Tuple[str, str], str] = {}
+        self._texts: Dict[str, str] = {}  # texts not written to disk, and those read back for the current document
+        self._shingles: Optional[Dict[int, Set[str]]] = None  # shingle hash -> chunk ids, for the current document
+        self._partial_index_line = False  # the index ends with the partial line of an interrupted write
+        # Agent tools run in worker threads, and concurrent retrieval loops share one store.
+        self._lock = threading.RLock()
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self._load_index()
+
+    def open_document(self, document: str) -> None:
+        """Point the tools at the chunks of another document; on disk, texts of the previous one leave memory."""
+        with self._lock:
+            self.document = document
+            self._shingles = None
+            if self.path is not None:
+                self._texts = {}
+
+    def _load_index(self) -> None:
+        index_path = os.path.join(self.path, CHUNK_INDEX_FILE)
+        if not os.path.exists(index_path):
+            return
+        data_path = os.path.join(self.path, CHUNK_DATA_FILE)
+        data_size = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+        with open(index_path) as f:
+            for line in f:
+                self._partial_index_line = not line.endswith("\n")
+                try:
+                    record = ChunkRecord(**json.loads(line))
+                except (json.JSONDecodeError, TypeError):
+                    continue  # the last line of an interrupted write
+                if record.offset + record.length <= data_size:
+                    self._add_record(record)
+
+    def _add_record(self, record: ChunkRecord) -> None:
+        self._records[record.id] = record
+        if record.alias_of is None:
+            self._by_hash.setdefault((record.document, record.hash), record.id)
+
+    def _append(self, record: ChunkRecord, text: Optional[str] = None) -> None:
+        if self.path is not None:
+            if text is not None:
+                # The text goes to disk before its index line, so the index never points past the data.
+                with open(os.path.join(self.path, CHUNK_DATA_FILE), "ab") as f:
+                    record.offset = f.tell()
+                    data = (json.dumps(text) + "\n").encode()
+                    record.length = len(data)
+                    f.write(data)
+            with open(os.path.join(self.path, CHUNK_INDEX_FILE), "a") as f:
+                if self._partial_index_line:
+                    f.write("\n")  # so the record is not appended to the partial line
+                    self._partial_index_line = False
+                f.write(json.dumps(asdict(record)) + "\n")
+        self._add_record(record)
+
+    def _text(self, record: ChunkRecord) -> str:
+        if record.id not in self._texts:
+            with open(os.path.join(self.path, CHUNK_DATA_FILE), "rb") as f:
+                f.seek(record.offset)
+                text = json.loads(f.read(record.length))
+            if record.document != self.document:
+                return text
+            self._texts[record.id] = text
+        return self._texts[record.id]
+
+    @staticmethod
+    def _word_shingles(text: str) -> Tuple[List[re.Match], List[int]]:
+        words = list(CHUNK_WORD_RE.finditer(text))
+        lowered = [word.group().lower() for word in words]
+        return words, [hash(tuple(lowered[i:i + SHINGLE_WORDS])) for i in range(len(words) - SHINGLE_WORDS + 1)]
+
+    def _shingle_index(self) -> Dict[int, Set[str]]:
+        # Built from the current document's saved chunks the first time a chunk is saved.
+        if self._shingles is None:
+            self._shingles = {}
+            for record in self._records.values():
+                if record.document == self.document and record.alias_of is None:
+                    self._index_shingles(record.id, self._text(record))
+        return self._shingles
+
+    def _index_shingles(self, id: str, text: str) -> None:
+        for shingle in self._word_shingles(text)[1]:
+            self._shingles.setdefault(shingle, set()).add(id)
+
+    def _overlaps(self, text: str) -> Tuple[bool, List[str]]:
+        """Whether a chunk is a near duplicate of saved chunks, and the saved chunks it overlaps, most shared text first."""
+        index = self._shingle_index()
+        words, shingles = self._word_shingles(text)
+        covered = [False] * len(words)
+        overlapping: Dict[str, int] = {}
+        for i, shingle in enumerate(shingles):
+            if shingle in index:
+                covered[i:i + SHINGLE_WORDS] = [True] * SHINGLE_WORDS
+                for id in index[shingle]:
+                    overlapping[id] = overlapping.get(id, 0) + 1
+        overlapping_ids = sorted(overlapping, key=lambda id: -overlapping[id])
+        return bool(overlapping) and sum(covered) >= NEAR_DUPLICATE_COVERAGE * len(words), overlapping_ids
 
     def save_chunks(self, chunks_dict: List[Tuple[str,str]]) -> bool:
         """
         Save relevant chunks if it's unique. Returns appropriate message according to uniqueness of the chunks.
+        A chunk with the same text as a saved chunk, or almost all of it covered by saved chunks, is not stored again.
         Args chunks_dict List[Tuple[str,str]], where first item of the  tuple is id and second item is chunk text.
         """
+        with self._lock:
+            non_unique_ids = []
+            duplicates: Dict[str, str] = {}
+            overlaps: Dict[str, List[str]] = {}
+            for id, chunk in chunks_dict:
+                if id in self._records:
+                    non_unique_ids.append(id)
+                    continue
+                content_hash = hashlib.sha256(normalize_chunk_text(chunk).encode()).hexdigest()
+                duplicate_of = self._by_hash.get((self.document, content_hash))
+                near_duplicate, overlapping_ids = (False, []) if duplicate_of is not None else self._overlaps(chunk)
+                if near_duplicate:
+                    duplicate_of = overlapping_ids[0]
+                if duplicate_of is not None:
+                    duplicates[id] = duplicate_of
+                    self._append(ChunkRecord(id, self.document, content_hash, alias_of=duplicate_of))
+                    continue
+                if overlapping_ids:
+                    overlaps[id] = overlapping_ids
+                record = ChunkRecord(id, self.document, content_hash)
+                self._append(record, chunk)
+                self._texts[id] = chunk
+                self._index_shingles(id, chunk)
 
-        non_unique_ids = []
-        for id, chunk in chunks_dict:
-            if id not in self.chunks:
-                self.chunks[id] = chunk
-            else:
-                non_unique_ids.append(id)
-        
-        if len(non_unique_ids) > 0:
-            return f"chunk ids {non_unique_ids} already exists." 
-        else:
-            return "All chunks saved."
+            messages = []
+            if len(non_unique_ids) > 0:
+                messages.append(f"chunk ids {non_unique_ids} already exists.")
+            if duplicates:
+                messages.append("chunks " + ", ".join(f"{id} (same text as {other})" for id, other in duplicates.items())
+                                + " duplicate saved chunks and were not stored again.")
+            if overlaps:
+                messages.append(f"chunks {list(overlaps)} partly overlap saved chunks and were stored whole.")
+            return " ".join(messages) if messages else "All chunks saved."
 
 
     def get_chunks(self) -> Dict[str, str]:
         "Get all saved chunks"
-        return self.chunks
+        with self._lock:
+            return {id: self._text(record) for id, record in self._records.items()
+                    if record.document == self.document and record.alias_of is None}
+
+    @property
+    def chunks(self) -> Dict[str, str]:
+        return self.get_chunks()
     
     def get_chunk(self, id:str) -> Dict[str, str]:
         "Get individual chunk by its id"
-        if id in self.chunks:
-            return self.chunks[id]
-        return "Chunk id don't exits, try different id"
+        with self._lock:
+            if id in self._records:
+                record = self._records[id]
+                if record.alias_of is not None:
+                    return self.get_chunk(record.alias_of)
+                return self._text(record)
+            return "Chunk id don't exits, try different id"
 
 
 class RetrieverManager:
-    def __init__(self, retriever, reranker_model, top_k=3) -> None:
+    def __init__(self, retriever, reranker_model, top_k=3, embed_model=None, skip_confident_rerank=True) -> None:
         self.retriever = retriever
+        # CrossEncoder reranking the retrieved chunks; None keeps the retrieval order.
         self.reranker_model = reranker_model
         self.top_k = top_k
+        # Used to embed the queries of retrieve_chunks_batch together; defaults to the retriever's own model.
+        dense_retriever = retriever.dense_retriever if isinstance(retriever, HybridRetriever) else retriever
+        self.embed_model = embed_model or getattr(dense_retriever, "_embed_model", None)
+        # With a hybrid retriever, keep the fused order without reranking when BM25 and dense retrieval agree.
+        self.skip_confident_rerank = skip_confident_rerank
+        self.rerank_calls = 0
+        self.reranks_skipped = 0
+
+    @staticmethod
+    def _format_chunks(ranked_chunks: List[Tuple[str, str]]) -> str:
+        concat_result = "Relevant Chunks:"
+        for id, chunk_text in ranked_chunks:
+            concat_result += f"\n{id} --> {chunk_text}"
+        return concat_result
+
+    def _candidates(self, query) -> Tuple[Dict[str, str], bool]:
+        """Retrieved chunk texts mapped to their ids, best first, and whether they can skip the rerank."""
+        if isinstance(self.retriever, HybridRetriever):
+            results = self.retriever.retrieve_fused(query)
+            confident = self.skip_confident_rerank and is_confident(results, self.top_k)
+            return {entry.node.node.text: entry.node.node.id_ for entry in results}, confident
+        return {node.node.text : node.node.id_ for node in self.retriever.retrieve(query)}, False
         
     def retrieve_chunks(self, query: str) -> str:
         "Given a query retrieves top k chunks from the vector db and concatanate them together along with their id before returning. Useful for querying the case study vector database."
         
         reranker_query = query
-        query = f"Represent this sentence for searching relevant passages: {query}"
+        query = f"{QUERY_INSTRUCTION}{query}"
 
-        chunk_id_mapper = {node.node.text : node.node.id_ for node in self.retriever.retrieve(query)}
+        chunk_id_mapper, confident = self._candidates(query)
         relevant_chunks = list(chunk_id_mapper.keys())
+        if confident or self.reranker_model is None:
+            self.reranks_skipped += confident
+            return self._format_chunks([(chunk_id_mapper[chunk_text], chunk_text) for chunk_text in relevant_chunks[:self.top_k]])
+
+        self.rerank_calls += 1
         ranked_result = self.reranker_model.rank(reranker_query, relevant_chunks, return_documents=True, top_k=self.top_k)
         
-        concat_result = "Relevant Chunks:"
+        return self._format_chunks([(chunk_id_mapper[relevant_chunks[r['corpus_id']]], relevant_chunks[r['corpus_id']])
+                                    for r in ranked_result])
 
-        for r in ranked_result:
-            corpus_id = r['corpus_id']
-            chunk_text = relevant_chunks[corpus_id]
-            id = chunk_id_mapper[chunk_text]
-            concat_result += f"\n{id} --> {chunk_text}"
-        return concat_result
+    def retrieve_chunks_batch(self, queries: List[str]) -> List[str]:
+        """
+        Retrieves and reranks the top k chunks for several queries at once, in the format of `retrieve_chunks`.
+
+        All queries are embedded in one batch, and every distinct (query, chunk) pair of all queries is
+        scored in one reranker batch, so a chunk found by several queries is scored once per query and
+        a repeated query is only retrieved once. Queries whose hybrid results are confident skip the rerank.
+
+        Args:
+            queries (List[str]): Queries to retrieve chunks for.
+
+        Returns:
+            List[str]: The relevant chunks of each query, in the order of `queries`.
+        """
+        unique_queries = list(dict.fromkeys(queries))
+        if self.embed_model is not None:
+            embeddings = self.embed_model.get_text_embedding_batch([f"{QUERY_INSTRUCTION}{query}" for query in unique_queries])
+            bundles = [QueryBundle(query_str=f"{QUERY_INSTRUCTION}{query}", embedding=embedding)
+                       for query, embedding in zip(unique_queries, embeddings)]
+        else:
+            bundles = [QueryBundle(query_str=f"{QUERY_INSTRUCTION}{query}") for query in unique_queries]
+
+        candidates: Dict[str, Dict[str, str]] = {}  # query -> chunk text -> chunk id
+        confident: Dict[str, bool] = {}
+        for query, bundle in zip(unique_queries, bundles):
+            candidates[query], confident[query] = self._candidates(bundle)
+
+        rerank = {query: self.reranker_model is not None and not confident[query] for query in unique_queries}
+        pairs = list(dict.fromkeys((query, chunk_text) for query in unique_queries if rerank[query]
+                                   for chunk_text in candidates[query]))
+        scores = self.reranker_model.predict(pairs, batch_size=RERANK_BATCH_SIZE) if pairs else []
+        pair_scores = dict(zip(pairs, (float(score) for score in scores)))
+        self.rerank_calls += bool(pairs)
+        self.reranks_skipped += sum(confident.values())
+
+        results: Dict[str, str] = {}
+        for query in unique_queries:
+            chunk_id_mapper = candidates[query]
+            ranked = list(chunk_id_mapper)
+            if rerank[query]:
+                ranked.sort(key=lambda chunk_text: -pair_scores[(query, chunk_text)])
+            results[query] = self._format_chunks([(chunk_id_mapper[chunk_text], chunk_text) for chunk_text in ranked[:self.top_k]])
+        return [results[query] for query in queries]
 
 
 class MetadataManager:
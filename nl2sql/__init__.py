@@ -1,54 +1,104 @@
-import mysql.connector
-from mysql.connector import Error
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
 
-db_connection = None
+from nl2sql.backends import Backend, DatabaseError, SQLiteBackend, DEFAULT_POOL_SIZE
+from nl2sql.backends.sakila import ensure_database
 
-def initialize_db_connection(host, user, password, database):
+db_backend: Optional[Backend] = None
+
+
+def _activate(backend: Backend) -> None:
+    global db_backend
+    close_db_connection()
+    try:
+        # Open one connection eagerly so bad credentials surface here.
+        backend.pool.release(backend.pool.checkout())
+        db_backend = backend
+        print("Database connection successful")
+    except DatabaseError as e:
+        backend.close()
+        print(f"Error connecting to the database: {e}")
+
+def initialize_db_connection(host, user, password, database, pool_size=DEFAULT_POOL_SIZE):
     """
-    Initialize the global database connection.
-    
+    Initialize the global database connection pool on a MySQL server.
+
     Args:
     host (str): The hostname of the MySQL server
     user (str): The username for the MySQL server
     password (str): The password for the MySQL server
     database (str): The name of the database to connect to
-    
+    pool_size (int): Maximum number of concurrent connections
+
     Returns:
     None
     """
-    global db_connection
-    try:
-        db_connection = mysql.connector.connect(
-            host=host,
-            user=user,
-            password=password,
-            database=database
-        )
-        print("Database connection successful")
-    except Error as e:
-        print(f"Error connecting to the database: {e}")
+    # Imported here so mysql-connector is only required when a MySQL server is used.
+    from nl2sql.backends.mysql import MySQLBackend
+    _activate(MySQLBackend(host, user, password, database, pool_size=pool_size))
 
-def get_db_connection():
+def initialize_sqlite_connection(path=None, pool_size=DEFAULT_POOL_SIZE):
     """
-    Get the global database connection.
-    
+    Initialize the global database connection pool on an embedded, read-only SQLite database.
+
+    Without a path, the bundled sakila dump is used. It is imported into a snapshot in nl2sql/sakila-db on
+    first use, and again only when the dump changes.
+
+    Args:
+    path (str): Path of the SQLite database file
+    pool_size (int): Maximum number of concurrent connections
+
     Returns:
-    mysql.connector.connection.MySQLConnection: The database connection object
+    None
+    """
+    if path is None:
+        path = ensure_database()
+    _activate(SQLiteBackend(path, pool_size=pool_size))
+
+@contextmanager
+def pooled_connection() -> Iterator[Optional[Any]]:
     """
-    global db_connection
-    if db_connection is None or not db_connection.is_connected():
+    Check a connection out of the global pool for the duration of a `with` block.
+
+    Yields:
+    The database connection object of the active backend, or None if unavailable
+    """
+    backend = db_backend
+    if backend is None:
         print("Database connection is not initialized or has been closed.")
-        return None
-    return db_connection
+        yield None
+        return
+    try:
+        conn = backend.pool.checkout()
+    except DatabaseError as e:
+        print(f"Error getting a database connection: {e}")
+        yield None
+        return
+    try:
+        yield conn
+    finally:
+        backend.pool.release(conn)
+
+def get_pool_metrics() -> Dict[str, Any]:
+    """
+    Get usage metrics of the global connection pool.
+
+    Returns:
+    Dict[str, Any]: Pool metrics, empty if the pool is not initialized
+    """
+    if db_backend is None:
+        return {}
+    return db_backend.metrics()
 
 def close_db_connection():
     """
-    Close the global database connection.
-    
+    Close the global database connection pool.
+
     Returns:
     None
     """
-    global db_connection
-    if db_connection and db_connection.is_connected():
-        db_connection.close()
-        print("Database connection closed")
\ No newline at end of file
+    global db_backend
+    if db_backend is not None:
+        db_backend.close()
+        db_backend = None
+        print("Database connection closed")
@@ -0,0 +1,81 @@
+"""
+Asyncio variants of the tools in `nl2sql.tools`.
+
+Each coroutine has the same name, signature and docstring as its blocking counterpart, so it can be
+registered with `FunctionTool.from_defaults(async_fn=...)`. Calls run on a thread executor sized to
+the connection pool, which keeps the event loop free while a query is in flight and lets independent
+tool calls (for example describing three tables with `asyncio.gather`) overlap, up to one per pooled
+connection.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, List, Optional
+
+import nl2sql
+from nl2sql import tools
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_workers
+    workers = nl2sql.db_backend.pool.pool_size if nl2sql.db_backend else nl2sql.DEFAULT_POOL_SIZE
+    with _executor_lock:
+        # Follow the pool size if the connection was re-initialized with a different one.
+        if _executor is not None and _executor_workers != workers:
+            _executor.shutdown(wait=False)
+            _executor = None
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nl2sql")
+            _executor_workers = workers
+        return _executor
+
+
+def shutdown_executor() -> None:
+    """Stop the worker threads; a new executor is created on the next call."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def asyncify(fn: Callable[..., Any]) -> Callable[..., Awaitable[Any]]:
+    """Wrap a blocking tool into a coroutine function with the same metadata."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # run_in_executor does not carry context variables over, and the tracing session is one.
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(_get_executor(), functools.partial(context.run, fn, *args, **kwargs))
+    return wrapper
+
+
+list_tables = asyncify(tools.list_tables)
+get_table_schema_and_sample = asyncify(tools.get_table_schema_and_sample)
+describe_tables = asyncify(tools.describe_tables)
+find_relevant_tables = asyncify(tools.find_relevant_tables)
+validate_sql_query = asyncify(tools.validate_sql_query)
+check_sql_query = asyncify(tools.check_sql_query)
+explain_sql_query = asyncify(tools.explain_sql_query)
+run_sql_query = asyncify(tools.run_sql_query)
+get_table_relationships = asyncify(tools.get_table_relationships)
+get_table_statistics = asyncify(tools.get_table_statistics)
+
+ASYNC_TOOLS: List[Callable[..., Awaitable[Any]]] = [
+    list_tables,
+    get_table_schema_and_sample,
+    describe_tables,
+    find_relevant_tables,
+    validate_sql_query,
+    check_sql_query,
+    explain_sql_query,
+    run_sql_query,
+    get_table_relationships,
+    get_table_statistics,
+]
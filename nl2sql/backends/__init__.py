@@ -0,0 +1,25 @@
+"""
+Database backends behind the nl2sql tools.
+
+`MySQLBackend` (in `nl2sql.backends.mysql`) talks to a MySQL server and is imported on demand, so
+mysql-connector is only needed when a server is used. `SQLiteBackend` runs queries in-process on an
+SQLite file such as the sakila database imported by `nl2sql.backends.sakila`.
+"""
+from nl2sql.backends.base import Backend, PlanStep, QueryCost, QueryPlan, QueryResult
+from nl2sql.backends.errors import DatabaseError, QueryTimeoutError
+from nl2sql.backends.pool import ConnectionPool, DEFAULT_CHECKOUT_TIMEOUT, DEFAULT_POOL_SIZE
+from nl2sql.backends.sqlite import SQLiteBackend
+
+__all__ = [
+    "Backend",
+    "PlanStep",
+    "QueryCost",
+    "QueryPlan",
+    "QueryResult",
+    "DatabaseError",
+    "QueryTimeoutError",
+    "ConnectionPool",
+    "DEFAULT_CHECKOUT_TIMEOUT",
+    "DEFAULT_POOL_SIZE",
+    "SQLiteBackend",
+]
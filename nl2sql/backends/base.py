@@ -0,0 +1,197 @@
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type
+
+from nl2sql.backends.errors import DatabaseError
+from nl2sql.backends.pool import ConnectionPool, DEFAULT_CHECKOUT_TIMEOUT, DEFAULT_POOL_SIZE
+from nl2sql.rendering import FETCH_BATCH_SIZE
+from nl2sql.schema import ForeignKey, SchemaFingerprint, TableInfo
+from nl2sql.tracing import database_time
+
+
+@dataclass
+class QueryResult:
+    column_names: List[str]
+    rows: Iterable[Sequence[Any]]
+
+
+@dataclass
+class QueryCost:
+    """Optimizer estimate of the work a statement does, read from its plan without running it."""
+    rows_examined: float = 0.0
+    full_scans: List[str] = field(default_factory=list)  # tables read in full, as "table" or "table AS alias"
+    query_cost: Optional[float] = None  # the optimizer's own cost units, where the engine reports them
+    filesort: bool = False
+    temporary: bool = False
+
+
+@dataclass
+class PlanStep:
+    """One node of a query plan, flattened in plan order with its nesting depth."""
+    depth: int
+    operation: str  # the engine's own description of the node
+    table: Optional[str] = None  # table or alias read by the node, as the plan names it
+    access_type: Optional[str] = None  # in MySQL terms: ALL, index, range, ref, eq_ref, const
+    key: Optional[str] = None
+    estimated_rows: Optional[float] = None  # per execution of the node
+    actual_rows: Optional[float] = None  # per execution, when the plan was analyzed
+    loops: Optional[int] = None
+    filesort: bool = False
+    temporary: bool = False
+
+
+@dataclass
+class QueryPlan:
+    steps: List[PlanStep]
+    analyzed: bool = False
+    actual_rows: Optional[int] = None  # rows returned, when the statement was run
+    actual_seconds: Optional[float] = None
+
+
+class Backend:
+    """
+    Interface between the nl2sql tools and a database engine.
+
+    A backend owns a connection pool and implements connection handling, schema introspection,
+    sampling and query execution for one engine. Driver exceptions are re-raised as
+    `DatabaseError`, so the tools never depend on a particular driver.
+    """
+
+    name: str = ""
+    driver_errors: Tuple[Type[BaseException], ...] = ()
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE,
+                 checkout_timeout: float = DEFAULT_CHECKOUT_TIMEOUT) -> None:
+        self.pool = ConnectionPool(self, pool_size=pool_size, checkout_timeout=checkout_timeout)
+
+    @contextmanager
+    def errors(self) -> Iterator[None]:
+        """
+        Re-raise driver exceptions raised inside the block as `DatabaseError`.
+
+        Every driver call goes through this block, so its time is also recorded as database time
+        of the current tracing span.
+        """
+        with database_time():
+            try:
+                yield
+            except self.driver_errors as e:
+                raise self.wrap_error(e) from e
+
+    def wrap_error(self, error: BaseException) -> DatabaseError:
+        """Map a driver exception to `DatabaseError`, or to a subclass such as `QueryTimeoutError`."""
+        return DatabaseError(str(error))
+
+    # Connection handling, used by the pool
+
+    def connect(self) -> Any:
+        raise NotImplementedError
+
+    def ping(self, conn: Any) -> bool:
+        return True
+
+    def reset(self, conn: Any) -> None:
+        try:
+            conn.rollback()
+        except self.driver_errors:
+            pass
+
+    def disconnect(self, conn: Any) -> None:
+        try:
+            conn.close()
+        except self.driver_errors:
+            pass
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """Check a pooled connection out for the duration of a `with` block."""
+        with self.pool.connection(timeout) as conn:
+            yield conn
+
+    def metrics(self) -> Dict[str, Any]:
+        return self.pool.metrics()
+
+    def close(self) -> None:
+        self.pool.close()
+
+    # Schema introspection, used by the catalog
+
+    def fingerprint(self, conn: Any) -> SchemaFingerprint:
+        """Cheap summary of the schema and data versions, compared by the catalog after its TTL."""
+        raise NotImplementedError
+
+    def load_schema(self, conn: Any) -> Tuple[Dict[str, TableInfo], List[ForeignKey]]:
+        """Load all tables (with columns, indexes and statistics) and foreign keys in bulk."""
+        raise NotImplementedError
+
+    def sample_rows(self, conn: Any, tables: List[TableInfo], limit: int) -> Dict[str, List[Dict[str, Any]]]:
+        """Fetch the first `limit` rows of every given table, as dicts in column order."""
+        raise NotImplementedError
+
+    def count_rows(self, conn: Any, table_name: str) -> int:
+        """Exact row count of a table known to the catalog."""
+        raise NotImplementedError
+
+    # Query execution, used by the tools
+
+    def translate(self, query: str) -> str:
+        """Rewrite a MySQL statement written by the agent into this engine's dialect."""
+        return query
+
+    def explain(self, conn: Any, query: str) -> None:
+        """Ask the engine to plan the statement, raising `DatabaseError` if it is invalid."""
+        raise NotImplementedError
+
+    def estimate_cost(self, conn: Any, query: str) -> Optional[QueryCost]:
+        """Estimate the cost of a SELECT from its plan, or None if the engine gives no estimate."""
+        return None
+
+    def explain_plan(self, conn: Any, query: str, analyze: bool = False,
+                     timeout: Optional[float] = None) -> QueryPlan:
+        """
+        Get the plan of a SELECT. With `analyze` the statement is run, within `timeout` seconds,
+        and actual row counts are reported where the engine measures them.
+        """
+        raise NotImplementedError
+
+    def with_timeout(self, query: str, timeout: Optional[float]) -> str:
+        """Attach a server-side time limit to a statement, for engines that take it as an optimizer hint."""
+        return query
+
+    def open_cursor(self, conn: Any) -> Any:
+        return conn.cursor()
+
+    @contextmanager
+    def execute(self, conn: Any, query: str, timeout: Optional[float] = None) -> Iterator[Optional[QueryResult]]:
+        """
+        Execute a statement and stream its rows.
+
+        A statement running longer than `timeout` seconds is stopped with `QueryTimeoutError`,
+        where the engine supports it.
+
+        Yields:
+        Optional[QueryResult]: Column names and a lazy row iterator, or None if the statement returns no result set
+        """
+        cursor = self.open_cursor(conn)
+        try:
+            with self.errors():
+                cursor.execute(self.with_timeout(self.translate(query), timeout))
+            if cursor.description is None:
+                yield None
+            else:
+                yield QueryResult([column[0] for column in cursor.description], self._stream(cursor))
+        finally:
+            try:
+                cursor.close()
+            except self.driver_errors:
+                pass
+
+    def _stream(self, cursor: Any) -> Iterator[Sequence[Any]]:
+        """Stream rows from an unbuffered cursor in batches so only one batch is held in memory."""
+        # One block per fetch, so time spent rendering rows between fetches is not database time.
+        while True:
+            with self.errors():
+                batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not batch:
+                return
+            yield from batch
@@ -0,0 +1,6 @@
+class DatabaseError(Exception):
+    """Error raised by a backend, wrapping the driver-specific exception."""
+
+
+class QueryTimeoutError(DatabaseError):
+    """Error raised when a statement is stopped for running past its time limit."""
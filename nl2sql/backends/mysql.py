@@ -0,0 +1,344 @@
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import mysql.connector
+from mysql.connector import Error, MySQLConnection
+
+from nl2sql.backends.base import Backend, PlanStep, QueryCost, QueryPlan
+from nl2sql.backends.errors import DatabaseError, QueryTimeoutError
+from nl2sql.backends.pool import DEFAULT_CHECKOUT_TIMEOUT, DEFAULT_POOL_SIZE
+from nl2sql.schema import ColumnInfo, ForeignKey, IndexInfo, SchemaFingerprint, TableInfo, quote_identifier, quote_literal
+
+# Bulk introspection queries: one round-trip each, regardless of the number of tables.
+TABLES_QUERY = """
+SELECT TABLE_NAME, TABLE_TYPE, ENGINE, TABLE_ROWS, DATA_LENGTH, INDEX_LENGTH
+FROM INFORMATION_SCHEMA.TABLES
+WHERE TABLE_SCHEMA = DATABASE()
+ORDER BY TABLE_NAME
+"""
+
+COLUMNS_QUERY = """
+SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT, EXTRA
+FROM INFORMATION_SCHEMA.COLUMNS
+WHERE TABLE_SCHEMA = DATABASE()
+ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+
+FOREIGN_KEYS_QUERY = """
+SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+WHERE REFERENCED_TABLE_SCHEMA = DATABASE()
+    AND REFERENCED_TABLE_NAME IS NOT NULL
+ORDER BY TABLE_NAME, COLUMN_NAME
+"""
+
+INDEXES_QUERY = """
+SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME, SEQ_IN_INDEX, NON_UNIQUE, CARDINALITY
+FROM INFORMATION_SCHEMA.STATISTICS
+WHERE TABLE_SCHEMA = DATABASE()
+ORDER BY TABLE_NAME, INDEX_NAME = 'PRIMARY' DESC, INDEX_NAME, SEQ_IN_INDEX
+"""
+
+# Column histograms are only available on MySQL 8.0+ and only for columns analyzed with
+# ANALYZE TABLE ... UPDATE HISTOGRAM; they are treated as optional.
+HISTOGRAMS_QUERY = """
+SELECT TABLE_NAME, COLUMN_NAME, HISTOGRAM
+FROM INFORMATION_SCHEMA.COLUMN_STATISTICS
+WHERE SCHEMA_NAME = DATABASE()
+"""
+
+# Cheap change detection used once the catalog TTL has expired. CREATE_TIME moves on DDL,
+# UPDATE_TIME on writes (subject to the server's information_schema_stats_expiry).
+# The size estimates ride along so they stay as fresh as the TTL.
+FINGERPRINT_QUERY = """
+SELECT TABLE_NAME, CREATE_TIME, UPDATE_TIME, TABLE_ROWS, DATA_LENGTH, INDEX_LENGTH
+FROM INFORMATION_SCHEMA.TABLES
+WHERE TABLE_SCHEMA = DATABASE()
+ORDER BY TABLE_NAME
+"""
+
+# ER_QUERY_TIMEOUT: the statement ran past MAX_EXECUTION_TIME.
+QUERY_TIMEOUT_ERRNO = 3024
+
+# MAX_EXECUTION_TIME only applies to a top-level SELECT, so the hint goes right after its keyword.
+LEADING_SELECT = re.compile(r"^\s*SELECT\b", re.IGNORECASE)
+
+# One node of EXPLAIN FORMAT=TREE / EXPLAIN ANALYZE, e.g.
+# "    -> Index lookup on fa using idx_fk_film_id (film_id=f.film_id)  (cost=0.25 rows=5.4) (actual time=0.01..0.02 rows=5 loops=1000)"
+TREE_NODE = re.compile(
+    r"^(?P<indent>\s*)-> (?P<operation>.*?)"
+    r"(?:  \(cost=[\d.e+-]+(?:\.\.[\d.e+-]+)? rows=(?P<estimated>[\d.e+-]+)\))?"
+    r"(?: \(actual time=[\d.e+-]+\.\.[\d.e+-]+ rows=(?P<actual>[\d.e+-]+) loops=(?P<loops>\d+)\)| \(never executed\))?$"
+)
+TREE_ACCESS = re.compile(
+    r"^(?P<kind>Table scan|(?:Covering )?[Ii]ndex scan|(?:Covering )?[Ii]ndex range scan|"
+    r"Single-row (?:covering )?index lookup|(?:Covering )?[Ii]ndex lookup|Constant row) "
+    r"(?:on|from) (?P<table>\S+)(?: using (?P<key>\S+))?"
+)
+TREE_ACCESS_TYPES = (
+    ("table scan", "ALL"), ("range scan", "range"), ("index scan", "index"),
+    ("single-row", "eq_ref"), ("index lookup", "ref"), ("constant row", "const"),
+)
+
+
+def parse_plan_tree(text: str) -> List[PlanStep]:
+    """Flatten the text of EXPLAIN FORMAT=TREE or EXPLAIN ANALYZE into plan steps."""
+    steps: List[PlanStep] = []
+    for line in text.splitlines():
+        node = TREE_NODE.match(line)
+        if not node:
+            continue
+        operation = node.group("operation").strip()
+        step = PlanStep(depth=len(node.group("indent")) // 4, operation=operation)
+        if node.group("estimated"):
+            step.estimated_rows = float(node.group("estimated"))
+        if node.group("actual"):
+            step.actual_rows = float(node.group("actual"))
+            step.loops = int(node.group("loops"))
+        elif line.endswith("(never executed)"):
+            step.actual_rows, step.loops = 0.0, 0
+        access = TREE_ACCESS.match(operation)
+        if access:
+            step.table = access.group("table")
+            step.key = access.group("key")
+            kind = access.group("kind").lower()
+            step.access_type = next(name for marker, name in TREE_ACCESS_TYPES if marker in kind)
+        step.filesort = operation.startswith("Sort")
+        step.temporary = "temporary" in operation.lower() or operation.startswith("Materialize")
+        steps.append(step)
+    return steps
+
+
+def _plan_number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _walk_plan(node: Any, cost: QueryCost) -> None:
+    """Accumulate rows examined, full scans and sort/temporary markers of an EXPLAIN FORMAT=JSON tree."""
+    if isinstance(node, list):
+        for item in node:
+            _walk_plan(item, cost)
+        return
+    if not isinstance(node, dict):
+        return
+    if node.get("using_filesort"):
+        cost.filesort = True
+    if node.get("using_temporary_table"):
+        cost.temporary = True
+
+    # Tables of a nested loop are read once per row produced by the tables joined before them.
+    entries = node.get("nested_loop") or ([node] if isinstance(node.get("table"), dict) else [])
+    produced = 1.0
+    for entry in entries:
+        table = entry.get("table", {})
+        examined = _plan_number(table.get("rows_examined_per_scan"))
+        cost.rows_examined += produced * examined
+        produced = _plan_number(table.get("rows_produced_per_join")) or produced * examined
+        if table.get("access_type") == "ALL":
+            cost.full_scans.append(table.get("table_name", "?"))
+        for key, value in table.items():
+            if isinstance(value, (dict, list)):
+                _walk_plan(value, cost)
+
+    for key, value in node.items():
+        if key not in ("nested_loop", "table"):
+            _walk_plan(value, cost)
+
+
+class MySQLBackend(Backend):
+    """Backend for a MySQL server, introspected through INFORMATION_SCHEMA."""
+
+    name = "mysql"
+    driver_errors = (Error,)
+
+    def __init__(self, host: str, user: str, password: str, database: str,
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 checkout_timeout: float = DEFAULT_CHECKOUT_TIMEOUT) -> None:
+        super().__init__(pool_size=pool_size, checkout_timeout=checkout_timeout)
+        self.connect_args: Dict[str, Any] = dict(host=host, user=user, password=password, database=database)
+
+    def connect(self) -> MySQLConnection:
+        with self.errors():
+            return mysql.connector.connect(**self.connect_args)
+
+    def wrap_error(self, error: BaseException) -> DatabaseError:
+        if getattr(error, "errno", None) == QUERY_TIMEOUT_ERRNO:
+            return QueryTimeoutError(str(error))
+        return DatabaseError(str(error))
+
+    def ping(self, conn: MySQLConnection) -> bool:
+        if conn.is_connected():
+            return True
+        try:
+            conn.reconnect(attempts=2, delay=0)
+            return True
+        except Error:
+            return False
+
+    def reset(self, conn: MySQLConnection) -> None:
+        try:
+            if conn.is_connected():
+                conn.rollback()
+        except Error:
+            pass
+
+    def open_cursor(self, conn: MySQLConnection) -> Any:
+        # Unbuffered, so large results are streamed from the server instead of being materialized.
+        return conn.cursor(buffered=False)
+
+    def fingerprint(self, conn: MySQLConnection) -> SchemaFingerprint:
+        with self.errors():
+            cursor = conn.cursor()
+            cursor.execute(FINGERPRINT_QUERY)
+            rows = cursor.fetchall()
+            cursor.close()
+        return SchemaFingerprint(
+            schema=hashlib.sha1(repr([row[:2] for row in rows]).encode()).hexdigest(),
+            data=hashlib.sha1(repr([(row[0], row[2]) for row in rows]).encode()).hexdigest(),
+            sizes={row[0]: tuple(row[3:6]) for row in rows},
+        )
+
+    def load_schema(self, conn: MySQLConnection) -> Tuple[Dict[str, TableInfo], List[ForeignKey]]:
+        with self.errors():
+            cursor = conn.cursor(dictionary=True)
+
+            cursor.execute(TABLES_QUERY)
+            tables: Dict[str, TableInfo] = {}
+            for row in cursor.fetchall():
+                tables[row['TABLE_NAME']] = TableInfo(
+                    name=row['TABLE_NAME'],
+                    type=row['TABLE_TYPE'],
+                    engine=row['ENGINE'],
+                    row_estimate=row['TABLE_ROWS'],
+                    data_length=row['DATA_LENGTH'],
+                    index_length=row['INDEX_LENGTH'],
+                )
+
+            cursor.execute(COLUMNS_QUERY)
+            for row in cursor.fetchall():
+                table = tables.get(row['TABLE_NAME'])
+                if table is not None:
+                    table.columns.append(ColumnInfo(
+                        name=row['COLUMN_NAME'],
+                        type=row['COLUMN_TYPE'],
+                        nullable=row['IS_NULLABLE'] == 'YES',
+                        key=row['COLUMN_KEY'],
+                        default=row['COLUMN_DEFAULT'],
+                        extra=row['EXTRA'],
+                    ))
+
+            cursor.execute(FOREIGN_KEYS_QUERY)
+            foreign_keys: List[ForeignKey] = [
+                ForeignKey(row['TABLE_NAME'], row['COLUMN_NAME'], row['REFERENCED_TABLE_NAME'], row['REFERENCED_COLUMN_NAME'])
+                for row in cursor.fetchall()
+            ]
+
+            cursor.execute(INDEXES_QUERY)
+            for row in cursor.fetchall():
+                table = tables.get(row['TABLE_NAME'])
+                if table is not None:
+                    table.indexes.append(IndexInfo(
+                        name=row['INDEX_NAME'],
+                        column=row['COLUMN_NAME'],
+                        seq=row['SEQ_IN_INDEX'],
+                        non_unique=bool(row['NON_UNIQUE']),
+                        cardinality=row['CARDINALITY'],
+                    ))
+
+            try:
+                cursor.execute(HISTOGRAMS_QUERY)
+                for row in cursor.fetchall():
+                    table = tables.get(row['TABLE_NAME'])
+                    if table is not None and row['HISTOGRAM']:
+                        histogram = row['HISTOGRAM']
+                        table.histograms[row['COLUMN_NAME']] = json.loads(histogram) if isinstance(histogram, (str, bytes)) else histogram
+            except Error:
+                pass
+
+            cursor.close()
+        return tables, foreign_keys
+
+    def sample_rows(self, conn: MySQLConnection, tables: List[TableInfo], limit: int) -> Dict[str, List[Dict[str, Any]]]:
+        # One UNION ALL over all tables; each row is packed into a JSON object so tables with
+        # different columns fit one result set.
+        parts: List[str] = []
+        for table in tables:
+            pairs = ", ".join(f"{quote_literal(col.name)}, {self._sample_expression(col)}" for col in table.columns)
+            parts.append(f"(SELECT %s AS table_name, JSON_OBJECT({pairs}) AS row_json "
+                         f"FROM {quote_identifier(table.name)} LIMIT {int(limit)})")
+        by_name = {table.name: table for table in tables}
+        fetched: Dict[str, List[Dict[str, Any]]] = {table.name: [] for table in tables}
+        with self.errors():
+            cursor = conn.cursor()
+            cursor.execute(" UNION ALL ".join(parts), list(by_name))
+            for table_name, row_json in cursor.fetchall():
+                if isinstance(table_name, (bytes, bytearray)):
+                    table_name = table_name.decode()
+                values = json.loads(row_json)
+                fetched[table_name].append({col: values.get(col) for col in by_name[table_name].column_names})
+            cursor.close()
+        return fetched
+
+    @staticmethod
+    def _sample_expression(col: ColumnInfo) -> str:
+        # Binary payloads are summarized instead of being shipped to the agent.
+        if any(kind in col.type.lower() for kind in ("blob", "binary", "geometry", "point", "polygon")):
+            return f"CONCAT('<', LENGTH({quote_identifier(col.name)}), ' bytes>')"
+        return quote_identifier(col.name)
+
+    def count_rows(self, conn: MySQLConnection, table_name: str) -> int:
+        with self.errors():
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM {quote_identifier(table_name)}")
+            count = cursor.fetchone()[0]
+            cursor.close()
+        return count
+
+    def explain(self, conn: MySQLConnection, query: str) -> None:
+        with self.errors():
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"EXPLAIN {query}")
+                cursor.fetchall()
+            finally:
+                cursor.close()
+
+
+    def estimate_cost(self, conn: MySQLConnection, query: str) -> Optional[QueryCost]:
+        with self.errors():
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"EXPLAIN FORMAT=JSON {query}")
+                plan = json.loads(cursor.fetchone()[0])
+            finally:
+                cursor.close()
+        cost = QueryCost()
+        query_block = plan.get("query_block", {})
+        if "query_cost" in query_block.get("cost_info", {}):
+            cost.query_cost = _plan_number(query_block["cost_info"]["query_cost"])
+        _walk_plan(plan, cost)
+        return cost
+
+    def with_timeout(self, query: str, timeout: Optional[float]) -> str:
+        if not timeout:
+            return query
+        hint = f"/*+ MAX_EXECUTION_TIME({max(1, int(timeout * 1000))}) */"
+        return LEADING_SELECT.sub(lambda match: f"{match.group(0)} {hint}", query, count=1)
+
+    def explain_plan(self, conn: MySQLConnection, query: str, analyze: bool = False,
+                     timeout: Optional[float] = None) -> QueryPlan:
+        # EXPLAIN ANALYZE (MySQL 8.0.18+) runs the statement, so it gets the same time limit as a query.
+        statement = f"EXPLAIN ANALYZE {self.with_timeout(query, timeout)}" if analyze else f"EXPLAIN FORMAT=TREE {query}"
+        with self.errors():
+            cursor = conn.cursor()
+            try:
+                cursor.execute(statement)
+                text = "\n".join(str(row[0]) for row in cursor.fetchall())
+            finally:
+                cursor.close()
+        return QueryPlan(parse_plan_tree(text), analyzed=analyze)
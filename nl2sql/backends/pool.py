@@ -0,0 +1,152 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from nl2sql.backends.errors import DatabaseError
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_CHECKOUT_TIMEOUT = 30.0
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of database connections.
+
+    Connections are opened lazily up to `pool_size` through the backend's `connect`. A connection
+    is health-checked with `ping` on every checkout and replaced if the server dropped it, and
+    `reset` is called when it is given back.
+    """
+
+    def __init__(self, backend, pool_size: int = DEFAULT_POOL_SIZE,
+                 checkout_timeout: float = DEFAULT_CHECKOUT_TIMEOUT) -> None:
+        if pool_size < 1:
+            raise ValueError(f"pool_size must be at least 1, got {pool_size}")
+        self.backend = backend
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+
+        self._idle: List[Any] = []
+        self._created = 0
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        # Metrics
+        self._checkouts = 0
+        self._timeouts = 0
+        self._reconnects = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _ensure_healthy(self, conn: Optional[Any]) -> Any:
+        """Return a live connection, replacing `conn` if it was dropped."""
+        if conn is None:
+            return self.backend.connect()
+        if self.backend.ping(conn):
+            return conn
+        with self._cond:
+            self._reconnects += 1
+        self.backend.disconnect(conn)
+        return self.backend.connect()
+
+    def checkout(self, timeout: Optional[float] = None) -> Any:
+        """
+        Check a connection out of the pool, waiting until one is free.
+
+        Args:
+        timeout (float): Seconds to wait for a free connection, defaults to `checkout_timeout`
+
+        Returns:
+        A live database connection, which must be given back with `release`
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.perf_counter()
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise DatabaseError("Connection pool is closed")
+                if self._idle or self._created < self.pool_size:
+                    break
+                remaining = timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise DatabaseError(f"Timed out after {timeout}s waiting for a free connection")
+                self._cond.wait(remaining)
+
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._created += 1
+            self._in_use += 1
+            waited = time.perf_counter() - start
+            self._checkouts += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+
+        # Connect and health-check outside the lock so other threads are not blocked on I/O.
+        try:
+            return self._ensure_healthy(conn)
+        except DatabaseError:
+            with self._cond:
+                self._created -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn: Any) -> None:
+        """
+        Return a connection to the pool.
+
+        Args:
+        conn: Connection previously obtained from `checkout`
+        """
+        # Drop any open transaction so the next user starts from a clean session.
+        self.backend.reset(conn)
+        with self._cond:
+            self._in_use -= 1
+            if self._closed:
+                self._created -= 1
+                self.backend.disconnect(conn)
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """Check out a connection for the duration of a `with` block."""
+        conn = self.checkout(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Snapshot of pool usage.
+
+        Returns:
+        Dict[str, Any]: Pool size, open/idle/in-use counts and checkout wait statistics
+        """
+        with self._cond:
+            return {
+                "pool_size": self.pool_size,
+                "open": self._created,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "reconnects": self._reconnects,
+                "total_wait_s": self._total_wait,
+                "avg_wait_s": self._total_wait / self._checkouts if self._checkouts else 0.0,
+                "max_wait_s": self._max_wait,
+            }
+
+    def close(self) -> None:
+        """Close all idle connections; busy connections are closed when released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self.backend.disconnect(conn)
@@ -0,0 +1,492 @@
+"""
+Import of the bundled MySQL sakila dump (`nl2sql/sakila-db`) into an SQLite snapshot.
+
+The dumps are streamed line by line and translated on the fly: tables are rebuilt from their column
+definitions, views are transpiled with sqlglot, and extended INSERTs are cut into large multi-row
+batches that run inside one transaction, with secondary indexes built after the data. Triggers,
+procedures and functions have no SQLite equivalent and are skipped.
+
+Snapshots are named after a hash of the dump contents, so later startups open the existing file
+without loading anything. Run `python -m nl2sql.backends.sakila --force` to rebuild and print the
+rows/sec per table.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ErrorLevel, SqlglotError
+
+SAKILA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sakila-db")
+SCHEMA_PATH = os.path.join(SAKILA_DIR, "sakila-schema.sql")
+DATA_PATH = os.path.join(SAKILA_DIR, "sakila-data.sql")
+SNAPSHOT_PREFIX = "sakila-"
+
+# Bump when the translation changes, so existing snapshots are rebuilt.
+LOADER_VERSION = 1
+INSERT_BATCH_BYTES = 1 << 20
+LOAD_CACHE_KIB = 64 * 1024
+
+# Tables filled by MySQL triggers while the dump is loaded, recreated after the data is in.
+TRIGGER_BACKFILL = {
+    "film_text": "INSERT INTO film_text (film_id, title, description) SELECT film_id, title, description FROM film",
+}
+
+DELIMITER_PATTERN = re.compile(r"^DELIMITER[ \t]+(\S+)[ \t]*$", re.MULTILINE | re.IGNORECASE)
+
+# Quoted strings, comments, conditional comments and statement terminators of a MySQL script.
+TOKEN_PATTERN = re.compile(r"""
+    (?P<string>'(?:[^'\\]|\\.|'')*')
+  | (?P<quoted>"(?:[^"\\]|\\.|"")*"|`(?:[^`]|``)*`)
+  | (?P<comment>--(?:[ \t][^\n]*)?(?=\n|$)|\#[^\n]*|/\*(?!!).*?\*/)
+  | (?P<conditional>/\*!\d*)
+  | (?P<close>\*/)
+  | (?P<end>;)
+  | (?P<text>[^'"`;/*\#-]+|.)
+""", re.VERBOSE | re.DOTALL)
+
+# Character set introducers such as _utf8mb4'text'.
+INTRODUCER_PATTERN = re.compile(r"\b_(?:utf8mb4|utf8mb3|utf8|latin1|binary|ascii)\s*$", re.IGNORECASE)
+HEX_PATTERN = re.compile(r"\b0x([0-9A-Fa-f]+)\b")
+MYSQL_ESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+
+# Header of an extended INSERT, whose rows follow one or more per line.
+INSERT_HEADER = re.compile(r"^\s*INSERT\s+(?:IGNORE\s+)?INTO\s+(`[^`]+`|\w+)\s*(?:\(([^)]*)\))?\s*VALUES\s*", re.IGNORECASE)
+ESCAPED_CHARACTER = re.compile(r"\\.", re.DOTALL)
+
+SKIPPED_STATEMENTS = re.compile(
+    r"^(SET|USE|LOCK|UNLOCK|COMMIT|START\s+TRANSACTION|BEGIN|CREATE\s+(SCHEMA|DATABASE)|DROP\s+(SCHEMA|DATABASE))\b",
+    re.IGNORECASE)
+ROUTINE_STATEMENTS = re.compile(r"^CREATE\s+(DEFINER\s*=\s*\S+\s+)?(TRIGGER|PROCEDURE|FUNCTION)\b", re.IGNORECASE)
+VIEW_STATEMENT = re.compile(r"^CREATE\s+(?:OR\s+REPLACE\s+)?(?:ALGORITHM\s*=\s*\w+\s+)?(?:DEFINER\s*=\s*\S+\s+)?"
+                            r"(?:SQL\s+SECURITY\s+\w+\s+)?VIEW\s+(\S+)\s+AS\s+(.*)$", re.IGNORECASE | re.DOTALL)
+TABLE_STATEMENT = re.compile(r"^CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(`[^`]+`|\w+)\s*\(", re.IGNORECASE)
+COLUMN_TYPE = re.compile(r"^(\w+)(\s*\((?:'(?:[^']|'')*'|[^()'])*\))?((?:\s+(?:UNSIGNED|SIGNED|ZEROFILL))*)", re.IGNORECASE)
+DROPPED_COLUMN_OPTIONS = re.compile(
+    r"\s+(AUTO_INCREMENT|ON\s+UPDATE\s+CURRENT_TIMESTAMP(\(\d*\))?|CHARACTER\s+SET\s+\w+|COLLATE\s+\w+|SRID\s+\d+|"
+    r"COMMENT\s+'(?:[^']|'')*')", re.IGNORECASE)
+KEY_ITEM = re.compile(r"^(UNIQUE\s+)?(?:KEY|INDEX)?\s*(`[^`]+`|\w+)?\s*\((.*)\)$", re.IGNORECASE | re.DOTALL)
+
+
+def _unquote(name: str) -> str:
+    return name[1:-1].replace("``", "`") if name.startswith("`") else name
+
+
+def _mysql_string(body: str) -> str:
+    """Decode the body of a MySQL single-quoted literal (backslash escapes and doubled quotes)."""
+    if "\\" in body:
+        return re.sub(r"\\(.)", lambda m: MYSQL_ESCAPES.get(m.group(1), m.group(1)), body, flags=re.DOTALL)
+    return body.replace("''", "'")
+
+
+def _sqlite_string(token: str) -> str:
+    """Rewrite a MySQL single-quoted literal (with backslash escapes) as an SQLite literal."""
+    return "'" + _mysql_string(token[1:-1]).replace("'", "''") + "'"
+
+
+def iter_statements(script: str) -> Iterator[str]:
+    """
+    Split a MySQL script into statements rewritten for SQLite's lexer.
+
+    Comments are dropped, the contents of version-conditional comments (/*!50705 ... */) are kept,
+    string literals and hex literals are converted, and blocks using a custom DELIMITER (triggers and
+    routines) are skipped.
+    """
+    parts = DELIMITER_PATTERN.split(script)
+    # parts = [text, delimiter, text, delimiter, ...]; only ';'-delimited blocks are plain SQL.
+    blocks = [parts[0]] + [parts[i + 1] for i in range(1, len(parts) - 1, 2) if parts[i] == ";"]
+    for block in blocks:
+        buffer: List[str] = []
+        conditional = 0
+        for match in TOKEN_PATTERN.finditer(block):
+            kind = match.lastgroup
+            token = match.group()
+            if kind == "string":
+                if buffer and INTRODUCER_PATTERN.search(buffer[-1]):
+                    buffer[-1] = INTRODUCER_PATTERN.sub("", buffer[-1])
+                buffer.append(_sqlite_string(token))
+            elif kind == "comment":
+                buffer.append(" ")
+            elif kind == "conditional":
+                conditional += 1
+                buffer.append(" ")
+            elif kind == "close" and conditional:
+                conditional -= 1
+                buffer.append(" ")
+            elif kind == "end":
+                statement = "".join(buffer).strip()
+                buffer = []
+                if statement:
+                    yield statement
+            elif kind == "text":
+                buffer.append(HEX_PATTERN.sub(r"X'\1'", token))
+            else:
+                buffer.append(token)
+        statement = "".join(buffer).strip()
+        if statement:
+            yield statement
+
+
+def _split_top_level(body: str) -> List[str]:
+    """Split a parenthesized definition list on commas outside parentheses and quotes."""
+    items: List[str] = []
+    depth = 0
+    quote: Optional[str] = None
+    start = 0
+    for i, char in enumerate(body):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            items.append(body[start:i].strip())
+            start = i + 1
+    items.append(body[start:].strip())
+    return [item for item in items if item]
+
+
+def _matching_paren(text: str, open_index: int) -> int:
+    depth = 0
+    quote: Optional[str] = None
+    for i in range(open_index, len(text)):
+        char = text[i]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    raise ValueError("Unbalanced parentheses in CREATE TABLE")
+
+
+def _column_list(columns: str) -> List[str]:
+    # Drop index prefix lengths and sort orders, e.g. `title`(20) DESC.
+    return [_unquote(re.split(r"[\s(]", column.strip(), maxsplit=1)[0]) for column in _split_top_level(columns)]
+
+
+def translate_create_table(statement: str) -> List[str]:
+    """
+    Rebuild a MySQL CREATE TABLE statement for SQLite.
+
+    MySQL-only column options are dropped, ENUM becomes TEXT with a CHECK constraint, SET becomes TEXT
+    and spatial types become BLOB. A single AUTO_INCREMENT primary key becomes an INTEGER PRIMARY KEY
+    (the rowid). Secondary keys become CREATE INDEX statements named "<table>.<key>", since SQLite index
+    names are global; FULLTEXT and SPATIAL keys are dropped.
+
+    Returns:
+        List[str]: The CREATE TABLE statement followed by its CREATE INDEX statements
+    """
+    header = TABLE_STATEMENT.match(statement)
+    if not header:
+        raise ValueError("Not a CREATE TABLE statement")
+    table = _unquote(header.group(1))
+    open_index = header.end() - 1
+    items = _split_top_level(statement[open_index + 1:_matching_paren(statement, open_index)])
+
+    columns: List[Tuple[str, str]] = []
+    auto_increment: List[str] = []
+    primary_key: List[str] = []
+    constraints: List[str] = []
+    indexes: List[Tuple[str, bool, List[str]]] = []
+
+    for item in items:
+        upper = item.upper()
+        if upper.startswith("PRIMARY KEY"):
+            primary_key = _column_list(item[item.index("(") + 1:item.rindex(")")])
+        elif upper.startswith(("FULLTEXT", "SPATIAL")):
+            continue
+        elif upper.startswith(("CONSTRAINT", "FOREIGN KEY", "CHECK")):
+            constraints.append(item)
+        elif re.match(r"^(UNIQUE|KEY|INDEX)\b", upper):
+            key = KEY_ITEM.match(item)
+            if not key:
+                raise ValueError(f"Unsupported key definition: {item}")
+            key_columns = _column_list(key.group(3))
+            name = _unquote(key.group(2)) if key.group(2) and key.group(2).upper() not in ("KEY", "INDEX") else key_columns[0]
+            indexes.append((name, bool(key.group(1)), key_columns))
+        else:
+            name, _, definition = item.partition(" ")
+            name = _unquote(name)
+            column_type = COLUMN_TYPE.match(definition.strip())
+            if not column_type:
+                raise ValueError(f"Unsupported column definition: {item}")
+            base = column_type.group(1).upper()
+            options = definition.strip()[column_type.end():]
+            if re.search(r"\bAUTO_INCREMENT\b", options, re.IGNORECASE):
+                auto_increment.append(name)
+            options = DROPPED_COLUMN_OPTIONS.sub("", options)
+            if base == "ENUM":
+                options += f" CHECK (`{name}` IN {column_type.group(2)})"
+                sqlite_type = "TEXT"
+            elif base == "SET":
+                sqlite_type = "TEXT"
+            elif base in ("GEOMETRY", "POINT", "LINESTRING", "POLYGON", "MULTIPOINT", "MULTILINESTRING",
+                          "MULTIPOLYGON", "GEOMETRYCOLLECTION"):
+                sqlite_type = "BLOB"
+            else:
+                sqlite_type = " ".join(column_type.group(0).split()).upper()
+            columns.append((name, f"{sqlite_type} {options.strip()}"))
+
+    rowid_key = primary_key == auto_increment and len(primary_key) == 1
+    definitions: List[str] = []
+    for name, definition in columns:
+        if rowid_key and name == primary_key[0]:
+            definition = "INTEGER PRIMARY KEY" + re.sub(r"^\S+(\s+(UNSIGNED|SIGNED|ZEROFILL))*", "", definition, flags=re.IGNORECASE)
+        definitions.append(f"`{name}` {definition.strip()}")
+    if primary_key and not rowid_key:
+        definitions.append("PRIMARY KEY (" + ", ".join(f"`{column}`" for column in primary_key) + ")")
+    definitions.extend(constraints)
+
+    statements = [f"CREATE TABLE `{table}` (\n  " + ",\n  ".join(definitions) + "\n)"]
+    for name, unique, key_columns in indexes:
+        statements.append(f"CREATE {'UNIQUE ' if unique else ''}INDEX `{table}.{name}` ON `{table}` ("
+                          + ", ".join(f"`{column}`" for column in key_columns) + ")")
+    return statements
+
+
+def translate_view(statement: str) -> str:
+    """Transpile a MySQL CREATE VIEW statement to SQLite, dropping database qualifiers."""
+    match = VIEW_STATEMENT.match(statement)
+    if not match:
+        raise ValueError("Not a CREATE VIEW statement")
+    query = sqlglot.parse_one(match.group(2), read="mysql")
+    for table in query.find_all(exp.Table):
+        table.set("db", None)
+    select = query.sql(dialect="sqlite", unsupported_level=ErrorLevel.RAISE)
+    return f"CREATE VIEW `{_unquote(match.group(1))}` AS {select}"
+
+
+class TableLoadStats:
+    """Rows inserted into one table and the time spent parsing and inserting them."""
+
+    def __init__(self) -> None:
+        self.rows = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def translate_fragment(fragment: str) -> str:
+    """Rewrite a piece of a MySQL statement (e.g. a run of VALUES rows) for SQLite's lexer."""
+    return " ".join(iter_statements(fragment))
+
+
+def load_rows(conn: sqlite3.Connection, lines: Iterator[str], header: re.Match, first_line: str,
+              batch_bytes: int = INSERT_BATCH_BYTES) -> Tuple[str, int]:
+    """
+    Stream the rows of one extended INSERT statement into its table.
+
+    The VALUES list is cut at row boundaries into multi-row INSERTs of about `batch_bytes`, so only one
+    batch is held in memory. Lines are only tokenized when they contain MySQL-specific syntax (backslash
+    escapes, hex literals or conditional comments); everything else is passed to SQLite as is.
+
+    Returns:
+        Tuple[str, int]: Table name and number of rows inserted
+    """
+    table = _unquote(header.group(1))
+    columns = " (" + ", ".join(f"`{column}`" for column in _column_list(header.group(2))) + ")" if header.group(2) else ""
+    prefix = f"INSERT INTO `{table}`{columns} VALUES "
+    changes = conn.total_changes
+
+    chunk: List[str] = []
+    size = 0
+    open_quotes = 0
+    needs_translation = False
+    line: Optional[str] = first_line[header.end():]
+    while line is not None:
+        if "\\" in line:
+            needs_translation = True
+            open_quotes += ESCAPED_CHARACTER.sub("", line).count("'")
+        else:
+            open_quotes += line.count("'")
+        if "0x" in line or "/*" in line:
+            needs_translation = True
+        chunk.append(line)
+        size += len(line)
+
+        # A row boundary is a line ending in "), " or ");" outside of any string literal.
+        tail = line.rstrip()
+        last = tail.endswith(";")
+        if open_quotes % 2 == 0 and (last or (size >= batch_bytes and tail.endswith("),"))):
+            values = "".join(chunk).rstrip().rstrip(",;")
+            conn.execute(prefix + (translate_fragment(values) if needs_translation else values))
+            chunk, size, needs_translation = [], 0, False
+            if last:
+                return table, conn.total_changes - changes
+        line = next(lines, None)
+    raise ValueError(f"Unterminated INSERT INTO {table}")
+
+
+def load_script(conn: sqlite3.Connection, lines: Iterator[str], skipped: List[str], deferred: List[str],
+                stats: Dict[str, TableLoadStats]) -> None:
+    """
+    Execute a MySQL script on an SQLite connection, streaming it line by line.
+
+    Extended INSERTs are bulk-loaded with `load_rows`; all other statements are translated with
+    `iter_statements`. CREATE INDEX statements are collected in `deferred` so indexes are built once,
+    after the data is in, and objects that could not be translated are recorded in `skipped`.
+    """
+    lines = iter(lines)
+    text: List[str] = []
+    for line in lines:
+        header = INSERT_HEADER.match(line)
+        if header is None:
+            text.append(line)
+            continue
+        _execute_statements(conn, "".join(text), skipped, deferred)
+        text = []
+        start = time.perf_counter()
+        table, count = load_rows(conn, lines, header, line)
+        table_stats = stats.setdefault(table, TableLoadStats())
+        table_stats.rows += count
+        table_stats.seconds += time.perf_counter() - start
+    _execute_statements(conn, "".join(text), skipped, deferred)
+
+
+def _execute_statements(conn: sqlite3.Connection, script: str, skipped: List[str], deferred: List[str]) -> None:
+    for statement in iter_statements(script):
+        if SKIPPED_STATEMENTS.match(statement):
+            continue
+        if ROUTINE_STATEMENTS.match(statement):
+            skipped.append(" ".join(statement.split()[:3]))
+        elif TABLE_STATEMENT.match(statement):
+            create_table, *create_indexes = translate_create_table(statement)
+            conn.execute(create_table)
+            deferred.extend(create_indexes)
+        elif VIEW_STATEMENT.match(statement):
+            try:
+                conn.execute(translate_view(statement))
+            except (SqlglotError, sqlite3.Error) as e:
+                skipped.append(f"VIEW {VIEW_STATEMENT.match(statement).group(1)} ({str(e).splitlines()[0]})")
+        else:
+            conn.execute(statement)
+
+
+def snapshot_key(paths: Iterable[str] = (SCHEMA_PATH, DATA_PATH)) -> str:
+    """Content hash of the dump files and the loader version, naming the snapshot they produce."""
+    digest = hashlib.sha256(f"loader-{LOADER_VERSION}".encode())
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def build_database(path: str, schema_path: str = SCHEMA_PATH, data_path: str = DATA_PATH) -> Dict[str, object]:
+    """
+    Import the sakila schema and data dumps into a new SQLite database file.
+
+    Everything is loaded in a single transaction with journaling off, secondary indexes are created
+    after the data, and the file is written next to `path` and moved into place once complete, so a
+    half-built file is never opened.
+
+    Args:
+        path (str): Destination of the SQLite database
+        schema_path (str): MySQL schema dump
+        data_path (str): MySQL data dump
+
+    Returns:
+        Dict[str, object]: Load time in seconds, per-table row counts and rows/sec, and the skipped objects
+    """
+    start = time.perf_counter()
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    skipped: List[str] = []
+    deferred: List[str] = []
+    stats: Dict[str, TableLoadStats] = {}
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA locking_mode = EXCLUSIVE")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute(f"PRAGMA cache_size = -{LOAD_CACHE_KIB}")
+        conn.execute("BEGIN")
+        for script_path in (schema_path, data_path):
+            with open(script_path, encoding="utf-8") as f:
+                load_script(conn, f, skipped, deferred, stats)
+        for statement in deferred:
+            conn.execute(statement)
+        for table, backfill in TRIGGER_BACKFILL.items():
+            if conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]:
+                conn.execute(backfill)
+        conn.execute("COMMIT")
+        # Row counts and index statistics for the catalog and the query planner.
+        conn.execute("ANALYZE")
+    except BaseException:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+    os.replace(tmp_path, path)
+    return {
+        "seconds": time.perf_counter() - start,
+        "tables": {table: {"rows": table_stats.rows, "seconds": table_stats.seconds,
+                           "rows_per_sec": table_stats.rows_per_second}
+                   for table, table_stats in stats.items()},
+        "skipped": skipped,
+    }
+
+
+def format_report(report: Dict[str, object]) -> str:
+    """Render the report of `build_database` as one line per table."""
+    tables: Dict[str, Dict[str, float]] = report["tables"]
+    total_rows = sum(table["rows"] for table in tables.values())
+    lines = [f"Imported {total_rows} rows in {report['seconds']:.2f}s"]
+    width = max((len(name) for name in tables), default=0)
+    for name, table in tables.items():
+        lines.append(f"  {name.ljust(width)}  {table['rows']:>7} rows  {table['rows_per_sec']:>10,.0f} rows/s")
+    if report["skipped"]:
+        lines.append("Skipped: " + "; ".join(report["skipped"]))
+    return "\n".join(lines)
+
+
+def ensure_database(directory: str = SAKILA_DIR, force: bool = False) -> str:
+    """
+    Return the SQLite snapshot of the bundled dump, building it only if the dump changed.
+
+    Snapshots are named after `snapshot_key`, so a startup with an unchanged dump opens the existing
+    file without loading anything. Snapshots of older dumps are removed after a rebuild.
+
+    Args:
+        directory (str): Directory holding the snapshots
+        force (bool): Rebuild even if a snapshot for the current dump exists
+
+    Returns:
+        str: Path of the snapshot
+    """
+    key = snapshot_key()
+    path = os.path.join(directory, f"{SNAPSHOT_PREFIX}{key[:16]}.sqlite3")
+    if force or not os.path.exists(path):
+        report = build_database(path)
+        print(format_report(report))
+        for name in os.listdir(directory):
+            stale = os.path.join(directory, name)
+            if name.startswith(SNAPSHOT_PREFIX) and name.endswith(".sqlite3") and stale != path:
+                os.remove(stale)
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import the bundled sakila dump into an SQLite snapshot.")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the snapshot is up to date")
+    print(ensure_database(force=parser.parse_args().force))
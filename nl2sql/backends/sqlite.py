@@ -0,0 +1,406 @@
+import datetime
+import functools
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ErrorLevel, SqlglotError
+
+from nl2sql.backends.base import Backend, PlanStep, QueryCost, QueryPlan, QueryResult
+from nl2sql.backends.errors import DatabaseError, QueryTimeoutError
+from nl2sql.backends.pool import DEFAULT_CHECKOUT_TIMEOUT, DEFAULT_POOL_SIZE
+from nl2sql.schema import ColumnInfo, ForeignKey, IndexInfo, SchemaFingerprint, TableInfo, quote_identifier
+
+DEFAULT_MMAP_SIZE = 256 * 1024 * 1024
+TRANSLATION_CACHE_SIZE = 1024
+# Virtual machine instructions between two checks of a statement's deadline.
+PROGRESS_INTERVAL = 10_000
+
+# Bulk introspection through the table-valued pragma functions, one query per kind of object.
+TABLES_QUERY = """
+SELECT name, type FROM sqlite_master
+WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%'
+ORDER BY name
+"""
+
+COLUMNS_QUERY = """
+SELECT m.name, p.name, p.type, p."notnull", p.dflt_value, p.pk
+FROM sqlite_master AS m JOIN pragma_table_info(m.name) AS p
+WHERE m.type IN ('table', 'view') AND m.name NOT LIKE 'sqlite_%'
+ORDER BY m.name, p.cid
+"""
+
+FOREIGN_KEYS_QUERY = """
+SELECT m.name, f."from", f."table", f."to"
+FROM sqlite_master AS m JOIN pragma_foreign_key_list(m.name) AS f
+WHERE m.type = 'table'
+ORDER BY m.name, f."from"
+"""
+
+INDEXES_QUERY = """
+SELECT m.name, il.name, il."unique", il.origin, ii.seqno, ii.name
+FROM sqlite_master AS m JOIN pragma_index_list(m.name) AS il JOIN pragma_index_info(il.name) AS ii
+WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+ORDER BY m.name, il.origin = 'pk' DESC, il.name, ii.seqno
+"""
+
+# Written by ANALYZE when the database is built: "<rows> <avg rows per key prefix>...".
+STATISTICS_QUERY = "SELECT tbl, idx, stat FROM sqlite_stat1"
+
+# Page usage per table and index; only available when SQLite is compiled with the dbstat table.
+SIZES_QUERY = """
+SELECT m.tbl_name, m.type, SUM(s.pgsize)
+FROM dbstat AS s JOIN sqlite_master AS m ON m.name = s.name
+GROUP BY m.tbl_name, m.type
+"""
+
+# One line of EXPLAIN QUERY PLAN: "SCAN r1", "SEARCH a USING INDEX actor.idx_actor_last_name (last_name=?)".
+PLAN_STEP = re.compile(r"^(SCAN|SEARCH) (\(subquery-\d+\)|\S+)(?: USING (.*?))?(?: LEFT-JOIN)?$")
+PLAN_SUBQUERY = re.compile(r"^(?:CO-ROUTINE|MATERIALIZE) (\(subquery-\d+\)|\S+)$")
+PLAN_CONSTRAINTS = re.compile(r"\((.*)\)$")
+# Row estimates of the SQLite planner itself when it has no statistics.
+UNANALYZED_TABLE_ROWS = 1_000_000
+UNANALYZED_SEARCH_ROWS = 10
+
+
+def _parse_datetime(value: Any) -> Optional[datetime.datetime]:
+    if value is None:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _date_part(part):
+    def function(value):
+        parsed = _parse_datetime(value)
+        return part(parsed) if parsed else None
+    return function
+
+
+# MySQL functions the agent commonly uses that sqlglot leaves untranslated for SQLite.
+MYSQL_FUNCTIONS = {
+    "YEAR": (1, _date_part(lambda d: d.year)),
+    "MONTH": (1, _date_part(lambda d: d.month)),
+    "DAY": (1, _date_part(lambda d: d.day)),
+    "DAYOFMONTH": (1, _date_part(lambda d: d.day)),
+    "HOUR": (1, _date_part(lambda d: d.hour)),
+    "MINUTE": (1, _date_part(lambda d: d.minute)),
+    "SECOND": (1, _date_part(lambda d: d.second)),
+    "QUARTER": (1, _date_part(lambda d: (d.month - 1) // 3 + 1)),
+    "DAYNAME": (1, _date_part(lambda d: d.strftime("%A"))),
+    "MONTHNAME": (1, _date_part(lambda d: d.strftime("%B"))),
+    "DAYOFWEEK": (1, _date_part(lambda d: d.isoweekday() % 7 + 1)),
+    "DAY_OF_WEEK": (1, _date_part(lambda d: d.isoweekday() % 7 + 1)),
+}
+
+
+@functools.lru_cache(maxsize=TRANSLATION_CACHE_SIZE)
+def transpile_mysql(query: str) -> str:
+    """Transpile a MySQL statement to SQLite, returning it unchanged if sqlglot cannot."""
+    try:
+        statements = sqlglot.transpile(query, read="mysql", write="sqlite", unsupported_level=ErrorLevel.IGNORE)
+    except SqlglotError:
+        return query
+    return statements[0] if len(statements) == 1 else query
+
+
+class SQLiteBackend(Backend):
+    """
+    Backend for an SQLite database file, e.g. the sakila database built by `nl2sql.backends.sakila`.
+
+    Connections are read-only and memory-map the file, so exploratory queries run in-process without
+    any network round-trip. Statements written for MySQL are transpiled with sqlglot before they run.
+    """
+
+    name = "sqlite"
+    driver_errors = (sqlite3.Error,)
+
+    def __init__(self, path: str, pool_size: int = DEFAULT_POOL_SIZE,
+                 checkout_timeout: float = DEFAULT_CHECKOUT_TIMEOUT,
+                 mmap_size: int = DEFAULT_MMAP_SIZE, read_only: bool = True) -> None:
+        super().__init__(pool_size=pool_size, checkout_timeout=checkout_timeout)
+        self.path = os.path.abspath(path)
+        self.mmap_size = mmap_size
+        self.read_only = read_only
+
+    def connect(self) -> sqlite3.Connection:
+        if not os.path.exists(self.path):
+            raise DatabaseError(f"Database file not found: {self.path}")
+        with self.errors():
+            mode = "ro" if self.read_only else "rw"
+            conn = sqlite3.connect(f"file:{self.path}?mode={mode}", uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+            if self.read_only:
+                conn.execute("PRAGMA query_only = ON")
+            for name, (num_params, function) in MYSQL_FUNCTIONS.items():
+                conn.create_function(name, num_params, function, deterministic=True)
+            conn.create_function("NOW", 0, lambda: datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            conn.create_function("CURDATE", 0, lambda: datetime.date.today().isoformat())
+            return conn
+
+    def translate(self, query: str) -> str:
+        return transpile_mysql(query)
+
+    def fingerprint(self, conn: sqlite3.Connection) -> SchemaFingerprint:
+        with self.errors():
+            schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        # A rebuilt file replaces the old one, so its modification time versions the data.
+        modified = os.stat(self.path).st_mtime_ns
+        # Sizes are left out: they only change together with the file, which reloads the catalog.
+        return SchemaFingerprint(schema=f"{schema_version}:{modified}", data=str(modified))
+
+    def wrap_error(self, error: BaseException) -> DatabaseError:
+        # Raised when the progress handler installed by `execute` cancels a statement.
+        if isinstance(error, sqlite3.OperationalError) and str(error) == "interrupted":
+            return QueryTimeoutError(str(error))
+        return DatabaseError(str(error))
+
+    @staticmethod
+    def _statistics(conn: sqlite3.Connection) -> Dict[Tuple[str, Optional[str]], List[int]]:
+        statistics: Dict[Tuple[str, Optional[str]], List[int]] = {}
+        try:
+            for table_name, index_name, stat in conn.execute(STATISTICS_QUERY):
+                statistics[(table_name, index_name)] = [int(value) for value in stat.split() if value.isdigit()]
+        except sqlite3.OperationalError:
+            pass  # never analyzed
+        return statistics
+
+    def load_schema(self, conn: sqlite3.Connection) -> Tuple[Dict[str, TableInfo], List[ForeignKey]]:
+        with self.errors():
+            statistics = self._statistics(conn)
+
+            sizes: Dict[Tuple[str, str], int] = {}
+            try:
+                for table_name, kind, size in conn.execute(SIZES_QUERY):
+                    sizes[(table_name, kind)] = size
+            except sqlite3.OperationalError:
+                pass  # no dbstat
+
+            tables: Dict[str, TableInfo] = {}
+            for name, kind in conn.execute(TABLES_QUERY):
+                is_table = kind == "table"
+                row_estimates = [stat[0] for (table_name, _), stat in statistics.items() if table_name == name and stat]
+                tables[name] = TableInfo(
+                    name=name,
+                    type="BASE TABLE" if is_table else "VIEW",
+                    engine="SQLite" if is_table else None,
+                    row_estimate=max(row_estimates) if row_estimates else (0 if is_table and statistics else None),
+                    data_length=sizes.get((name, "table")) if is_table and sizes else None,
+                    index_length=sizes.get((name, "index"), 0) if is_table and sizes else None,
+                )
+
+            primary_keys: Dict[str, List[str]] = {}
+            for table_name, name, column_type, not_null, default, pk in conn.execute(COLUMNS_QUERY):
+                table = tables.get(table_name)
+                if table is None:
+                    continue
+                table.columns.append(ColumnInfo(name=name, type=column_type or "", nullable=not (not_null or pk),
+                                                key="PRI" if pk else "", default=default, extra=""))
+                if pk:
+                    primary_keys.setdefault(table_name, []).append(name)
+
+            for table_name, index_name, unique, origin, seqno, column_name in conn.execute(INDEXES_QUERY):
+                table = tables[table_name]
+                averages = statistics.get((table_name, index_name), [])
+                cardinality = None
+                if len(averages) > seqno + 1 and averages[seqno + 1]:
+                    cardinality = round(averages[0] / averages[seqno + 1])
+                if origin == "pk":
+                    display_name = "PRIMARY"
+                elif index_name.startswith(f"{table_name}."):
+                    display_name = index_name[len(table_name) + 1:]
+                else:
+                    display_name = index_name
+                table.indexes.append(IndexInfo(name=display_name, column=column_name, seq=seqno + 1,
+                                               non_unique=not unique, cardinality=cardinality))
+
+            # COLUMN_KEY semantics of MySQL: UNI for a single-column unique index, MUL for the first
+            # column of any other index.
+            for table in tables.values():
+                for index in table.indexes:
+                    column = next((col for col in table.columns if col.name == index.column), None)
+                    if index.seq != 1 or column is None or column.key:
+                        continue
+                    single = not any(other.name == index.name and other.seq > 1 for other in table.indexes)
+                    column.key = "UNI" if single and not index.non_unique else "MUL"
+
+            # An INTEGER PRIMARY KEY is the rowid itself and has no separate index.
+            for table_name, columns in primary_keys.items():
+                table = tables[table_name]
+                if table.type == "BASE TABLE" and not any(index.name == "PRIMARY" for index in table.indexes):
+                    for seq, column_name in enumerate(columns, start=1):
+                        table.indexes.insert(seq - 1, IndexInfo(name="PRIMARY", column=column_name, seq=seq,
+                                                                non_unique=False, cardinality=table.row_estimate))
+
+            foreign_keys = [ForeignKey(table_name, column, referenced_table, referenced_column)
+                            for table_name, column, referenced_table, referenced_column in conn.execute(FOREIGN_KEYS_QUERY)]
+        return tables, foreign_keys
+
+    def sample_rows(self, conn: sqlite3.Connection, tables: List[TableInfo], limit: int) -> Dict[str, List[Dict[str, Any]]]:
+        # In-process, so one query per table costs no round-trips.
+        fetched: Dict[str, List[Dict[str, Any]]] = {}
+        with self.errors():
+            for table in tables:
+                expressions = ", ".join(
+                    f"CASE WHEN typeof({quote_identifier(col.name)}) = 'blob' "
+                    f"THEN '<' || length({quote_identifier(col.name)}) || ' bytes>' ELSE {quote_identifier(col.name)} END"
+                    for col in table.columns)
+                rows = conn.execute(f"SELECT {expressions} FROM {quote_identifier(table.name)} LIMIT {int(limit)}").fetchall()
+                fetched[table.name] = [dict(zip(table.column_names, row)) for row in rows]
+        return fetched
+
+    def count_rows(self, conn: sqlite3.Connection, table_name: str) -> int:
+        with self.errors():
+            return conn.execute(f"SELECT COUNT(*) FROM {quote_identifier(table_name)}").fetchone()[0]
+
+    def explain(self, conn: sqlite3.Connection, query: str) -> None:
+        with self.errors():
+            conn.execute(f"EXPLAIN QUERY PLAN {self.translate(query)}").fetchall()
+
+    def _plan_steps(self, conn: sqlite3.Connection, translated: str) -> Tuple[List[Tuple[int, PlanStep]], Dict[str, str]]:
+        """Steps of EXPLAIN QUERY PLAN with the id of their parent node, and the aliases of the statement."""
+        with self.errors():
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {translated}").fetchall()
+            statistics = self._statistics(conn)
+        aliases = _table_aliases(translated)
+
+        steps: List[Tuple[int, PlanStep]] = []
+        depths: Dict[int, int] = {}
+        produced: Dict[int, float] = {}  # rows produced so far by the nested loop under each plan node
+        subqueries: Dict[str, int] = {}  # co-routines and materialized views/CTEs, by name
+        for node_id, parent, _, detail in plan:
+            depths[node_id] = depths.get(parent, -1) + 1
+            step = PlanStep(depth=depths[node_id], operation=detail)
+            match = PLAN_STEP.match(detail)
+            subquery = PLAN_SUBQUERY.match(detail)
+            if match:
+                kind, name, using = match.groups()
+                using = using or ""
+                table_name = aliases.get(name, name)
+                step.table = name
+                step.key = _plan_key(table_name, using)
+                if name in subqueries:
+                    step.access_type = "derived"
+                    step.estimated_rows = produced.get(subqueries[name], 1.0)
+                elif kind == "SCAN":
+                    step.access_type = "index" if "INDEX" in using else "ALL"
+                    step.estimated_rows = _table_rows(statistics, table_name)
+                else:
+                    step.access_type = _search_access(using)
+                    step.estimated_rows = _search_rows(statistics, table_name, using)
+                produced[parent] = produced.get(parent, 1.0) * step.estimated_rows
+            elif subquery:
+                subqueries[subquery.group(1)] = node_id
+            elif detail.startswith("USE TEMP B-TREE"):
+                step.filesort = "ORDER BY" in detail
+                step.temporary = not step.filesort
+            steps.append((parent, step))
+        return steps, aliases
+
+    def estimate_cost(self, conn: sqlite3.Connection, query: str) -> Optional[QueryCost]:
+        steps, aliases = self._plan_steps(conn, self.translate(query))
+        cost = QueryCost()
+        produced: Dict[int, float] = {}
+        for parent, step in steps:
+            cost.filesort = cost.filesort or step.filesort
+            cost.temporary = cost.temporary or step.temporary
+            if step.estimated_rows is None:
+                continue
+            # Each step runs once per row produced by the steps before it under the same parent.
+            outer = produced.get(parent, 1.0)
+            cost.rows_examined += outer * step.estimated_rows
+            produced[parent] = outer * step.estimated_rows
+            if step.access_type in ("ALL", "index"):
+                table_name = aliases.get(step.table, step.table)
+                cost.full_scans.append(table_name if table_name == step.table else f"{table_name} AS {step.table}")
+        return cost
+
+    def explain_plan(self, conn: sqlite3.Connection, query: str, analyze: bool = False,
+                     timeout: Optional[float] = None) -> QueryPlan:
+        steps, _ = self._plan_steps(conn, self.translate(query))
+        plan = QueryPlan([step for _, step in steps])
+        if analyze:
+            # Python's sqlite3 exposes no per-step counters, so the statement as a whole is run and timed.
+            start = time.perf_counter()
+            with self.execute(conn, query, timeout=timeout) as result:
+                plan.actual_rows = sum(1 for _ in result.rows) if result else 0
+            plan.actual_seconds = time.perf_counter() - start
+            plan.analyzed = True
+        return plan
+
+    @contextmanager
+    def execute(self, conn: sqlite3.Connection, query: str, timeout: Optional[float] = None) -> Iterator[Optional[QueryResult]]:
+        if not timeout:
+            with super().execute(conn, query) as result:
+                yield result
+            return
+        # SQLite has no statement timeout; the progress handler aborts the statement once the deadline passes.
+        deadline = time.monotonic() + timeout
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_INTERVAL)
+        try:
+            with super().execute(conn, query) as result:
+                yield result
+        finally:
+            conn.set_progress_handler(None, 0)
+
+
+def _table_aliases(query: str) -> Dict[str, str]:
+    """Map the aliases EXPLAIN QUERY PLAN reports to table names."""
+    try:
+        statement = sqlglot.parse_one(query, read="sqlite")
+    except SqlglotError:
+        return {}
+    return {table.alias_or_name: table.name for table in statement.find_all(exp.Table)}
+
+
+def _table_rows(statistics: Dict[Tuple[str, Optional[str]], List[int]], table_name: str) -> float:
+    rows = [stat[0] for (name, _), stat in statistics.items() if name == table_name and stat]
+    return float(max(rows)) if rows else float(UNANALYZED_TABLE_ROWS)
+
+
+def _plan_key(table_name: str, using: str) -> Optional[str]:
+    if "PRIMARY KEY" in using:
+        return "PRIMARY"
+    if "INDEX " not in using:
+        return None
+    index_name = using.split("INDEX ", 1)[1].split(" (")[0]
+    # Indexes imported from MySQL are named "<table>.<key>" to keep them unique in SQLite.
+    return index_name[len(table_name) + 1:] if index_name.startswith(f"{table_name}.") else index_name
+
+
+def _search_access(using: str) -> str:
+    match = PLAN_CONSTRAINTS.search(using)
+    constraints = match.group(1).split(" AND ") if match else []
+    if not any(constraint.endswith("=?") and constraint[-3] not in "<>" for constraint in constraints):
+        return "range"
+    return "eq_ref" if "PRIMARY KEY" in using else "ref"
+
+
+def _search_rows(statistics: Dict[Tuple[str, Optional[str]], List[int]], table_name: str, using: str) -> float:
+    """Rows one index lookup is expected to return, from the sqlite_stat1 average for its equality prefix."""
+    match = PLAN_CONSTRAINTS.search(using)
+    constraints = match.group(1).split(" AND ") if match else []
+    equalities = sum(1 for constraint in constraints if constraint.endswith("=?") and constraint[-3] not in "<>")
+    ranged = len(constraints) > equalities
+    if "PRIMARY KEY" in using and equalities:
+        rows = 1.0
+    elif "AUTOMATIC" in using:
+        rows = float(UNANALYZED_SEARCH_ROWS)
+    else:
+        index_name = using.split("INDEX ", 1)[1].split(" (")[0] if "INDEX " in using else None
+        stat = statistics.get((table_name, index_name))
+        if stat and len(stat) > equalities:
+            rows = float(stat[equalities])
+        elif stat or not equalities:
+            rows = _table_rows(statistics, table_name) if not equalities else 1.0
+        else:
+            rows = float(UNANALYZED_SEARCH_ROWS)
+    # The planner itself assumes each range bound keeps about a quarter of the rows.
+    return max(rows / 4 if ranged else rows, 1.0)
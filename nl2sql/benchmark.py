@@ -0,0 +1,87 @@
+"""
+Latency benchmark of the nl2sql tools on the embedded SQLite copy of sakila.
+
+Runs without a database service:
+
+    python -m nl2sql.benchmark --repeat 50
+
+With `--trace trace.json`, the per-tool tracing summary (database vs. other time, rows, bytes,
+cache hits and latency histograms) is also written as JSON.
+"""
+import argparse
+import statistics
+import time
+from typing import Callable, Dict, List, Tuple
+
+from nl2sql import initialize_sqlite_connection, close_db_connection
+from nl2sql.query_cache import query_cache
+from nl2sql import tools
+from nl2sql.tracing import tracer
+
+WORKLOAD: List[Tuple[str, Callable[[], object]]] = [
+    ("list_tables", lambda: tools.list_tables()),
+    ("get_table_schema_and_sample", lambda: tools.get_table_schema_and_sample("film")),
+    ("describe_tables", lambda: tools.describe_tables(["film", "film_actor", "actor"])),
+    ("check_sql_query", lambda: tools.check_sql_query(
+        "SELECT a.last_name, COUNT(*) FROM actor a JOIN film_actor fa ON a.actor_id = fa.actor_id GROUP BY a.last_name")),
+    ("run_sql_query (point lookup)", lambda: tools.run_sql_query("SELECT title FROM film WHERE film_id = 42")),
+    ("run_sql_query (join + aggregate)", lambda: tools.run_sql_query(
+        "SELECT c.name, SUM(p.amount) AS revenue FROM payment p "
+        "JOIN rental r ON p.rental_id = r.rental_id JOIN inventory i ON r.inventory_id = i.inventory_id "
+        "JOIN film_category fc ON i.film_id = fc.film_id JOIN category c ON fc.category_id = c.category_id "
+        "GROUP BY c.name ORDER BY revenue DESC")),
+    ("run_sql_query (full scan)", lambda: tools.run_sql_query("SELECT * FROM rental")),
+    ("get_table_relationships", lambda: tools.get_table_relationships()),
+    ("get_table_statistics", lambda: tools.get_table_statistics("rental")),
+    ("get_table_statistics (exact)", lambda: tools.get_table_statistics("rental", exact_count=True)),
+]
+
+
+def run(repeat: int, use_cache: bool) -> Dict[str, Dict[str, float]]:
+    """Time every tool call of the workload `repeat` times, in milliseconds."""
+    results: Dict[str, Dict[str, float]] = {}
+    for name, call in WORKLOAD:
+        timings: List[float] = []
+        for _ in range(repeat):
+            if not use_cache:
+                query_cache.clear()
+            start = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        results[name] = {
+            "mean_ms": statistics.fmean(timings),
+            "p50_ms": timings[len(timings) // 2],
+            "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20, help="Calls per tool")
+    parser.add_argument("--path", default=None, help="SQLite database, defaults to the bundled sakila import")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the query result cache between calls")
+    parser.add_argument("--trace", default=None, help="Write the tracing summary of the run to this JSON file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    initialize_sqlite_connection(args.path)
+    print(f"Startup: {(time.perf_counter() - start) * 1000:.1f} ms")
+    try:
+        with tracer.session("benchmark") as session:
+            results = run(args.repeat, args.with_cache)
+    finally:
+        close_db_connection()
+    if args.trace:
+        session.dump(args.trace)
+        print(f"Tracing summary written to {args.trace}")
+
+    width = max(len(name) for name in results)
+    print(f"{'tool'.ljust(width)}  {'mean':>9}  {'p50':>9}  {'p95':>9}")
+    for name, timing in results.items():
+        print(f"{name.ljust(width)}  {timing['mean_ms']:>7.2f}ms  {timing['p50_ms']:>7.2f}ms  {timing['p95_ms']:>7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
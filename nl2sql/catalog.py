@@ -0,0 +1,203 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import nl2sql
+from nl2sql import pooled_connection
+from nl2sql.backends import Backend, DatabaseError
+from nl2sql.schema import ForeignKey, SchemaFingerprint, TableInfo
+from nl2sql.tracing import count
+
+DEFAULT_CATALOG_TTL = 300.0
+SAMPLE_ROWS = 3
+
+
+@dataclass
+class CatalogSnapshot:
+    tables: Dict[str, TableInfo]
+    foreign_keys: List[ForeignKey]
+    fingerprint: str
+    data_fingerprint: str
+    generation: int
+    loaded_at: float
+    samples: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+
+
+class SchemaCatalog:
+    """
+    In-process cache of tables, columns, foreign keys and indexes of the connected database.
+
+    The whole schema is loaded in bulk with a constant number of queries and then served from
+    memory. After `ttl` seconds the catalog re-checks a fingerprint of the schema and only reloads
+    if it changed. `invalidate` forces a reload and bumps the generation counter, which other
+    caches can use as a schema version.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_CATALOG_TTL) -> None:
+        self.ttl = ttl
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._backend: Optional[Backend] = None
+        self._generation = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def invalidate(self) -> None:
+        """Drop the cached schema so the next lookup reloads it, e.g. after DDL."""
+        with self._lock:
+            self._snapshot = None
+            self._generation += 1
+
+    def snapshot(self) -> Optional[CatalogSnapshot]:
+        """
+        Get the current schema snapshot, loading or revalidating it if needed.
+
+        Returns:
+            Optional[CatalogSnapshot]: The schema snapshot, or None if the database is unavailable
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and self._backend is nl2sql.db_backend:
+                if time.monotonic() - snapshot.loaded_at < self.ttl:
+                    self.hits += 1
+                    count("catalog_hits")
+                    return snapshot
+
+            self.misses += 1
+            count("catalog_misses")
+            backend = nl2sql.db_backend
+            with pooled_connection() as conn:
+                if not conn:
+                    return None
+                try:
+                    return self._refresh(backend, conn, snapshot)
+                except DatabaseError as e:
+                    print(f"Error loading schema catalog: {e}")
+                    return None
+
+    def _refresh(self, backend: Backend, conn: Any, snapshot: Optional[CatalogSnapshot]) -> CatalogSnapshot:
+        fingerprint: SchemaFingerprint = backend.fingerprint(conn)
+
+        if snapshot is not None and self._backend is backend and snapshot.fingerprint == fingerprint.schema:
+            # Schema unchanged; only sample rows and size estimates can be stale after writes.
+            if snapshot.data_fingerprint != fingerprint.data:
+                snapshot.samples.clear()
+                snapshot.data_fingerprint = fingerprint.data
+            for name, (row_estimate, data_length, index_length) in fingerprint.sizes.items():
+                table = snapshot.tables.get(name)
+                if table is not None:
+                    table.row_estimate, table.data_length, table.index_length = row_estimate, data_length, index_length
+            snapshot.loaded_at = time.monotonic()
+            return snapshot
+
+        if snapshot is not None:
+            self._generation += 1
+        tables, foreign_keys = backend.load_schema(conn)
+        self.loads += 1
+        self._snapshot = CatalogSnapshot(tables=tables, foreign_keys=foreign_keys, fingerprint=fingerprint.schema,
+                                         data_fingerprint=fingerprint.data, generation=self._generation,
+                                         loaded_at=time.monotonic())
+        self._backend = backend
+        return self._snapshot
+
+    def table_names(self) -> List[str]:
+        """List all table and view names, empty if the database is unavailable."""
+        snapshot = self.snapshot()
+        return list(snapshot.tables) if snapshot else []
+
+    def get_table(self, table_name: str) -> Optional[TableInfo]:
+        """
+        Resolve a table name against the catalog.
+
+        Args:
+            table_name (str): Name of the table, matched exactly first and then case-insensitively
+
+        Returns:
+            Optional[TableInfo]: The table, or None if it does not exist
+        """
+        snapshot = self.snapshot()
+        if not snapshot:
+            return None
+        table = snapshot.tables.get(table_name)
+        if table is None:
+            lowered = table_name.strip('`').lower()
+            table = next((t for name, t in snapshot.tables.items() if name.lower() == lowered), None)
+        return table
+
+    def foreign_keys(self) -> List[ForeignKey]:
+        """List all foreign keys, empty if the database is unavailable."""
+        snapshot = self.snapshot()
+        return list(snapshot.foreign_keys) if snapshot else []
+
+    def sample_rows(self, table_name: str) -> List[Dict[str, Any]]:
+        """
+        Get the first rows of a table, cached until the data fingerprint changes.
+
+        Args:
+            table_name (str): Name of a table known to the catalog
+
+        Returns:
+            List[Dict[str, Any]]: Up to SAMPLE_ROWS rows
+        """
+        return self.sample_rows_many([table_name]).get(table_name, [])
+
+    def sample_rows_many(self, table_names: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get the first rows of several tables, fetching all uncached tables in one backend call
+        (a single UNION ALL query on MySQL).
+
+        Args:
+            table_names (List[str]): Names of tables known to the catalog
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: Up to SAMPLE_ROWS rows per table, in column order
+        """
+        snapshot = self.snapshot()
+        if not snapshot:
+            return {}
+        names = [name for name in dict.fromkeys(table_names) if name in snapshot.tables]
+        missing = [name for name in names if name not in snapshot.samples]
+
+        if missing:
+            backend = nl2sql.db_backend
+            with pooled_connection() as conn:
+                if not conn:
+                    return {}
+                try:
+                    fetched = backend.sample_rows(conn, [snapshot.tables[name] for name in missing], SAMPLE_ROWS)
+                except DatabaseError as e:
+                    print(f"Error fetching sample rows: {e}")
+                    return {}
+            snapshot.samples.update(fetched)
+
+        return {name: snapshot.samples.get(name, []) for name in names}
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters of the catalog."""
+        return {"hits": self.hits, "misses": self.misses, "loads": self.loads, "generation": self._generation}
+
+
+schema_catalog = SchemaCatalog()
+
+def resolve_table(table_name: str) -> Tuple[Optional[TableInfo], str]:
+    """
+    Resolve a table name for a tool, returning an error message the agent can act on if it is unknown.
+
+    Args:
+        table_name (str): Name of the table
+
+    Returns:
+        Tuple[Optional[TableInfo], str]: The table and an empty message, or None and the error message
+    """
+    table = schema_catalog.get_table(table_name)
+    if table is None:
+        if schema_catalog.snapshot() is None:
+            return None, "Database connection error"
+        return None, f"Table '{table_name}' does not exist. Use list_tables to see the available tables."
+    return table, ""
@@ -0,0 +1,205 @@
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator, List, Optional, Sequence
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+
+from nl2sql.backends import Backend, DatabaseError, QueryCost
+from nl2sql.rendering import DEFAULT_MAX_ROWS
+
+DIALECT = "mysql"
+
+REWRITE_ADVICE = "Add selective WHERE filters or join conditions on indexed columns, or aggregate over fewer rows"
+
+
+@dataclass
+class GuardrailConfig:
+    """
+    Limits enforced by `run_sql_query` before and while a statement runs.
+
+    A SELECT whose plan exceeds a budget is either rewritten with a small LIMIT, when the engine
+    can stream its rows and stop early, or rejected with the reasons. Set a budget to None to
+    disable it, or `enabled` to False to turn the guard off entirely.
+    """
+    enabled: bool = True
+    max_rows_examined: Optional[float] = 5_000_000
+    max_query_cost: Optional[float] = None  # optimizer cost units, MySQL only
+    on_over_budget: str = "rewrite"  # "rewrite" or "reject"
+    default_limit: Optional[int] = 1000  # injected into SELECTs without a LIMIT
+    rewrite_limit: int = DEFAULT_MAX_ROWS  # LIMIT of a rewritten over-budget SELECT
+    max_execution_time: Optional[float] = 10.0  # seconds per statement
+
+
+guardrail_config = GuardrailConfig()
+
+
+@dataclass
+class GuardedQuery:
+    query: str
+    timeout: Optional[float] = None
+    notes: List[str] = field(default_factory=list)  # reported to the agent below the result
+    rejection: Optional[str] = None  # set when the statement must not run
+    injected_limit: Optional[int] = None  # default LIMIT added to an unbounded SELECT
+    row_limit: Optional[int] = None  # any LIMIT added by the guard, default or over-budget rewrite
+    rows_returned: int = 0
+
+    def count(self, rows: Iterable[Sequence[Any]]) -> Iterator[Sequence[Any]]:
+        """Pass result rows through, counting them for `report`."""
+        for row in rows:
+            self.rows_returned += 1
+            yield row
+
+    def report(self) -> str:
+        """Notes for the agent, one "Guardrail:" line each; the injected LIMIT is only reported if it cut the result."""
+        notes = list(self.notes)
+        if self.injected_limit is not None and self.rows_returned >= self.injected_limit:
+            notes.append(f"the query had no LIMIT, so LIMIT {self.injected_limit} was added; "
+                         f"the full result may have more rows.")
+        return "".join(f"Guardrail: {note}\n" for note in notes)
+
+
+def _parse_query(query: str) -> Optional[exp.Query]:
+    try:
+        statements = [s for s in sqlglot.parse(query, read=DIALECT) if s is not None]
+    except SqlglotError:
+        return None
+    if len(statements) == 1 and isinstance(statements[0], (exp.Select, exp.SetOperation)):
+        return statements[0]
+    return None
+
+
+def _aggregates(statement: exp.Select) -> bool:
+    return any(projection.find(exp.AggFunc) for projection in statement.expressions)
+
+
+def _is_streamable(statement: exp.Query) -> bool:
+    """True if the engine can return the first rows without reading all input, so a LIMIT stops it early."""
+    if not isinstance(statement, exp.Select):
+        return False
+    if any(statement.args.get(arg) for arg in ("group", "order", "having", "distinct")):
+        return False
+    return not _aggregates(statement) and not any(projection.find(exp.Window) for projection in statement.expressions)
+
+
+def _is_single_row(statement: exp.Query) -> bool:
+    if not isinstance(statement, exp.Select) or statement.args.get("group"):
+        return False
+    return not statement.args.get("from") or _aggregates(statement)
+
+
+def _accepts_limit(statement: exp.Query) -> bool:
+    """True if a LIMIT appended to the statement text is valid: MySQL wants it before FOR UPDATE, FOR SHARE,
+    LOCK IN SHARE MODE and INTO, and sqlglot would render INTO as another statement."""
+    return not statement.args.get("locks") and not statement.args.get("into")
+
+
+def _limit_value(statement: exp.Query) -> Optional[int]:
+    limit = statement.args.get("limit")
+    expression = limit.expression if limit is not None else None
+    if isinstance(expression, exp.Literal) and expression.is_int:
+        return int(expression.this)
+    return None
+
+
+def add_limit(query: str, limit: int) -> str:
+    """
+    Append a LIMIT to a SELECT that has none.
+
+    The statement text is kept as written; the clause goes on a new line so a trailing comment
+    cannot swallow it.
+
+    Args:
+        query (str): SELECT statement without a top-level LIMIT
+        limit (int): Maximum number of rows
+
+    Returns:
+        str: The bounded statement
+    """
+    return f"{query.rstrip().rstrip(';').rstrip()}\nLIMIT {int(limit)}"
+
+
+def _over_budget(cost: QueryCost, config: GuardrailConfig) -> List[str]:
+    reasons: List[str] = []
+    if config.max_rows_examined is not None and cost.rows_examined > config.max_rows_examined:
+        reasons.append(f"~{cost.rows_examined:,.0f} rows examined (budget {config.max_rows_examined:,.0f})")
+    if config.max_query_cost is not None and cost.query_cost is not None and cost.query_cost > config.max_query_cost:
+        reasons.append(f"optimizer cost {cost.query_cost:,.0f} (budget {config.max_query_cost:,.0f})")
+    return reasons
+
+
+def _describe(reasons: List[str], cost: QueryCost) -> str:
+    description = "estimated " + " and ".join(reasons)
+    if cost.full_scans:
+        description += f", with full table scans on {', '.join(cost.full_scans)}"
+    if cost.temporary:
+        description += ", using a temporary table"
+    if cost.filesort:
+        description += ", sorting without an index"
+    return description
+
+
+def guard_query(backend: Backend, conn: Any, query: str, config: Optional[GuardrailConfig] = None) -> GuardedQuery:
+    """
+    Check a statement against the guardrail budgets before it runs.
+
+    SELECTs are costed with the engine's EXPLAIN. A statement over budget is rewritten with
+    `rewrite_limit` if its rows can be streamed, and rejected otherwise; an unbounded SELECT within
+    budget gets `default_limit`. No LIMIT is added to a SELECT with a locking clause or INTO. Every statement gets the `max_execution_time` limit. Statements
+    that are not a single SELECT, or that fail to plan, pass through with only the time limit.
+
+    Args:
+        backend (Backend): Backend that will run the statement
+        conn (Any): Connection checked out of the backend's pool
+        query (str): SQL statement written by the agent
+        config (Optional[GuardrailConfig]): Limits to apply, defaults to `guardrail_config`
+
+    Returns:
+        GuardedQuery: The statement to run, its time limit and notes for the agent, or the rejection reason
+    """
+    config = config or guardrail_config
+    if not config.enabled:
+        return GuardedQuery(query)
+    guarded = GuardedQuery(query, timeout=config.max_execution_time)
+
+    statement = _parse_query(query)
+    if statement is None:
+        return guarded
+
+    limit = _limit_value(statement)
+    bounded = statement.args.get("limit") is not None
+    streamable = _is_streamable(statement)
+
+    # A LIMIT only bounds the work when rows are streamed; sorting or grouping reads all input first.
+    cheap = streamable and limit is not None and limit <= config.rewrite_limit
+    cost: Optional[QueryCost] = None
+    if not cheap and (config.max_rows_examined is not None or config.max_query_cost is not None):
+        try:
+            cost = backend.estimate_cost(conn, query)
+        except DatabaseError:
+            cost = None  # the error is reported when the statement runs
+    reasons = _over_budget(cost, config) if cost is not None else []
+
+    if reasons:
+        description = _describe(reasons, cost)
+        if streamable and not bounded and _accepts_limit(statement) and config.on_over_budget == "rewrite":
+            guarded.query = add_limit(query, config.rewrite_limit)
+            guarded.row_limit = config.rewrite_limit
+            guarded.notes.append(f"{description}; ran with LIMIT {config.rewrite_limit}, so the rows shown are "
+                                 f"an arbitrary subset. {REWRITE_ADVICE}.")
+        else:
+            lower_limit = f", or lower the LIMIT to {config.rewrite_limit}" if streamable and bounded else ""
+            guarded.rejection = (f"Query rejected by guardrail: {description}. "
+                                 f"{REWRITE_ADVICE}{lower_limit}, and run it again.")
+        return guarded
+
+    if not bounded and config.default_limit and not _is_single_row(statement) and _accepts_limit(statement):
+        guarded.query = add_limit(query, config.default_limit)
+        guarded.injected_limit = guarded.row_limit = config.default_limit
+    return guarded
+
+
+def throttled_message(timeout: Optional[float]) -> str:
+    """Message returned to the agent when a statement was stopped by its time limit."""
+    limit = f"the {timeout:g}s" if timeout else "its"
+    return f"Query throttled: it ran past {limit} statement time limit and was stopped. {REWRITE_ADVICE}, and run it again."
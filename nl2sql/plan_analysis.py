@@ -0,0 +1,275 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+from sqlglot.optimizer.scope import traverse_scope
+
+from nl2sql.backends import PlanStep, QueryPlan
+from nl2sql.catalog import CatalogSnapshot
+from nl2sql.schema import TableInfo, quote_identifier
+
+DIALECT = "mysql"
+
+ACCESS_LABELS = {
+    "ALL": "full table scan",
+    "index": "full index scan",
+    "range": "index range scan",
+    "ref": "index lookup",
+    "eq_ref": "unique index lookup",
+    "const": "constant row",
+    "derived": "scan of a subquery result",
+}
+FULL_SCANS = ("ALL", "index")
+# Estimated and actual rows further apart than this factor are reported as stale statistics.
+MISESTIMATE_FACTOR = 10
+MAX_OPERATION_LENGTH = 120
+
+RANGE_PREDICATES = (exp.GT, exp.GTE, exp.LT, exp.LTE, exp.Between)
+
+
+@dataclass
+class ColumnUsage:
+    """How one table reference of a query uses its columns, in order of first use."""
+    table: TableInfo
+    equalities: List[str] = field(default_factory=list)  # compared with constants: col = 1, col IN (...)
+    ranges: List[str] = field(default_factory=list)  # col > 1, col BETWEEN ..., col LIKE 'abc%'
+    joins: List[str] = field(default_factory=list)  # compared with a column of another table
+    order: List[str] = field(default_factory=list)  # ORDER BY / GROUP BY
+
+
+@dataclass
+class IndexSuggestion:
+    table: str
+    columns: List[str]
+    reason: str
+    existing_index: Optional[str] = None  # set when a matching index exists but the plan does not use it
+
+    def __str__(self) -> str:
+        if self.existing_index:
+            return (f"{self.reason} Index {self.existing_index} on {self.table} already covers it but is not used; "
+                    f"check for functions or type conversions on the column, or low selectivity.")
+        columns = ", ".join(quote_identifier(column) for column in self.columns)
+        name = quote_identifier(f"idx_{self.table}_{'_'.join(self.columns)}")
+        return f"{self.reason} CREATE INDEX {name} ON {quote_identifier(self.table)} ({columns});"
+
+
+def _add(names: List[str], name: str) -> None:
+    if name not in names:
+        names.append(name)
+
+
+def _constant(node: exp.Expression) -> bool:
+    return not node.find(exp.Column)
+
+
+def column_usage(query: str, snapshot: CatalogSnapshot) -> Dict[str, ColumnUsage]:
+    """
+    Collect the filter, join and sort columns of every table reference of a SELECT.
+
+    Args:
+        query (str): SELECT statement
+        snapshot (CatalogSnapshot): Schema snapshot used to resolve tables and unqualified columns
+
+    Returns:
+        Dict[str, ColumnUsage]: Usage per table alias (or name, if not aliased), empty if the query cannot be parsed
+    """
+    try:
+        statement = sqlglot.parse_one(query, read=DIALECT)
+        scopes = traverse_scope(statement)
+    except SqlglotError:
+        return {}
+    tables = {name.lower(): table for name, table in snapshot.tables.items()}
+
+    usage: Dict[str, ColumnUsage] = {}
+    for scope in scopes:
+        aliases: Dict[str, ColumnUsage] = {}
+        for alias, source in scope.sources.items():
+            table = tables.get(source.name.lower()) if isinstance(source, exp.Table) else None
+            if table is not None:
+                aliases[alias] = usage.setdefault(alias, ColumnUsage(table))
+
+        def resolve(column: exp.Column) -> Optional[Tuple[ColumnUsage, str]]:
+            if column.table:
+                entry = aliases.get(column.table)
+                return (entry, column.name) if entry else None
+            owners = [entry for entry in aliases.values()
+                      if column.name.lower() in (name.lower() for name in entry.table.column_names)]
+            return (owners[0], column.name) if len(owners) == 1 else None
+
+        conditions = [scope.expression.args.get("where")]
+        conditions += [join.args.get("on") for join in scope.expression.args.get("joins") or []]
+        for condition in filter(None, conditions):
+            for predicate in condition.find_all(exp.EQ, exp.In, exp.Like, *RANGE_PREDICATES):
+                left = predicate.this
+                right = predicate.expression if not isinstance(predicate, exp.In) else None
+                if isinstance(predicate, exp.EQ) and isinstance(right, exp.Column) and isinstance(left, exp.Column):
+                    for side in (left, right):
+                        resolved = resolve(side)
+                        if resolved:
+                            _add(resolved[0].joins, resolved[1])
+                    continue
+                if isinstance(right, exp.Column) and not isinstance(left, exp.Column):
+                    left, right = right, left
+                if not isinstance(left, exp.Column) or (right is not None and not _constant(right)):
+                    continue
+                resolved = resolve(left)
+                if not resolved:
+                    continue
+                entry, name = resolved
+                if isinstance(predicate, (exp.EQ, exp.In)):
+                    _add(entry.equalities, name)
+                elif isinstance(predicate, exp.Like):
+                    # Only a fixed prefix can use an index.
+                    if isinstance(right, exp.Literal) and right.is_string and not right.this.startswith(("%", "_")):
+                        _add(entry.ranges, name)
+                else:
+                    _add(entry.ranges, name)
+
+        for clause in ("order", "group"):
+            node = scope.expression.args.get(clause)
+            for column in node.find_all(exp.Column) if node else []:
+                resolved = resolve(column)
+                if resolved:
+                    _add(resolved[0].order, resolved[1])
+    return usage
+
+
+def _parents(steps: List[PlanStep]) -> List[Optional[int]]:
+    parents: List[Optional[int]] = []
+    for i, step in enumerate(steps):
+        parent = next((j for j in range(i - 1, -1, -1) if steps[j].depth < step.depth), None)
+        parents.append(parent)
+    return parents
+
+
+def _is_inner(steps: List[PlanStep], parents: List[Optional[int]], i: int) -> bool:
+    """True if the step runs inside a join loop, i.e. it or one of its ancestors has an earlier sibling."""
+    node: Optional[int] = i
+    while node is not None:
+        if any(parents[j] == parents[node] for j in range(node)):
+            return True
+        node = parents[node]
+    return False
+
+
+def suggest_indexes(query: str, plan: QueryPlan, snapshot: CatalogSnapshot) -> List[IndexSuggestion]:
+    """
+    Suggest indexes for the tables a plan reads in full, from the query's predicates and the
+    indexes in the catalog.
+
+    A scanned table filtered on constants gets an index on its equality columns followed by one
+    range column. A scanned table inside a join loop gets an index on its join columns. Without
+    filters, a table whose rows are sorted without an index gets an index on the ORDER BY columns.
+
+    Args:
+        query (str): SELECT statement
+        plan (QueryPlan): Plan of the statement
+        snapshot (CatalogSnapshot): Schema snapshot with the existing indexes
+
+    Returns:
+        List[IndexSuggestion]: At most one suggestion per table reference
+    """
+    return _suggest(plan, column_usage(query, snapshot))
+
+
+def _suggest(plan: QueryPlan, usage: Dict[str, ColumnUsage]) -> List[IndexSuggestion]:
+    parents = _parents(plan.steps)
+    sorted_without_index = any(step.filesort for step in plan.steps)
+
+    suggestions: List[IndexSuggestion] = []
+    for i, step in enumerate(plan.steps):
+        entry = usage.get(step.table) if step.table else None
+        if entry is None or step.access_type not in FULL_SCANS:
+            continue
+        inner = _is_inner(plan.steps, parents, i)
+        columns = list(entry.equalities)
+        if inner:
+            columns += [name for name in entry.joins if name not in columns]
+        if entry.ranges and entry.ranges[0] not in columns:
+            columns.append(entry.ranges[0])
+
+        if columns:
+            reason = (f"{step.table} is read in full although it is "
+                      f"{'joined and filtered' if inner and entry.joins else 'filtered'} on {', '.join(columns)}.")
+        elif sorted_without_index and entry.order and not inner:
+            columns = list(entry.order)
+            reason = f"{step.table} is read in full and sorted on {', '.join(columns)}."
+        else:
+            continue
+
+        table = entry.table
+        leading = {index.column.lower(): index.name for index in table.indexes if index.seq == 1}
+        existing = leading.get(columns[0].lower())
+        suggestions.append(IndexSuggestion(table.name, columns, reason, existing_index=existing))
+    return suggestions
+
+
+def _rows(value: float) -> str:
+    return f"{value:,.0f}" if value >= 1 else f"{value:.2g}"
+
+
+def _describe_step(step: PlanStep, usage: Dict[str, ColumnUsage]) -> str:
+    operation = step.operation
+    if len(operation) > MAX_OPERATION_LENGTH:
+        operation = operation[:MAX_OPERATION_LENGTH - 3] + "..."
+    details: List[str] = []
+    if step.access_type:
+        access = ACCESS_LABELS.get(step.access_type, step.access_type)
+        entry = usage.get(step.table) if step.table else None
+        if entry is not None and entry.table.name != step.table:
+            access += f" of {entry.table.name}"
+        details.append(access)
+    if step.key:
+        details.append(f"key {step.key}")
+    if step.estimated_rows is not None:
+        details.append(f"est. {_rows(step.estimated_rows)} rows")
+    if step.actual_rows is not None:
+        details.append(f"actual {_rows(step.actual_rows)} rows x {step.loops} loops")
+    if step.filesort:
+        details.append("filesort")
+    if step.temporary:
+        details.append("temporary")
+    suffix = f" ({', '.join(details)})" if details else ""
+    return f"{'  ' * step.depth}- {operation}{suffix}"
+
+
+def render_plan(query: str, plan: QueryPlan, snapshot: CatalogSnapshot) -> str:
+    """
+    Render a plan as an indented tree with one line per step, followed by markers and index suggestions.
+
+    Args:
+        query (str): SELECT statement the plan belongs to
+        plan (QueryPlan): Plan from the backend
+        snapshot (CatalogSnapshot): Schema snapshot with the existing indexes
+
+    Returns:
+        str: Plan summary in text format
+    """
+    usage = column_usage(query, snapshot)
+    lines: List[str] = [f"Query plan ({'analyzed' if plan.analyzed else 'estimated'}):"]
+    lines += [_describe_step(step, usage) for step in plan.steps]
+
+    if plan.actual_seconds is not None:
+        lines.append(f"Ran in {plan.actual_seconds * 1000:.1f} ms and returned {plan.actual_rows} rows.")
+
+    markers: List[str] = []
+    if any(step.filesort for step in plan.steps):
+        markers.append("filesort (rows are sorted without an index)")
+    if any(step.temporary for step in plan.steps):
+        markers.append("temporary table (for grouping, DISTINCT, UNION or a derived table)")
+    if markers:
+        lines.append("Markers: " + "; ".join(markers))
+
+    misestimated = [step.table or step.operation for step in plan.steps
+                    if step.estimated_rows and step.actual_rows is not None and step.loops
+                    and max(step.estimated_rows, step.actual_rows) > MISESTIMATE_FACTOR * max(min(step.estimated_rows, step.actual_rows), 1)]
+    if misestimated:
+        lines.append(f"Row estimates off by {MISESTIMATE_FACTOR}x or more on: {', '.join(misestimated)}. "
+                     "Statistics may be stale; ANALYZE TABLE refreshes them.")
+
+    suggestions = _suggest(plan, usage)
+    lines.append("Index suggestions:" if suggestions else "Index suggestions: none")
+    lines += [f"- {suggestion}" for suggestion in suggestions]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,278 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+
+from sqlglot.dialects.mysql import MySQL
+
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+DEFAULT_TTL = 600.0
+
+READ_PATTERN = re.compile(r"^\s*\(*\s*(select|with|show|describe|desc|explain)\b", re.IGNORECASE)
+WRITE_PATTERN = re.compile(
+    r"^\s*(insert|update|delete|replace|create|alter|drop|rename|truncate|load|grant|revoke)\b", re.IGNORECASE
+)
+# Results of these depend on more than the query text, so they are never cached.
+VOLATILE_PATTERN = re.compile(
+    r"\b(now|sysdate|curdate|curtime|current_date|current_time|current_timestamp|localtime|localtimestamp|"
+    r"unix_timestamp|utc_date|utc_time|utc_timestamp|rand|uuid|uuid_short|connection_id|last_insert_id|"
+    r"found_rows|row_count|sleep|get_lock)\b",
+    re.IGNORECASE,
+)
+IDENTIFIER_PATTERN = re.compile(r"`((?:[^`]|``)+)`|([A-Za-z_$][\w$]*)")
+WORD_PATTERN = re.compile(r"[A-Za-z_$][\w$]*(\()?")
+# Words that are case-insensitive in MySQL; everything else may name a table, which is case-sensitive on Linux.
+KEYWORDS = frozenset(word.lower() for keyword in MySQL.Tokenizer.KEYWORDS for word in keyword.split())
+
+
+def _is_wordlike(ch: str) -> bool:
+    return ch.isalnum() or ch in "_$@'\"`"
+
+
+def _is_line_comment(query: str, i: int) -> bool:
+    # As in MySQL: "--" starts a comment only before whitespace, a control character or the end, so "5--1" is 6.
+    return query.startswith("--", i) and (i + 2 == len(query) or query[i + 2].isspace() or query[i + 2] < " ")
+
+
+def _fold_keyword(match: "re.Match[str]") -> str:
+    word = match.group(0)
+    # Function names are case-insensitive too: the word right before "(".
+    return word.lower() if match.group(1) or word.lower() in KEYWORDS else word
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Normalize a SQL statement for use as a cache key.
+
+    Comments are removed, whitespace collapses to one space between words and disappears around
+    operators and punctuation, keywords and function names are lower-cased and a trailing semicolon
+    is dropped, so trivially reformatted queries map to the same key. Identifiers keep their case:
+    MySQL table names are case-sensitive on Linux, so `Film` and `film` must not share a result.
+
+    Args:
+        query (str): SQL statement
+
+    Returns:
+        str: Normalized statement
+    """
+    out: List[str] = []
+    i, n = 0, len(query)
+    pending_space = False
+
+    def emit(text: str) -> None:
+        nonlocal pending_space
+        # Whitespace only matters between two word-like tokens, so "a = 1" and "a=1" normalize alike.
+        # "- -" keeps its space so it cannot turn into a comment.
+        if pending_space and out and ((_is_wordlike(out[-1][-1]) and _is_wordlike(text[0]))
+                                      or out[-1][-1] == text[0] == "-"):
+            out.append(" ")
+        pending_space = False
+        out.append(text)
+
+    while i < n:
+        ch = query[i]
+        if ch in "'\"`":
+            j = i + 1
+            while j < n:
+                if query[j] == "\\" and ch != "`":
+                    j += 2
+                    continue
+                if query[j] == ch:
+                    if j + 1 < n and query[j + 1] == ch:
+                        j += 2
+                        continue
+                    break
+                j += 1
+            emit(query[i:j + 1])
+            i = j + 1
+        elif _is_line_comment(query, i) or ch == "#":
+            j = query.find("\n", i)
+            i = n if j == -1 else j + 1
+            pending_space = True
+        elif query.startswith("/*", i):
+            j = query.find("*/", i + 2)
+            i = n if j == -1 else j + 2
+            pending_space = True
+        elif ch.isspace():
+            pending_space = True
+            i += 1
+        else:
+            j = i
+            while j < n and not query[j].isspace() and query[j] not in "'\"`#" \
+                    and not _is_line_comment(query, j) and not query.startswith("/*", j):
+                j += 1
+            emit(WORD_PATTERN.sub(_fold_keyword, query[i:j]))
+            i = j
+
+    normalized = "".join(out).strip()
+    while normalized.endswith(";"):
+        normalized = normalized[:-1].rstrip()
+    return normalized
+
+
+def referenced_tables(normalized_query: str, known_tables: Iterable[str]) -> FrozenSet[str]:
+    """
+    Find the known tables a normalized statement mentions.
+
+    This over-approximates (a column named like a table also matches), which is the safe direction
+    for invalidation.
+
+    Args:
+        normalized_query (str): Output of `normalize_sql`
+        known_tables (Iterable[str]): Table names from the schema catalog
+
+    Returns:
+        FrozenSet[str]: Lower-cased names of the tables referenced by the statement
+    """
+    known = {name.lower() for name in known_tables}
+    found = set()
+    for quoted, bare in IDENTIFIER_PATTERN.findall(normalized_query):
+        name = (quoted.replace("``", "`") if quoted else bare).lower()
+        if name in known:
+            found.add(name)
+    return frozenset(found)
+
+
+def is_cacheable(normalized_query: str) -> bool:
+    """Whether a statement is a read whose result depends only on the data it reads."""
+    return bool(READ_PATTERN.match(normalized_query)) and not VOLATILE_PATTERN.search(normalized_query)
+
+
+def is_write(normalized_query: str) -> bool:
+    """Whether a statement may modify data or schema."""
+    return bool(WRITE_PATTERN.match(normalized_query))
+
+
+@dataclass
+class CacheEntry:
+    result: str
+    tables: FrozenSet[str]
+    size: int
+    expires_at: float
+
+
+class QueryResultCache:
+    """
+    Thread-safe LRU cache of rendered query results keyed by normalized SQL.
+
+    The cache is bounded by the total size of the stored results and every entry has a TTL.
+    Entries are invalidated by table when a write or DDL statement touching that table is seen.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, ttl: float = DEFAULT_TTL) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached result.
+
+        Args:
+            key (str): Normalized SQL
+
+        Returns:
+            Optional[str]: The cached result, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.result
+
+    def put(self, key: str, result: str, tables: Iterable[str], ttl: Optional[float] = None) -> None:
+        """
+        Store a result.
+
+        Args:
+            key (str): Normalized SQL
+            result (str): Rendered query result
+            tables (Iterable[str]): Tables the query reads, used for invalidation
+            ttl (float): Time to live in seconds, defaults to the cache TTL
+        """
+        size = len(key) + len(result.encode())
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CacheEntry(result, frozenset(t.lower() for t in tables), size, time.monotonic() + ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_tables(self, tables: Optional[Iterable[str]] = None) -> int:
+        """
+        Drop all entries that read any of the given tables.
+
+        Args:
+            tables (Iterable[str]): Table names, or None to drop every entry
+
+        Returns:
+            int: Number of entries dropped
+        """
+        with self._lock:
+            if tables is None:
+                keys = list(self._entries)
+            else:
+                touched = {t.lower() for t in tables}
+                keys = [key for key, entry in self._entries.items() if entry.tables & touched]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Counters for sizing the cache.
+
+        Returns:
+            Dict[str, Any]: Hits, misses, hit rate, evictions, invalidations and current size
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+query_cache = QueryResultCache()
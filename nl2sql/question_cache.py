@@ -0,0 +1,289 @@
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from nl2sql.catalog import schema_catalog
+from nl2sql.schema_index import EmbeddingFunction, tokenize
+from nl2sql.validation import validate_sql
+
+DEFAULT_MAX_ENTRIES = 1000
+# Cosine similarity above which a cached question is taken as the same question.
+DEFAULT_HIT_THRESHOLD = 0.9
+# Cosine similarity above which a cached question is still a useful few-shot example.
+DEFAULT_EXAMPLE_THRESHOLD = 0.6
+DEFAULT_EXAMPLES = 3
+HASH_DIMENSIONS = 1024
+FILE_VERSION = 1
+
+# Numbers, quoted strings and capitalized words after the first one ("Canada", "May"); a question that
+# differs in one of them asks for different rows, so it is never answered from the cache directly.
+LITERAL_PATTERN = re.compile(r"\d+(?:\.\d+)?|'[^']*'|\"[^\"]*\"|(?<=\s)[A-Z][\w-]*")
+# Outputs of run_sql_query that mean the statement did not produce a result.
+FAILED_OUTPUTS = ("Error", "Query rejected", "Query throttled", "Database connection error")
+
+
+def hashed_embedding(texts: List[str]) -> List[List[float]]:
+    """
+    Embed texts as hashed bags of stemmed words and their character trigrams.
+
+    Needs no model: paraphrases that share most words land close together. Pass a sentence
+    embedding model to `QuestionCache` for questions that share meaning but not words.
+    """
+    vectors: List[List[float]] = []
+    for text in texts:
+        vector = [0.0] * HASH_DIMENSIONS
+        for word in tokenize(text):
+            vector[zlib.crc32(word.encode()) % HASH_DIMENSIONS] += 1.0
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                vector[zlib.crc32(padded[i:i + 3].encode()) % HASH_DIMENSIONS] += 0.5
+        vectors.append(vector)
+    return vectors
+
+
+def question_literals(question: str) -> frozenset:
+    return frozenset(match.strip("'\"").lower() for match in LITERAL_PATTERN.findall(question))
+
+
+@dataclass
+class CachedQuestion:
+    question: str
+    sql: str
+    schema_version: str
+    created_at: float
+    last_used: float
+    hits: int = 0
+
+
+@dataclass
+class QuestionMatch:
+    entry: CachedQuestion
+    similarity: float
+    is_hit: bool  # similar enough, and with the same literals, to reuse the SQL as is
+
+
+class QuestionCache:
+    """
+    Thread-safe semantic cache of natural-language questions and the validated SQL that answered them.
+
+    Questions are compared by cosine similarity of their embeddings. Only entries recorded on the
+    current schema version, the fingerprint of the schema catalog, are matched. The cache keeps the
+    `max_entries` most recently used entries, evicting entries of other schema versions first, and is
+    saved to `path` as JSON after every change when a path is given. Embeddings are not saved; they
+    are recomputed on load, so changing the embedding function never mixes vector spaces.
+    """
+
+    def __init__(self, path: Optional[str] = None, embed: Optional[EmbeddingFunction] = None,
+                 hit_threshold: float = DEFAULT_HIT_THRESHOLD,
+                 example_threshold: float = DEFAULT_EXAMPLE_THRESHOLD,
+                 max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.path = path
+        self.embed = embed or hashed_embedding
+        self.hit_threshold = hit_threshold
+        self.example_threshold = example_threshold
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedQuestion]" = OrderedDict()
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.examples_served = 0
+        self.misses = 0
+        self.evictions = 0
+        if path and os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def _key(question: str) -> str:
+        return " ".join(question.lower().split())
+
+    def _embed(self, texts: List[str]) -> List[np.ndarray]:
+        vectors = []
+        for vector in self.embed(texts):
+            array = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(array)
+            vectors.append(array / norm if norm else array)
+        return vectors
+
+    @staticmethod
+    def _schema_version() -> Optional[str]:
+        snapshot = schema_catalog.snapshot()
+        return snapshot.fingerprint if snapshot else None
+
+    def _candidates(self, question: str, schema_version: str) -> List[QuestionMatch]:
+        keys = [key for key, entry in self._entries.items() if entry.schema_version == schema_version]
+        if not keys:
+            return []
+        query = self._embed([question])[0]
+        similarities = np.stack([self._vectors[key] for key in keys]) @ query
+        literals = question_literals(question)
+        matches = []
+        for key, similarity in zip(keys, similarities.tolist()):
+            if similarity < self.example_threshold:
+                continue
+            entry = self._entries[key]
+            is_hit = similarity >= self.hit_threshold and question_literals(entry.question) == literals
+            matches.append(QuestionMatch(entry, similarity, is_hit))
+        matches.sort(key=lambda match: -match.similarity)
+        return matches
+
+    def lookup(self, question: str) -> Optional[QuestionMatch]:
+        """
+        Find the cached question closest to a new one.
+
+        Args:
+            question (str): Natural-language question
+
+        Returns:
+            Optional[QuestionMatch]: The closest entry above the example threshold, or None. Its SQL can be
+            run directly if `is_hit` is set, and otherwise serves as a few-shot example.
+        """
+        schema_version = self._schema_version()
+        with self._lock:
+            matches = self._candidates(question, schema_version) if schema_version else []
+            if not matches:
+                self.misses += 1
+                return None
+            best = matches[0]
+            key = self._key(best.entry.question)
+            self._entries.move_to_end(key)
+            best.entry.last_used = time.time()
+            if best.is_hit:
+                best.entry.hits += 1
+                self.hits += 1
+            else:
+                self.examples_served += 1
+        return best
+
+    def examples(self, question: str, k: int = DEFAULT_EXAMPLES) -> List[QuestionMatch]:
+        """
+        Get up to k cached questions similar to a new one, most similar first, for few-shot prompting.
+
+        Args:
+            question (str): Natural-language question
+            k (int): Maximum number of examples
+
+        Returns:
+            List[QuestionMatch]: Entries above the example threshold
+        """
+        schema_version = self._schema_version()
+        with self._lock:
+            return self._candidates(question, schema_version)[:k] if schema_version else []
+
+    def remember(self, question: str, sql: str) -> bool:
+        """
+        Store a question with the SQL that answered it, if the SQL validates against the current schema.
+
+        Args:
+            question (str): Natural-language question
+            sql (str): Final SQL query
+
+        Returns:
+            bool: True if the entry was stored
+        """
+        snapshot = schema_catalog.snapshot()
+        if snapshot is None or not sql or validate_sql(sql, snapshot):
+            return False
+        vector = self._embed([question])[0]
+        now = time.time()
+        key = self._key(question)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = CachedQuestion(question, sql, snapshot.fingerprint, created_at=now, last_used=now)
+            self._vectors[key] = vector
+            self._evict(snapshot.fingerprint)
+            self._save()
+        return True
+
+    def _evict(self, schema_version: str) -> None:
+        while len(self._entries) > self.max_entries:
+            stale = next((key for key, entry in self._entries.items() if entry.schema_version != schema_version), None)
+            key = stale if stale is not None else next(iter(self._entries))
+            del self._entries[key]
+            del self._vectors[key]
+            self.evictions += 1
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        payload = {"version": FILE_VERSION, "entries": [vars(entry) for entry in self._entries.values()]}
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=1)
+        os.replace(temporary, self.path)
+
+    def load(self) -> None:
+        """Replace the entries with the ones saved at `path`, least recently used first."""
+        with open(self.path, encoding="utf-8") as f:
+            payload = json.load(f)
+        if payload.get("version") != FILE_VERSION:
+            return
+        entries = sorted((CachedQuestion(**entry) for entry in payload.get("entries", [])),
+                         key=lambda entry: entry.last_used)
+        vectors = self._embed([entry.question for entry in entries]) if entries else []
+        with self._lock:
+            self._entries = OrderedDict((self._key(entry.question), entry) for entry in entries)
+            self._vectors = {self._key(entry.question): vector for entry, vector in zip(entries, vectors)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+            self._save()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of the cache."""
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "examples_served": self.examples_served,
+                    "misses": self.misses, "evictions": self.evictions}
+
+
+def format_examples(matches: Iterable[QuestionMatch]) -> str:
+    """
+    Render cached questions and their SQL as few-shot examples for the agent prompt.
+
+    Args:
+        matches (Iterable[QuestionMatch]): Matches from `QuestionCache.examples`
+
+    Returns:
+        str: The examples, empty if there are none
+    """
+    blocks = [f"Question: {match.entry.question}\nSQL: {match.entry.sql}" for match in matches]
+    if not blocks:
+        return ""
+    return "Similar questions answered before, with the SQL that answered them:\n\n" + "\n\n".join(blocks) + "\n"
+
+
+def final_sql(sources: Sequence[Any]) -> Optional[str]:
+    """
+    Find the last query an agent ran successfully with run_sql_query.
+
+    Args:
+        sources (Sequence[Any]): Tool outputs of an agent response (`response.sources` in llama-index),
+            with `tool_name`, `raw_input` and `content` attributes
+
+    Returns:
+        Optional[str]: The SQL query, or None if no query succeeded
+    """
+    for source in reversed(sources):
+        if getattr(source, "tool_name", None) != "run_sql_query":
+            continue
+        if str(getattr(source, "content", "")).startswith(FAILED_OUTPUTS):
+            continue
+        raw_input = getattr(source, "raw_input", None) or {}
+        kwargs = raw_input.get("kwargs", raw_input)
+        query = kwargs.get("query") if isinstance(kwargs, dict) else None
+        if not query and raw_input.get("args"):
+            query = raw_input["args"][0]
+        if query:
+            return query
+    return None
@@ -0,0 +1,127 @@
+import base64
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+DEFAULT_MAX_ROWS = 50
+DEFAULT_MAX_BYTES = 16_000
+FETCH_BATCH_SIZE = 500
+COLUMN_SEPARATOR = " | "
+
+
+def format_value(value: Any) -> str:
+    """Render a single cell compactly, keeping every row on one line."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, (bytes, bytearray)):
+        return f"<{len(value)} bytes>"
+    return str(value).replace("\n", " ").replace(COLUMN_SEPARATOR, " / ")
+
+
+def render_result(column_names: Sequence[str], rows: Iterable[Sequence[Any]],
+                  max_rows: int = DEFAULT_MAX_ROWS, max_bytes: int = DEFAULT_MAX_BYTES,
+                  row_limit: Optional[int] = None) -> str:
+    """
+    Render a result set as compact columnar text: the header once, then one line of values per row.
+
+    Rows beyond the row or byte budget are counted but not rendered, and a footer reports the total.
+
+    Args:
+        column_names (Sequence[str]): Names of the result columns
+        rows (Iterable[Sequence[Any]]): Row tuples, consumed lazily
+        max_rows (int): Maximum number of rows to render
+        max_bytes (int): Maximum size of the rendered text in bytes (UTF-8)
+        row_limit (Optional[int]): LIMIT added to the query by the caller; a result that reaches it
+            is reported as at least that many rows, since the full result may be larger
+
+    Returns:
+        str: Query results in text format
+    """
+    header = COLUMN_SEPARATOR.join(column_names)
+    lines: List[str] = ["Query Results:", header]
+    used_bytes = len(lines[0]) + len(header.encode()) + 2
+    shown = 0
+    total = 0
+    truncated_by_bytes = False
+
+    for row in rows:
+        total += 1
+        if shown >= max_rows or truncated_by_bytes:
+            continue
+        line = COLUMN_SEPARATOR.join(format_value(value) for value in row)
+        line_bytes = len(line.encode()) + 1
+        if used_bytes + line_bytes > max_bytes:
+            truncated_by_bytes = True
+            continue
+        lines.append(line)
+        used_bytes += line_bytes
+        shown += 1
+
+    if total == 0:
+        return "Query executed successfully, but returned no results."
+
+    total_text = f"at least {total}" if row_limit is not None and total >= row_limit else str(total)
+    if shown < total:
+        reason = "byte" if truncated_by_bytes else "row"
+        lines.append(f"... truncated by {reason} budget: showing {shown} of {total_text} rows. "
+                     "Add a LIMIT, filters or aggregation to see the rest.")
+    else:
+        lines.append(f"({total_text} rows)")
+    return "\n".join(lines) + "\n"
+
+
+def format_bytes(size: Optional[int]) -> str:
+    """Render a byte count with a binary unit."""
+    if size is None:
+        return "unknown"
+    value = float(size)
+    if value < 1024:
+        return f"{size} B"
+    for unit in ("KiB", "MiB", "GiB"):
+        value /= 1024
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+    value /= 1024
+    return f"{value:.1f} TiB"
+
+
+def _histogram_value(value: Any) -> str:
+    # MySQL encodes string bucket values as "base64:type<N>:<payload>".
+    if isinstance(value, str) and value.startswith("base64:type"):
+        try:
+            return base64.b64decode(value.split(":", 2)[2]).decode(errors="replace")
+        except (ValueError, IndexError):
+            return value
+    return str(value)
+
+
+def summarize_histogram(histogram: Dict[str, Any], top_n: int = 5) -> str:
+    """
+    Summarize a MySQL column histogram (INFORMATION_SCHEMA.COLUMN_STATISTICS) in one line.
+
+    Args:
+        histogram (Dict[str, Any]): Decoded HISTOGRAM JSON document
+        top_n (int): Number of most frequent values to list for singleton histograms
+
+    Returns:
+        str: Most frequent values with their share for singleton histograms, otherwise value range and distinct count
+    """
+    buckets = histogram.get("buckets") or []
+    null_share = histogram.get("null-values") or 0.0
+    parts: List[str] = []
+    if histogram.get("histogram-type") == "singleton":
+        previous = 0.0
+        frequencies = []
+        for value, cumulative in buckets:
+            frequencies.append((cumulative - previous, _histogram_value(value)))
+            previous = cumulative
+        frequencies.sort(reverse=True)
+        parts.append(", ".join(f"{value} {share:.0%}" for share, value in frequencies[:top_n]))
+        if len(frequencies) > top_n:
+            parts.append(f"{len(frequencies)} distinct values")
+    elif buckets:
+        distinct = sum(bucket[3] for bucket in buckets if len(bucket) > 3)
+        parts.append(f"range {_histogram_value(buckets[0][0])} .. {_histogram_value(buckets[-1][1])}")
+        if distinct:
+            parts.append(f"~{distinct} distinct values")
+    if null_share:
+        parts.append(f"NULL {null_share:.0%}")
+    return "; ".join(parts)
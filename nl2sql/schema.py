@@ -0,0 +1,64 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass
+class ColumnInfo:
+    name: str
+    type: str
+    nullable: bool
+    key: str
+    default: Any
+    extra: str
+
+
+@dataclass
+class IndexInfo:
+    name: str
+    column: str
+    seq: int
+    non_unique: bool
+    cardinality: Optional[int]
+
+
+@dataclass
+class ForeignKey:
+    table: str
+    column: str
+    referenced_table: str
+    referenced_column: str
+
+
+@dataclass
+class TableInfo:
+    name: str
+    type: str
+    engine: Optional[str]
+    row_estimate: Optional[int]
+    data_length: Optional[int]
+    index_length: Optional[int]
+    columns: List[ColumnInfo] = field(default_factory=list)
+    indexes: List[IndexInfo] = field(default_factory=list)
+    histograms: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    @property
+    def column_names(self) -> List[str]:
+        return [col.name for col in self.columns]
+
+
+@dataclass
+class SchemaFingerprint:
+    schema: str  # changes on DDL
+    data: str  # changes on writes
+    # Per table (row estimate, data size, index size), refreshed on every revalidation.
+    sizes: Dict[str, Tuple[Optional[int], Optional[int], Optional[int]]] = field(default_factory=dict)
+
+
+def quote_identifier(name: str) -> str:
+    """Quote an identifier with backticks (understood by MySQL and SQLite)."""
+    return "`" + name.replace("`", "``") + "`"
+
+
+def quote_literal(value: str) -> str:
+    """Quote a string as a MySQL literal."""
+    return "'" + value.replace("\\", "\\\\").replace("'", "''") + "'"
@@ -0,0 +1,251 @@
+import math
+import re
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from nl2sql.catalog import CatalogSnapshot, schema_catalog
+
+DEFAULT_TOP_K = 5
+# Tables allowed between two relevant tables on the foreign-key path that connects them.
+MAX_BRIDGE_TABLES = 2
+
+# Term weights by where a word occurs: a question about "films" is mostly about the film table.
+TABLE_WEIGHT = 4
+COLUMN_WEIGHT = 2
+RELATION_WEIGHT = 1
+VALUE_WEIGHT = 1
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Share of the dense (embedding) score in the fused score when an embedding function is set.
+DEFAULT_DENSE_WEIGHT = 0.5
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a about all an and any are as at be by did do does each every for from get give had has have how i in "
+    "into is it its list me most my of on or per show than that the their them there these they this those "
+    "to was were what when where which who whom whose with".split()
+)
+
+EmbeddingFunction = Callable[[List[str]], Sequence[Sequence[float]]]
+
+
+def _stem(word: str) -> str:
+    """Strip common English suffixes so "rented", "rentals" and "rental" share a term."""
+    if len(word) > 4 and word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif len(word) > 3 and word.endswith("es") and word[-3] in "sxz":
+        word = word[:-2]
+    elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+    for suffix in ("ing", "ed", "al"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case words of a question or identifier, split on underscores and stemmed, without stopwords."""
+    return [_stem(word) for word in WORD_PATTERN.findall(text.lower().replace("_", " ")) if word not in STOPWORDS]
+
+
+@dataclass
+class TableDocument:
+    name: str
+    terms: Counter = field(default_factory=Counter)
+    text: str = ""  # plain-text description, embedded when an embedding function is set
+
+
+class BM25:
+    """Okapi BM25 over bags of weighted terms."""
+
+    def __init__(self, documents: Dict[str, Counter], k1: float = BM25_K1, b: float = BM25_B) -> None:
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.lengths = {name: sum(terms.values()) for name, terms in documents.items()}
+        self.average_length = sum(self.lengths.values()) / max(len(documents), 1)
+        frequencies: Counter = Counter()
+        for terms in documents.values():
+            frequencies.update(terms.keys())
+        count = len(documents)
+        self.idf = {term: math.log(1 + (count - df + 0.5) / (df + 0.5)) for term, df in frequencies.items()}
+
+    def scores(self, query_terms: List[str]) -> Dict[str, float]:
+        scores: Dict[str, float] = {}
+        for name, terms in self.documents.items():
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[name] / (self.average_length or 1))
+            score = 0.0
+            for term in set(query_terms):
+                tf = terms.get(term, 0)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            scores[name] = score
+        return scores
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class SchemaIndex:
+    """
+    Retrieval index over the tables of the connected database, built from the schema catalog.
+
+    Every table is a document made of its name, its column names, the tables it shares a foreign
+    key with and the string values of its sample rows. Questions are ranked against it with BM25
+    and, if an embedding function is set, with cosine similarity of embeddings, the two scores
+    fused after scaling each to [0, 1]. The index is rebuilt when the catalog generation changes.
+    """
+
+    def __init__(self, embed: Optional[EmbeddingFunction] = None, dense_weight: float = DEFAULT_DENSE_WEIGHT,
+                 use_sample_values: bool = True, include_views: bool = False) -> None:
+        self.embed = embed
+        self.dense_weight = dense_weight
+        self.use_sample_values = use_sample_values
+        # Views repeat the columns of the tables they join and would crowd those tables out of the top-k.
+        self.include_views = include_views
+        self._lock = threading.Lock()
+        self._key: Optional[Tuple[int, str]] = None
+        self._bm25: Optional[BM25] = None
+        self._embeddings: Dict[str, Sequence[float]] = {}
+        self._neighbours: Dict[str, List[str]] = {}
+
+    def set_embedding_function(self, embed: Optional[EmbeddingFunction]) -> None:
+        """Enable dense retrieval with a function mapping texts to vectors, or disable it with None."""
+        with self._lock:
+            self.embed = embed
+            self._key = None
+
+    def _documents(self, snapshot: CatalogSnapshot) -> Dict[str, TableDocument]:
+        tables = {name: table for name, table in snapshot.tables.items()
+                  if self.include_views or table.type != "VIEW"}
+        # A foreign-key column such as rental.customer_id only says what the table relates to.
+        references = {(fk.table, fk.column) for fk in snapshot.foreign_keys}
+        documents = {name: TableDocument(name) for name in tables}
+        for name, table in tables.items():
+            document = documents[name]
+            for term in tokenize(name):
+                document.terms[term] += TABLE_WEIGHT
+            for column in table.column_names:
+                if (name, column) in references:
+                    continue
+                for term in tokenize(column):
+                    document.terms[term] += COLUMN_WEIGHT
+            document.text = f"table {name} with columns {', '.join(table.column_names)}"
+
+        for fk in snapshot.foreign_keys:
+            if fk.table in documents and fk.referenced_table in documents:
+                for own, other in ((fk.table, fk.referenced_table), (fk.referenced_table, fk.table)):
+                    for term in tokenize(other):
+                        documents[own].terms[term] += RELATION_WEIGHT
+
+        if self.use_sample_values:
+            samples = schema_catalog.sample_rows_many(list(tables))
+            for name, rows in samples.items():
+                for row in rows:
+                    for value in row.values():
+                        if isinstance(value, str):
+                            for term in tokenize(value):
+                                documents[name].terms[term] += VALUE_WEIGHT
+        return documents
+
+    def _ensure_built(self) -> Optional[CatalogSnapshot]:
+        snapshot = schema_catalog.snapshot()
+        if snapshot is None:
+            return None
+        key = (snapshot.generation, snapshot.fingerprint)
+        with self._lock:
+            if self._key != key:
+                documents = self._documents(snapshot)
+                self._bm25 = BM25({name: document.terms for name, document in documents.items()})
+                self._embeddings = {}
+                if self.embed is not None:
+                    names = list(documents)
+                    vectors = self.embed([documents[name].text for name in names])
+                    self._embeddings = dict(zip(names, vectors))
+                neighbours: Dict[str, List[str]] = {name: [] for name in snapshot.tables}
+                for fk in snapshot.foreign_keys:
+                    if fk.table in neighbours and fk.referenced_table in neighbours and fk.table != fk.referenced_table:
+                        neighbours[fk.table].append(fk.referenced_table)
+                        neighbours[fk.referenced_table].append(fk.table)
+                self._neighbours = {name: sorted(set(tables)) for name, tables in neighbours.items()}
+                self._key = key
+        return snapshot
+
+    def rank(self, question: str) -> List[Tuple[str, float]]:
+        """
+        Score every table against a question.
+
+        Args:
+            question (str): Natural-language question
+
+        Returns:
+            List[Tuple[str, float]]: Table names with a score in [0, 1], best first, tables scoring 0 left out
+        """
+        if self._ensure_built() is None:
+            return []
+        scores = self._bm25.scores(tokenize(question))
+        best = max(scores.values(), default=0.0)
+        fused = {name: score / best if best else 0.0 for name, score in scores.items()}
+
+        if self._embeddings:
+            query_vector = self.embed([question])[0]
+            similarities = {name: _cosine(query_vector, vector) for name, vector in self._embeddings.items()}
+            top = max(similarities.values(), default=0.0)
+            for name, similarity in similarities.items():
+                dense = max(similarity, 0.0) / top if top > 0 else 0.0
+                fused[name] = (1 - self.dense_weight) * fused.get(name, 0.0) + self.dense_weight * dense
+
+        ranked = sorted(((name, score) for name, score in fused.items() if score > 0), key=lambda item: -item[1])
+        return ranked
+
+    def _path(self, start: str, goal: str, scores: Dict[str, float]) -> Optional[List[str]]:
+        """Shortest foreign-key path between two tables, preferring higher-scoring tables on ties."""
+        previous: Dict[str, Optional[str]] = {start: None}
+        queue = deque([(start, 0)])
+        while queue:
+            table, hops = queue.popleft()
+            if table == goal:
+                path = [table]
+                while previous[path[-1]] is not None:
+                    path.append(previous[path[-1]])
+                return path[::-1]
+            if hops > MAX_BRIDGE_TABLES:
+                continue
+            for neighbour in sorted(self._neighbours.get(table, []), key=lambda name: -scores.get(name, 0.0)):
+                if neighbour not in previous:
+                    previous[neighbour] = table
+                    queue.append((neighbour, hops + 1))
+        return None
+
+    def relevant_tables(self, question: str, top_k: int = DEFAULT_TOP_K) -> Tuple[List[str], List[str]]:
+        """
+        Find the tables relevant to a question and the tables needed to join them.
+
+        Args:
+            question (str): Natural-language question
+            top_k (int): Number of tables to retrieve before the foreign-key expansion
+
+        Returns:
+            Tuple[List[str], List[str]]: The top-k tables, best first, and the tables on the foreign-key
+            paths that connect them
+        """
+        ranked = self.rank(question)
+        scores = dict(ranked)
+        tables = [name for name, _ in ranked[:top_k]]
+        bridges: List[str] = []
+        for i, start in enumerate(tables):
+            for goal in tables[i + 1:]:
+                path = self._path(start, goal, scores) or []
+                for name in path[1:-1]:
+                    if name not in tables and name not in bridges:
+                        bridges.append(name)
+        return tables, bridges
+
+
+schema_index = SchemaIndex()
@@ -1,23 +1,42 @@
+import asyncio
 import unittest
+from unittest import mock
 from dotenv import load_dotenv
-from nl2sql import initialize_db_connection, close_db_connection
+from concurrent.futures import ThreadPoolExecutor
+from nl2sql import initialize_db_connection, initialize_sqlite_connection, close_db_connection, get_pool_metrics
 from nl2sql.tools import (
     list_tables,
     get_table_schema_and_sample,
+    describe_tables,
+    find_relevant_tables,
     validate_sql_query,
+    check_sql_query,
+    explain_sql_query,
     run_sql_query,
     get_table_relationships,
     get_table_statistics,
 )
+from nl2sql import async_tools
+from nl2sql.catalog import schema_catalog
+from nl2sql.backends import QueryCost
+from nl2sql.guardrails import guard_query, guardrail_config
+from nl2sql.question_cache import QuestionCache
+from nl2sql.query_cache import query_cache, normalize_sql
+from nl2sql.tracing import tracer
+from nl2sql.backends.sakila import ensure_database, snapshot_key
 import os
+import tempfile
 
 load_dotenv()
 
 class TestDatabaseUtils(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
-        # Initialize database connection
-        initialize_db_connection('localhost', 'root', os.environ.get("DB_Password"), 'sakila')
+        # Initialize database connection: the embedded SQLite copy of sakila unless NL2SQL_BACKEND=mysql
+        if os.environ.get("NL2SQL_BACKEND", "sqlite") == "mysql":
+            initialize_db_connection('localhost', 'root', os.environ.get("DB_Password"), 'sakila')
+        else:
+            initialize_sqlite_connection()
 
     @classmethod
     def tearDownClass(cls):
@@ -46,12 +65,63 @@ class TestDatabaseUtils(unittest.TestCase):
         self.assertIn('title', result)
         self.assertIn('Sample Data:', result)
 
+    def test_describe_tables(self):
+        result = describe_tables(['film', 'film_actor', 'actor', 'non_existent_table'])
+        self.assertIn('Table: film\n', result)
+        self.assertIn('Table: actor\n', result)
+        self.assertIn('film_actor.actor_id -> actor.actor_id', result)
+        self.assertIn('film_actor.film_id -> film.film_id', result)
+        self.assertIn('Unknown tables: non_existent_table', result)
+
+    def test_find_relevant_tables_expands_along_foreign_keys(self):
+        result = find_relevant_tables("Find the names of customers who rented more than 5 films in May 2005")
+        top = result.split("\n\n")[0]
+        self.assertIn('customer(', top)
+        self.assertIn('rental(', top)
+        self.assertIn('Tables joining them:\ninventory(', result)
+        self.assertIn('rental.customer_id -> customer.customer_id', result)
+        self.assertIn('No table matches', find_relevant_tables("xyzzy"))
+
     def test_validate_sql_query(self):
         valid_query = "SELECT * FROM film LIMIT 5"
         invalid_query = "SELECT * FROM non_existent_table"
         self.assertTrue(validate_sql_query(valid_query))
         self.assertFalse(validate_sql_query(invalid_query))
 
+    def test_check_sql_query_reports_precise_errors(self):
+        self.assertEqual(check_sql_query("SELECT f.title FROM film f LIMIT 5"), "Query is valid.")
+        self.assertIn("Unknown column 'titel' in table 'film'", check_sql_query("SELECT f.titel FROM film f"))
+        self.assertIn("ambiguous", check_sql_query("SELECT film_id FROM film JOIN inventory ON film.film_id = inventory.film_id"))
+        self.assertIn("Unknown table 'non_existent_table'", check_sql_query("SELECT * FROM non_existent_table"))
+        self.assertIn("Unknown column 'titel'", check_sql_query("SELECT titel FROM film"))
+        self.assertEqual(check_sql_query("SELECT rating AS r, COUNT(*) FROM film GROUP BY r"), "Query is valid.")
+        self.assertIn("Syntax error at line 1, column 5: 'SELEC' does not start a statement. Did you mean: select?",
+                      check_sql_query("SELEC * FRM film"))
+        self.assertIn("Syntax error at line 2, column 5: 'SELEC'", check_sql_query("SELECT 1;\nSELEC * FRM film"))
+        self.assertIn("Syntax error at line 1, column 17", check_sql_query("SELECT * FRM film"))
+
+    def test_question_cache_answers_repeat_questions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "questions.json")
+            cache = QuestionCache(path=path)
+            sql = ("SELECT c.first_name, c.last_name FROM customer c JOIN rental r ON c.customer_id = r.customer_id "
+                   "WHERE MONTH(r.rental_date) = 5 AND YEAR(r.rental_date) = 2005 "
+                   "GROUP BY c.customer_id HAVING COUNT(r.rental_id) > 5")
+            self.assertTrue(cache.remember("Find the names of customers who rented more than 5 films in May 2005", sql))
+            self.assertFalse(cache.remember("Show the nope", "SELECT nope FROM customer"))
+
+            reloaded = QuestionCache(path=path)
+            hit = reloaded.lookup("What are the names of the customers who rented more than 5 films in May 2005?")
+            self.assertTrue(hit.is_hit)
+            self.assertEqual(hit.entry.sql, sql)
+            # A different literal asks for different rows, so the entry is only offered as an example.
+            self.assertFalse(reloaded.lookup("Find the names of customers who rented more than 10 films in May 2005").is_hit)
+            self.assertIsNone(reloaded.lookup("Which actor appeared in the most films?"))
+
+            reloaded.max_entries = 1
+            reloaded.remember("How many films are there?", "SELECT COUNT(*) FROM film")
+            self.assertEqual(reloaded.stats()['entries'], 1)
+
     def test_run_sql_query(self):
         query = "SELECT film_id, title FROM film LIMIT 3"
         result = run_sql_query(query)
@@ -59,6 +129,74 @@ class TestDatabaseUtils(unittest.TestCase):
         self.assertIn('film_id', result)
         self.assertIn('title', result)
 
+    def test_run_sql_query_truncates_large_results(self):
+        result = run_sql_query("SELECT * FROM rental")
+        self.assertIn('rental_id', result)
+        self.assertIn('truncated', result)
+        self.assertIn('of at least 1000 rows', result)
+        self.assertIn('LIMIT 1000 was added', result)
+        self.assertIn('(2 rows)', run_sql_query("SELECT * FROM film_category WHERE film_id = 1 OR film_id = 2"))
+        self.assertLessEqual(len(result.encode()), 16_500)
+
+    def test_run_sql_query_guards_expensive_queries(self):
+        rewritten = run_sql_query("SELECT * FROM rental r1, rental r2")
+        self.assertIn('(at least 50 rows)', rewritten)
+        self.assertIn('full table scans on rental AS r1, rental AS r2', rewritten)
+        rejected = run_sql_query("SELECT COUNT(*) FROM rental r1, rental r2")
+        self.assertTrue(rejected.startswith('Query rejected by guardrail'))
+        self.assertIn('rows examined (budget 5,000,000)', rejected)
+
+    def test_guard_adds_no_limit_after_locking_clause_or_into(self):
+        backend = mock.Mock()
+        backend.estimate_cost.return_value = QueryCost(rows_examined=100)
+        self.assertEqual(guard_query(backend, None, "SELECT * FROM film").query, "SELECT * FROM film\nLIMIT 1000")
+        for query in ("SELECT * FROM film FOR UPDATE", "SELECT * FROM film FOR SHARE",
+                      "SELECT * FROM film LOCK IN SHARE MODE", "SELECT title INTO @title FROM film"):
+            guarded = guard_query(backend, None, query)
+            self.assertEqual((guarded.query, guarded.row_limit, guarded.rejection), (query, None, None))
+
+        # Over budget, such a statement cannot be rewritten with a LIMIT, so it is rejected.
+        backend.estimate_cost.return_value = QueryCost(rows_examined=10_000_000)
+        self.assertEqual(guard_query(backend, None, "SELECT * FROM film").query, "SELECT * FROM film\nLIMIT 50")
+        for query in ("SELECT * FROM film FOR UPDATE", "SELECT title INTO @title FROM film"):
+            guarded = guard_query(backend, None, query)
+            self.assertEqual(guarded.query, query)
+            self.assertTrue(guarded.rejection.startswith("Query rejected by guardrail"))
+
+    def test_run_sql_query_stops_at_time_limit(self):
+        with mock.patch.multiple(guardrail_config, max_execution_time=0.05, max_rows_examined=None):
+            result = run_sql_query("SELECT COUNT(*) FROM rental r1, rental r2 WHERE r1.rental_id < r2.rental_id")
+        self.assertTrue(result.startswith('Query throttled'))
+        self.assertIn('0.05s statement time limit', result)
+
+    def test_run_sql_query_caches_normalized_queries(self):
+        query_cache.clear()
+        first = run_sql_query("SELECT film_id, title FROM film WHERE film_id = 1")
+        second = run_sql_query("select film_id,title\n  from film -- same query\n where film_id=1;")
+        self.assertEqual(first, second)
+        self.assertEqual(query_cache.stats()['hits'], 1)
+        self.assertEqual(normalize_sql("SELECT 'A  b'"), "select 'A  b'")
+        self.assertEqual(normalize_sql("SELECT COUNT(*) FROM Film GROUP BY rating"),
+                         "select count(*)from Film group by rating")
+        self.assertNotEqual(normalize_sql("SELECT * FROM Film"), normalize_sql("SELECT * FROM film"))
+        # "--" without a space after it is two minus signs, not a comment.
+        self.assertEqual(normalize_sql("SELECT 5--1"), "select 5--1")
+        self.assertNotEqual(normalize_sql("SELECT 5--1"), normalize_sql("SELECT 5"))
+        self.assertEqual(normalize_sql("SELECT 5 --\tcomment"), normalize_sql("SELECT 5 --"))
+        self.assertEqual(normalize_sql("SELECT 5 --"), "select 5")
+        self.assertNotEqual(run_sql_query("SELECT 5--1"), run_sql_query("SELECT 5"))
+
+    def test_explain_sql_query_summarizes_plan_and_suggests_indexes(self):
+        result = explain_sql_query("SELECT * FROM customer c JOIN address a ON c.address_id = a.address_id "
+                                   "WHERE c.email = 'MARY.SMITH@sakilacustomer.org'")
+        self.assertIn('full table scan of customer', result)
+        self.assertIn('unique index lookup of address', result)
+        self.assertIn('ON `customer` (`email`)', result)
+        analyzed = explain_sql_query("SELECT title FROM film ORDER BY length", analyze=True)
+        self.assertIn('filesort', analyzed)
+        self.assertIn('returned 1000 rows', analyzed)
+        self.assertEqual(explain_sql_query("DELETE FROM actor"), "Only SELECT queries can be explained.")
+
     def test_get_table_relationships(self):
         result = get_table_relationships()
         self.assertIsInstance(result, str)
@@ -71,6 +209,81 @@ class TestDatabaseUtils(unittest.TestCase):
         self.assertIn('Total rows:', result)
         self.assertIn('Columns:', result)
         self.assertIn('Indexes:', result)
+        self.assertIn('(estimate)', result)
+        self.assertIn('cardinality', result)
+
+    def test_get_table_statistics_exact_count(self):
+        result = get_table_statistics('film', exact_count=True)
+        self.assertIn('Total rows: 1000\n', result)
+
+    def test_concurrent_tool_calls_use_pool(self):
+        # Distinct queries, so none of them is served from the result cache.
+        queries = [f"SELECT COUNT(*) AS rentals FROM rental WHERE customer_id = {i}" for i in range(1, 17)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(run_sql_query, queries))
+        self.assertTrue(all('rentals' in result for result in results))
+        metrics = get_pool_metrics()
+        self.assertEqual(metrics['in_use'], 0)
+        self.assertLessEqual(metrics['open'], metrics['pool_size'])
+        self.assertGreaterEqual(metrics['checkouts'], 16)
+
+    def test_async_tools_overlap(self):
+        async def describe(table_names):
+            return await asyncio.gather(*(async_tools.get_table_schema_and_sample(name) for name in table_names))
+
+        results = asyncio.run(describe(['film', 'actor', 'customer']))
+        self.assertEqual(len(results), 3)
+        self.assertIn('film_id', results[0])
+        self.assertIn('actor_id', results[1])
+        self.assertEqual(async_tools.get_table_schema_and_sample.__doc__, get_table_schema_and_sample.__doc__)
+
+    def test_tracing_session_summarizes_tool_calls(self):
+        query_cache.clear()
+        query = "SELECT rental_id, rental_date FROM rental WHERE customer_id = 5"
+        with tracer.session("test") as session:
+            run_sql_query(query)
+            run_sql_query(query)
+            asyncio.run(async_tools.list_tables())
+        summary = session.summary()
+        run = summary['tools']['run_sql_query']
+        self.assertEqual(run['calls'], 2)
+        self.assertEqual(run['rows'], 38)
+        self.assertEqual(run['counters']['query_cache_hits'], 1)
+        self.assertGreater(run['database_ms'], 0)
+        self.assertGreater(run['bytes'], 0)
+        self.assertEqual(sum(run['histogram'].values()), 2)
+        self.assertEqual(summary['tools']['list_tables']['calls'], 1)
+        self.assertEqual(len(session.spans), 3)
+
+    def test_schema_catalog_serves_repeat_calls_from_memory(self):
+        list_tables()
+        loads = schema_catalog.stats()['loads']
+        get_table_schema_and_sample('film')
+        get_table_relationships()
+        list_tables()
+        self.assertEqual(schema_catalog.stats()['loads'], loads)
+
+        generation = schema_catalog.generation
+        schema_catalog.invalidate()
+        self.assertGreater(schema_catalog.generation, generation)
+        self.assertIn('actor', list_tables())
+        self.assertEqual(schema_catalog.stats()['loads'], loads + 1)
+
+    def test_mysql_dialect_runs_on_every_backend(self):
+        result = run_sql_query("SELECT CONCAT(first_name, ' ', last_name) AS name, YEAR(last_update) AS year "
+                               "FROM actor WHERE actor_id = 1")
+        self.assertIn('PENELOPE GUINESS | 2006', result)
+
+    def test_sakila_snapshot_is_reused_while_dump_is_unchanged(self):
+        path = ensure_database()
+        modified = os.stat(path).st_mtime_ns
+        self.assertEqual(ensure_database(), path)
+        self.assertEqual(os.stat(path).st_mtime_ns, modified)
+        self.assertIn(snapshot_key()[:16], os.path.basename(path))
+
+    def test_unknown_table_is_reported(self):
+        result = get_table_schema_and_sample('non_existent_table')
+        self.assertIn('does not exist', result)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,7 +1,29 @@
+import re
 from typing import List, Dict, Optional, Any, Union
-from mysql.connector import Error, MySQLConnection
-from nl2sql import get_db_connection
+import nl2sql
+from nl2sql import pooled_connection
+from nl2sql.backends import DatabaseError, QueryTimeoutError
+from nl2sql.catalog import TableInfo, schema_catalog, resolve_table
+from nl2sql.guardrails import GuardedQuery, guard_query, throttled_message
+from nl2sql.plan_analysis import render_plan
+from nl2sql.schema_index import schema_index, DEFAULT_TOP_K
+from nl2sql.query_cache import query_cache, normalize_sql, referenced_tables, is_cacheable, is_write
+from nl2sql.rendering import (render_result, format_value, format_bytes, summarize_histogram,
+                              COLUMN_SEPARATOR,
+                              DEFAULT_MAX_ROWS, DEFAULT_MAX_BYTES)
+from nl2sql.tracing import annotate, count, traced
+from nl2sql.validation import ValidationIssue, validate_sql
 
+DDL_PATTERN = re.compile(r"^\s*(CREATE|ALTER|DROP|RENAME|TRUNCATE)\b", re.IGNORECASE)
+
+# Budget for the text handed back to the agent by run_sql_query.
+RESULT_MAX_ROWS = DEFAULT_MAX_ROWS
+RESULT_MAX_BYTES = DEFAULT_MAX_BYTES
+
+# Validation is done offline against the schema catalog; set this to also confirm with a server-side EXPLAIN.
+VALIDATE_WITH_EXPLAIN = False
+
+@traced
 def list_tables() -> List[str]:
     """
     List all available tables in the database.
@@ -9,17 +31,9 @@ def list_tables() -> List[str]:
     Returns:
         List[str]: List of table names
     """
-    conn: Optional[MySQLConnection] = get_db_connection()
-    if not conn:
-        return []
-    
-    cursor = conn.cursor()
-    cursor.execute("SHOW TABLES")
-    tables: List[str] = [table[0] for table in cursor.fetchall()]
-    cursor.close()
-    
-    return tables
+    return schema_catalog.table_names()
 
+@traced
 def get_table_schema_and_sample(table_name: str) -> str:
     """
     Given the table name, return schema and top 3 rows as string.
@@ -30,26 +44,16 @@ def get_table_schema_and_sample(table_name: str) -> str:
     Returns:
         str: Table schema and top 3 rows
     """
-    conn: Optional[MySQLConnection] = get_db_connection()
-    if not conn:
-        return ""
+    table, error = resolve_table(table_name)
+    if not table:
+        return error
     
-    cursor = conn.cursor(dictionary=True)
-    
-    # Get table schema
-    cursor.execute(f"DESCRIBE {table_name}")
-    schema: List[Dict[str, Any]] = cursor.fetchall()
-    
-    # Get top 3 rows
-    cursor.execute(f"SELECT * FROM {table_name} LIMIT 3")
-    rows: List[Dict[str, Any]] = cursor.fetchall()
-    
-    cursor.close()
+    rows: List[Dict[str, Any]] = schema_catalog.sample_rows(table.name)
     
     # Format the output
-    output: str = f"Table: {table_name}\n\nSchema:\n"
-    for col in schema:
-        output += f"{col['Field']} ({col['Type']})\n"
+    output: str = f"Table: {table.name}\n\nSchema:\n"
+    for col in table.columns:
+        output += f"{col.name} ({col.type})\n"
     
     output += "\nSample Data:\n"
     for row in rows:
@@ -57,6 +61,117 @@ def get_table_schema_and_sample(table_name: str) -> str:
     
     return output
 
+@traced
+def describe_tables(table_names: List[str]) -> str:
+    """
+    Given a list of table names, return the schema, sample rows and the foreign keys between them in one call.
+    Prefer this over calling get_table_schema_and_sample once per table when exploring a join.
+    
+    Args:
+        table_names (List[str]): Names of the tables
+    
+    Returns:
+        str: Schema and top 3 rows of every table, followed by their relationships
+    """
+    snapshot = schema_catalog.snapshot()
+    if snapshot is None:
+        return "Database connection error"
+    
+    tables: List[TableInfo] = []
+    unknown: List[str] = []
+    for name in table_names:
+        table = schema_catalog.get_table(name)
+        if table is None:
+            unknown.append(name)
+        elif table not in tables:
+            tables.append(table)
+    
+    samples: Dict[str, List[Dict[str, Any]]] = schema_catalog.sample_rows_many([table.name for table in tables])
+    
+    sections: List[str] = []
+    for table in tables:
+        lines: List[str] = [f"Table: {table.name}", "Schema:"]
+        for col in table.columns:
+            key = f" {col.key}" if col.key else ""
+            lines.append(f"{col.name} ({col.type}){key}")
+        lines.append("Sample Data:")
+        lines.append(COLUMN_SEPARATOR.join(table.column_names))
+        for row in samples.get(table.name, []):
+            lines.append(COLUMN_SEPARATOR.join(format_value(value) for value in row.values()))
+        sections.append("\n".join(lines))
+    
+    names = {table.name for table in tables}
+    relationships: List[str] = [
+        f"{fk.table}.{fk.column} -> {fk.referenced_table}.{fk.referenced_column}"
+        for fk in snapshot.foreign_keys if fk.table in names and fk.referenced_table in names
+    ]
+    sections.append("Relationships between these tables:\n" + ("\n".join(relationships) or "none"))
+    
+    if unknown:
+        sections.append(f"Unknown tables: {', '.join(unknown)}. Use list_tables to see the available tables.")
+    
+    return "\n\n".join(sections) + "\n"
+
+@traced
+def find_relevant_tables(question: str, top_k: int = DEFAULT_TOP_K) -> str:
+    """
+    Given a natural language question, return the schemas of the tables most relevant to it, the tables needed
+    to join them and the foreign keys between them. Use this first instead of exploring the tables one by one.
+    
+    Args:
+        question (str): Natural language question of the user
+        top_k (int): Number of relevant tables to return, not counting the tables that join them
+    
+    Returns:
+        str: Schemas of the relevant tables, most relevant first, followed by their relationships
+    """
+    snapshot = schema_catalog.snapshot()
+    if snapshot is None:
+        return "Database connection error"
+    
+    tables, bridges = schema_index.relevant_tables(question, top_k)
+    if not tables:
+        return "No table matches the question. Use list_tables to see the available tables."
+    
+    def describe(name: str) -> str:
+        columns = ", ".join(f"{col.name} {col.type}" + (f" {col.key}" if col.key else "")
+                            for col in snapshot.tables[name].columns)
+        return f"{name}({columns})"
+    
+    output: str = "Relevant tables, most relevant first:\n"
+    output += "".join(describe(name) + "\n" for name in tables)
+    if bridges:
+        output += "\nTables joining them:\n"
+        output += "".join(describe(name) + "\n" for name in bridges)
+    
+    names = set(tables) | set(bridges)
+    relationships: List[str] = [
+        f"{fk.table}.{fk.column} -> {fk.referenced_table}.{fk.referenced_column}"
+        for fk in snapshot.foreign_keys if fk.table in names and fk.referenced_table in names
+    ]
+    output += "\nRelationships between these tables:\n" + ("\n".join(relationships) or "none") + "\n"
+    return output
+
+def _validation_issues(query: str) -> Optional[List[ValidationIssue]]:
+    snapshot = schema_catalog.snapshot()
+    if snapshot is None:
+        return None
+    
+    issues: List[ValidationIssue] = validate_sql(query, snapshot)
+    if issues or not VALIDATE_WITH_EXPLAIN:
+        return issues
+    
+    with pooled_connection() as conn:
+        if not conn:
+            return None
+    
+        try:
+            nl2sql.db_backend.explain(conn, query)
+            return []
+        except DatabaseError as e:
+            return [ValidationIssue("server", str(e))]
+
+@traced
 def validate_sql_query(query: str) -> bool:
     """
     Validate if the SQL query is valid.
@@ -67,23 +182,85 @@ def validate_sql_query(query: str) -> bool:
     Returns:
         bool: True if the query is valid, False otherwise
     """
-    conn: Optional[MySQLConnection] = get_db_connection()
-    if not conn:
-        return False
-    
-    cursor = conn.cursor()
-    try:
-        cursor.execute(f"EXPLAIN {query}")
-        cursor.fetchall()
-        cursor.close()
-        return True
-    except Error:
-        cursor.close()
-        return False
+    issues: Optional[List[ValidationIssue]] = _validation_issues(query)
+    return issues is not None and not issues
 
+@traced
+def check_sql_query(query: str) -> str:
+    """
+    Check the SQL query against the database schema without running it and explain any problems,
+    such as syntax errors, unknown tables or columns and ambiguous column references.
+    
+    Args:
+        query (str): SQL query to check
+    
+    Returns:
+        str: "Query is valid." or the list of problems found
+    """
+    issues: Optional[List[ValidationIssue]] = _validation_issues(query)
+    if issues is None:
+        return "Database connection error"
+    if not issues:
+        return "Query is valid."
+    
+    output: str = "Query is invalid:\n"
+    for issue in issues:
+        output += f"- {issue}\n"
+    return output
+
+@traced
+def explain_sql_query(query: str, analyze: bool = False) -> str:
+    """
+    Show how the database executes a SELECT query without returning its rows: the plan tree with the access type
+    of every table (full scan, index lookup, ...), the keys used, estimated rows and sort or temporary table markers,
+    followed by index suggestions. With analyze=True the query is run to report actual rows as well.
+    Use this to find out why a query is slow and rewrite it before running it.
+    
+    Args:
+        query (str): SELECT query to explain
+        analyze (bool): Run the query (EXPLAIN ANALYZE) to compare estimated with actual rows
+    
+    Returns:
+        str: Plan summary and index suggestions in text format
+    """
+    if is_write(normalize_sql(query)):
+        return "Only SELECT queries can be explained."
+    snapshot = schema_catalog.snapshot()
+    if snapshot is None:
+        return "Database connection error"
+    
+    with pooled_connection() as conn:
+        if not conn:
+            return "Database connection error"
+    
+        notes: str = ""
+        timeout: Optional[float] = None
+        try:
+            if analyze:
+                # Analyzing runs the query, so it is subject to the same guardrails as run_sql_query.
+                guarded: GuardedQuery = guard_query(nl2sql.db_backend, conn, query)
+                timeout = guarded.timeout
+                if guarded.rejection:
+                    analyze = False
+                    notes = f"Not analyzed. {guarded.rejection}\n"
+                else:
+                    query = guarded.query
+                    notes = guarded.report()
+            plan = nl2sql.db_backend.explain_plan(conn, query, analyze=analyze, timeout=timeout)
+        except QueryTimeoutError:
+            return throttled_message(timeout)
+        except DatabaseError as e:
+            return f"Error explaining query: {str(e)}"
+    
+    return render_plan(query, plan, snapshot) + notes
+
+@traced
 def run_sql_query(query: str) -> str:
     """
     Run SQL query and return the result in text format.
+    Output is limited to RESULT_MAX_ROWS rows and RESULT_MAX_BYTES bytes, with a footer giving the total row count.
+    SELECTs without a LIMIT get one, queries estimated to examine too many rows are limited or rejected,
+    and every query has a time limit; the reason is reported when a guardrail changed or stopped the query.
     
     Args:
         query (str): SQL query to execute
@@ -91,29 +268,49 @@ def run_sql_query(query: str) -> str:
     Returns:
         str: Query results in text format
     """
-    conn: Optional[MySQLConnection] = get_db_connection()
-    if not conn:
-        return "Database connection error"
+    normalized: str = normalize_sql(query)
+    snapshot = schema_catalog.snapshot()
+    tables = referenced_tables(normalized, snapshot.tables if snapshot else [])
+    cache_key: Optional[str] = f"{schema_catalog.generation}:{normalized}" if is_cacheable(normalized) else None
+    if cache_key:
+        cached: Optional[str] = query_cache.get(cache_key)
+        count("query_cache_hits" if cached is not None else "query_cache_misses")
+        if cached is not None:
+            return cached
     
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute(query)
-        results: List[Dict[str, Any]] = cursor.fetchall()
-        cursor.close()
-        
-        if not results:
-            return "Query executed successfully, but returned no results."
-        
-        # Format the output
-        output: str = "Query Results:\n"
-        for row in results:
-            output += str(row) + "\n"
-        
-        return output
-    except Error as e:
-        cursor.close()
-        return f"Error executing query: {str(e)}"
+    with pooled_connection() as conn:
+        if not conn:
+            return "Database connection error"
+    
+        guarded: Optional[GuardedQuery] = None
+        try:
+            guarded = guard_query(nl2sql.db_backend, conn, query)
+            if guarded.rejection:
+                return guarded.rejection
+            # Rows are streamed from the backend and never held in memory all at once.
+            with nl2sql.db_backend.execute(conn, guarded.query, timeout=guarded.timeout) as result:
+                if result is None:
+                    return "Query executed successfully, but returned no results."
+                output: str = render_result(result.column_names, guarded.count(result.rows),
+                                            max_rows=RESULT_MAX_ROWS, max_bytes=RESULT_MAX_BYTES,
+                                            row_limit=guarded.row_limit)
+            annotate(rows=guarded.rows_returned)
+            output += guarded.report()
+            if cache_key:
+                query_cache.put(cache_key, output, tables)
+            return output
+        except QueryTimeoutError:
+            return throttled_message(guarded.timeout if guarded else None)
+        except DatabaseError as e:
+            return f"Error executing query: {str(e)}"
+        finally:
+            if is_write(normalized):
+                # Invalidate everything when the written tables cannot be identified.
+                query_cache.invalidate_tables(tables or None)
+            if DDL_PATTERN.match(query):
+                schema_catalog.invalidate()
 
+@traced
 def get_table_relationships() -> str:
     """
     Get table relationships based on foreign keys.
@@ -121,83 +318,75 @@ def get_table_relationships() -> str:
     Returns:
         str: Table relationships in text format
     """
-    conn: Optional[MySQLConnection] = get_db_connection()
-    if not conn:
+    if schema_catalog.snapshot() is None:
         return "Database connection error"
     
-    cursor = conn.cursor(dictionary=True)
-    query: str = """
-    SELECT 
-        TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
-    FROM
-        INFORMATION_SCHEMA.KEY_COLUMN_USAGE
-    WHERE
-        REFERENCED_TABLE_SCHEMA = DATABASE()
-        AND REFERENCED_TABLE_NAME IS NOT NULL
-    ORDER BY
-        TABLE_NAME, COLUMN_NAME;
-    """
-    
-    try:
-        cursor.execute(query)
-        results: List[Dict[str, Any]] = cursor.fetchall()
-        cursor.close()
-        
-        output: str = "Table Relationships:\n"
-        for row in results:
-            output += f"{row['TABLE_NAME']}.{row['COLUMN_NAME']} -> {row['REFERENCED_TABLE_NAME']}.{row['REFERENCED_COLUMN_NAME']}\n"
-        
-        return output
-    except Error as e:
-        cursor.close()
-        return f"Error retrieving table relationships: {str(e)}"
+    output: str = "Table Relationships:\n"
+    for fk in schema_catalog.foreign_keys():
+        output += f"{fk.table}.{fk.column} -> {fk.referenced_table}.{fk.referenced_column}\n"
+    
+    return output
 
-def get_table_statistics(table_name: str) -> str:
+@traced
+def get_table_statistics(table_name: str, exact_count: bool = False) -> str:
     """
-    Get statistics for a given table.
+    Get statistics for a given table: estimated row count, data and index size, columns,
+    indexes with their cardinality and value distributions of columns that have histograms.
+    Use this to judge the selectivity of filters and joins. The row count is an estimate unless
+    exact_count is True, which runs a slow COUNT(*) over the whole table.
     
     Args:
         table_name (str): Name of the table
+        exact_count (bool): Run an exact COUNT(*) instead of using the row estimate
     
     Returns:
         str: Table statistics in text format
     """
-    conn: Optional[MySQLConnection] = get_db_connection()
-    if not conn:
-        return "Database connection error"
+    table, error = resolve_table(table_name)
+    if not table:
+        return error
     
-    cursor = conn.cursor(dictionary=True)
-    queries: List[str] = [
-        f"SELECT COUNT(*) as row_count FROM {table_name}",
-        f"SHOW COLUMNS FROM {table_name}",
-        f"SHOW INDEX FROM {table_name}"
-    ]
+    output: str = f"Statistics for table '{table.name}':\n\n"
+    
+    # Row count
+    if exact_count:
+        with pooled_connection() as conn:
+            if not conn:
+                return "Database connection error"
+    
+            try:
+                row_count: int = nl2sql.db_backend.count_rows(conn, table.name)
+            except DatabaseError as e:
+                return f"Error retrieving table statistics: {str(e)}"
+        output += f"Total rows: {row_count}\n"
+    elif table.row_estimate is not None:
+        output += f"Total rows: ~{table.row_estimate} (estimate)\n"
+    else:
+        output += "Total rows: unknown (no estimate for this table type, use exact_count=True)\n"
+    if table.data_length is not None:
+        output += f"Data size: {format_bytes(table.data_length)}, index size: {format_bytes(table.index_length)}\n"
+    output += "\n"
     
-    try:
-        output: str = f"Statistics for table '{table_name}':\n\n"
-        
-        # Row count
-        cursor.execute(queries[0])
-        row_count: int = cursor.fetchone()['row_count']
-        output += f"Total rows: {row_count}\n\n"
-        
-        # Columns
-        cursor.execute(queries[1])
-        columns: List[Dict[str, Any]] = cursor.fetchall()
-        output += "Columns:\n"
-        for col in columns:
-            output += f"- {col['Field']} ({col['Type']})\n"
-        output += "\n"
-        
-        # Indexes
-        cursor.execute(queries[2])
-        indexes: List[Dict[str, Any]] = cursor.fetchall()
-        output += "Indexes:\n"
-        for idx in indexes:
-            output += f"- {idx['Key_name']} ({idx['Column_name']})\n"
-        
-        cursor.close()
-        return output
-    except Error as e:
-        cursor.close()
-        return f"Error retrieving table statistics: {str(e)}"
+    # Columns
+    output += "Columns:\n"
+    for col in table.columns:
+        output += f"- {col.name} ({col.type})\n"
+    output += "\n"
+    
+    # Indexes
+    output += "Indexes:\n"
+    for idx in table.indexes:
+        details: str = "unique" if not idx.non_unique else "non-unique"
+        if idx.cardinality is not None:
+            details += f", cardinality {idx.cardinality}"
+            if table.row_estimate:
+                details += f", selectivity {min(idx.cardinality / table.row_estimate, 1.0):.2f}"
+        output += f"- {idx.name} ({idx.column}) {details}\n"
+    
+    # Value distributions
+    if table.histograms:
+        output += "\nValue distributions:\n"
+        for column_name, histogram in table.histograms.items():
+            output += f"- {column_name}: {summarize_histogram(histogram)}\n"
+    
+    return output
@@ -0,0 +1,280 @@
+"""
+Tracing and latency instrumentation of the nl2sql tools.
+
+Every tool in `nl2sql.tools` is wrapped with `traced`. A call records a span with its wall time,
+the part of it spent in the database driver, the rest (catalog lookups, validation, formatting),
+the size of its output, the rows it returned and counters such as cache hits. Spans are aggregated
+per session into latency summaries and histograms that can be dumped as JSON:
+
+    with tracer.session("load-test") as session:
+        ...  # run the agent
+    session.dump("trace.json")
+
+Finished spans are also passed to exporters. `use_opentelemetry` adds one that mirrors them as
+OpenTelemetry spans, if the opentelemetry package is installed.
+"""
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Upper bounds of the latency histogram buckets in milliseconds; the last bucket is unbounded.
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+# Durations kept per tool for percentiles; beyond this, every other sample is dropped.
+MAX_SAMPLES = 10_000
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("nl2sql_span", default=None)
+_current_session: contextvars.ContextVar[Optional["Session"]] = contextvars.ContextVar("nl2sql_session", default=None)
+_database_depth: contextvars.ContextVar[int] = contextvars.ContextVar("nl2sql_database_depth", default=0)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_time: float  # seconds since the epoch
+    duration: float = 0.0  # seconds
+    database_time: float = 0.0  # seconds spent in database driver calls
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    counters: Dict[str, int] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def other_time(self) -> float:
+        """Time outside the database: catalog, validation and formatting."""
+        return max(self.duration - self.database_time, 0.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["other_time"] = self.other_time
+        return data
+
+
+class ToolStats:
+    """Aggregated spans of one tool."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.database_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.histogram = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        self.samples: List[float] = []
+        self._stride = 1
+
+    def add(self, span: Span) -> None:
+        self.calls += 1
+        self.errors += span.error is not None
+        self.total_time += span.duration
+        self.database_time += span.database_time
+        self.max_time = max(self.max_time, span.duration)
+        self.rows += span.attributes.get("rows", 0)
+        self.bytes += span.attributes.get("bytes", 0)
+        for name, value in span.counters.items():
+            self.counters[name] += value
+        milliseconds = span.duration * 1000
+        self.histogram[next((i for i, bound in enumerate(HISTOGRAM_BUCKETS_MS) if milliseconds <= bound),
+                            len(HISTOGRAM_BUCKETS_MS))] += 1
+        if self.calls % self._stride == 0:
+            self.samples.append(span.duration)
+            if len(self.samples) > MAX_SAMPLES:
+                self.samples = self.samples[::2]
+                self._stride *= 2
+
+    def _percentile(self, fraction: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        labels = [f"<={bound}ms" for bound in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]}ms"]
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": self.total_time * 1000,
+            "mean_ms": self.total_time * 1000 / self.calls if self.calls else 0.0,
+            "p50_ms": self._percentile(0.5) * 1000,
+            "p95_ms": self._percentile(0.95) * 1000,
+            "max_ms": self.max_time * 1000,
+            "database_ms": self.database_time * 1000,
+            "other_ms": (self.total_time - self.database_time) * 1000,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "counters": dict(self.counters),
+            "histogram": dict(zip(labels, self.histogram)),
+        }
+
+
+class Session:
+    """Spans of one agent session, aggregated per tool."""
+
+    def __init__(self, name: str, keep_spans: bool = True) -> None:
+        self.name = name
+        self.keep_spans = keep_spans
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+        self.tools: Dict[str, ToolStats] = defaultdict(ToolStats)
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.tools[span.name].add(span)
+            if self.keep_spans:
+                self.spans.append(span)
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-tool latency summary, tools with the most total time first."""
+        with self._lock:
+            tools = {name: stats.summary() for name, stats in self.tools.items()}
+        total = sum(tool["total_ms"] for tool in tools.values())
+        for tool in tools.values():
+            tool["share_of_time"] = tool["total_ms"] / total if total else 0.0
+        return {
+            "session": self.name,
+            "started_at": self.started_at,
+            "total_ms": total,
+            "tools": dict(sorted(tools.items(), key=lambda item: -item[1]["total_ms"])),
+        }
+
+    def dump(self, path: str, include_spans: bool = False) -> None:
+        """Write the summary, and optionally every span, to a JSON file."""
+        data = self.summary()
+        if include_spans:
+            with self._lock:
+                data["spans"] = [span.to_dict() for span in self.spans]
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, default=str)
+
+
+class Tracer:
+    """
+    Records spans of traced calls into the current session, or the default session outside of one.
+
+    Set `enabled` to False to turn instrumentation into a plain function call.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self.default_session = Session("default", keep_spans=False)
+        self.exporters: List[Callable[[Span], None]] = []
+
+    @contextmanager
+    def session(self, name: str, keep_spans: bool = True) -> Iterator[Session]:
+        """Collect the spans of the calls made inside the block, including from async tools, into a new session."""
+        session = Session(name, keep_spans=keep_spans)
+        token = _current_session.set(session)
+        try:
+            yield session
+        finally:
+            _current_session.reset(token)
+
+    def current_session(self) -> Session:
+        return _current_session.get() or self.default_session
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        """Record the block as a span, nested under the current span if there is one."""
+        if not self.enabled:
+            yield None
+            return
+        parent = _current_span.get()
+        span = Span(name=name, trace_id=parent.trace_id if parent else secrets.token_hex(16),
+                    span_id=secrets.token_hex(8), parent_id=parent.span_id if parent else None,
+                    start_time=time.time(), attributes=attributes)
+        token = _current_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            _current_span.reset(token)
+            if parent is not None:
+                parent.database_time += span.database_time
+            self.current_session().add(span)
+            for exporter in self.exporters:
+                exporter(span)
+
+    def use_opentelemetry(self, tracer_provider: Any = None) -> None:
+        """Mirror finished spans as OpenTelemetry spans; requires the opentelemetry-api package."""
+        # Imported here so opentelemetry is only required when it is used.
+        from opentelemetry import trace
+
+        otel_tracer = trace.get_tracer("nl2sql", tracer_provider=tracer_provider)
+
+        def export(span: Span) -> None:
+            start = int(span.start_time * 1e9)
+            otel_span = otel_tracer.start_span(span.name, start_time=start)
+            otel_span.set_attribute("nl2sql.database_ms", span.database_time * 1000)
+            otel_span.set_attribute("nl2sql.other_ms", span.other_time * 1000)
+            for key, value in {**span.attributes, **span.counters}.items():
+                otel_span.set_attribute(f"nl2sql.{key}", value)
+            if span.error:
+                otel_span.set_status(trace.Status(trace.StatusCode.ERROR, span.error))
+            otel_span.end(end_time=start + int(span.duration * 1e9))
+
+        self.exporters.append(export)
+
+
+tracer = Tracer()
+
+
+def traced(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Record every call of a tool as a span named after it, with the size of its result as text."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not tracer.enabled:
+            return fn(*args, **kwargs)
+        with tracer.span(fn.__name__) as span:
+            result = fn(*args, **kwargs)
+            span.attributes["bytes"] = len(str(result).encode())
+            return result
+    return wrapper
+
+
+@contextmanager
+def database_time() -> Iterator[None]:
+    """Count the block as database time of the current span; nested blocks are counted once."""
+    span = _current_span.get()
+    if span is None:
+        yield
+        return
+    depth = _database_depth.get()
+    token = _database_depth.set(depth + 1)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _database_depth.reset(token)
+        if depth == 0:
+            span.database_time += time.perf_counter() - start
+
+
+def annotate(**attributes: Any) -> None:
+    """Set attributes, such as the rows returned, on the current span."""
+    span = _current_span.get()
+    if span is not None:
+        span.attributes.update(attributes)
+
+
+def count(name: str, value: int = 1) -> None:
+    """Increment a counter, such as cache hits, on the current span."""
+    span = _current_span.get()
+    if span is not None:
+        span.counters[name] = span.counters.get(name, 0) + value
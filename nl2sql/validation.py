@@ -0,0 +1,205 @@
+import difflib
+from dataclasses import dataclass
+from typing import List, Optional, Set
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.dialects.dialect import Dialect
+from sqlglot.errors import ParseError
+from sqlglot.optimizer.scope import Scope, traverse_scope
+from sqlglot.tokens import Token, TokenType
+
+from nl2sql.catalog import CatalogSnapshot
+
+DIALECT = "mysql"
+
+STATEMENT_TYPES = (exp.Query, exp.DML, exp.DDL, exp.Update, exp.Alter, exp.Drop, exp.Show, exp.Describe,
+                   exp.Set, exp.Use, exp.Transaction, exp.Commit, exp.Rollback, exp.Command)
+# Suggested for a misspelled first word of a statement.
+STATEMENT_KEYWORDS = ["SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "ALTER", "DROP", "SHOW",
+                      "DESCRIBE", "EXPLAIN", "SET", "USE"]
+
+
+@dataclass(frozen=True)
+class ValidationIssue:
+    code: str  # one of: syntax, unknown_table, unknown_alias, unknown_column, ambiguous_column, server
+    message: str
+
+    def __str__(self) -> str:
+        return self.message
+
+
+def _suggest(name: str, candidates: List[str]) -> str:
+    matches = difflib.get_close_matches(name.lower(), [c.lower() for c in candidates], n=3, cutoff=0.6)
+    return f" Did you mean: {', '.join(matches)}?" if matches else ""
+
+
+class _Resolver:
+    """Resolves table and column references of one parsed statement against a catalog snapshot."""
+
+    def __init__(self, snapshot: CatalogSnapshot) -> None:
+        self.tables = {name.lower(): table for name, table in snapshot.tables.items()}
+        self.issues: List[ValidationIssue] = []
+
+    def report(self, code: str, message: str) -> None:
+        issue = ValidationIssue(code, message)
+        if issue not in self.issues:
+            self.issues.append(issue)
+
+    def source_columns(self, source) -> Optional[Set[str]]:
+        """Lower-cased output columns of a FROM source, or None if they cannot be known."""
+        if isinstance(source, exp.Table):
+            table = self.tables.get(source.name.lower())
+            return {name.lower() for name in table.column_names} if table else None
+        if isinstance(source, Scope):
+            selects = source.expression.named_selects
+            if any(s == "*" for s in selects) or source.expression.is_star:
+                return None
+            return {s.lower() for s in selects}
+        return None
+
+    def check_scope(self, scope: Scope) -> None:
+        sources = scope.selected_sources
+        for alias, (_, source) in sources.items():
+            if isinstance(source, exp.Table) and source.name.lower() not in self.tables:
+                self.report("unknown_table",
+                            f"Unknown table '{source.name}'.{_suggest(source.name, list(self.tables))}")
+
+        for column in scope.columns:
+            if isinstance(column.this, exp.Star):
+                if column.table and self.find_source(scope, column.table) is None:
+                    self.report("unknown_alias", f"Unknown table or alias '{column.table}' in '{column.sql(DIALECT)}'.")
+                continue
+            if column.table:
+                self.check_qualified(scope, column)
+            else:
+                self.check_unqualified(scope, column)
+
+    def find_source(self, scope: Optional[Scope], alias: str):
+        # Outer scopes are searched too, for correlated subqueries.
+        while scope is not None:
+            for name, (_, source) in scope.selected_sources.items():
+                if name.lower() == alias.lower():
+                    return source
+            scope = scope.parent
+        return None
+
+    def check_qualified(self, scope: Scope, column: exp.Column) -> None:
+        source = self.find_source(scope, column.table)
+        if source is None:
+            aliases = list(scope.selected_sources)
+            self.report("unknown_alias",
+                        f"Unknown table or alias '{column.table}' in '{column.sql(DIALECT)}'. "
+                        f"Tables in scope: {', '.join(aliases) or 'none'}.")
+            return
+        columns = self.source_columns(source)
+        if columns is not None and column.name.lower() not in columns:
+            table_name = source.name if isinstance(source, exp.Table) else column.table
+            self.report("unknown_column",
+                        f"Unknown column '{column.name}' in table '{table_name}'."
+                        f"{_suggest(column.name, sorted(columns))}")
+
+    def check_unqualified(self, scope: Scope, column: exp.Column) -> None:
+        name = column.name.lower()
+        current: Optional[Scope] = scope
+        while current is not None:
+            matches: List[str] = []
+            unknown_source = False
+            for alias, (_, source) in current.selected_sources.items():
+                columns = self.source_columns(source)
+                if columns is None:
+                    unknown_source = True
+                elif name in columns:
+                    matches.append(alias)
+
+            if len(matches) > 1 and name not in self.using_columns(current):
+                self.report("ambiguous_column",
+                            f"Column '{column.name}' is ambiguous, it exists in: {', '.join(matches)}. "
+                            "Qualify it with a table alias.")
+                return
+            if matches or unknown_source:
+                return
+            # MySQL allows select aliases in GROUP BY / HAVING / ORDER BY.
+            if isinstance(current.expression, exp.Select) and name in {
+                    e.alias.lower() for e in current.expression.expressions if isinstance(e, exp.Alias)}:
+                return
+            current = current.parent
+
+        candidates: List[str] = []
+        for _, (_, source) in scope.selected_sources.items():
+            candidates.extend(self.source_columns(source) or [])
+        self.report("unknown_column", f"Unknown column '{column.name}'.{_suggest(column.name, candidates)}")
+
+    @staticmethod
+    def using_columns(scope: Scope) -> Set[str]:
+        names: Set[str] = set()
+        for join in scope.expression.args.get("joins") or []:
+            for identifier in join.args.get("using") or []:
+                names.add(identifier.name.lower())
+        return names
+
+
+def _syntax_error(line: Optional[int], col: Optional[int], description: str) -> ValidationIssue:
+    location = f" at line {line}, column {col}" if line else ""
+    return ValidationIssue("syntax", f"Syntax error{location}: {description}")
+
+
+def _statement_starts(query: str) -> List[Optional[Token]]:
+    """First token of every statement, in the order of sqlglot.parse (None for an empty statement)."""
+    chunks: List[List[Token]] = [[]]
+    tokens = Dialect.get_or_raise(DIALECT).tokenize(query)
+    for i, token in enumerate(tokens):
+        if token.token_type == TokenType.SEMICOLON:
+            if i < len(tokens) - 1:
+                chunks.append([])
+        else:
+            chunks[-1].append(token)
+    return [chunk[0] if chunk else None for chunk in chunks]
+
+
+def validate_sql(query: str, snapshot: CatalogSnapshot) -> List[ValidationIssue]:
+    """
+    Validate a SQL statement offline against a schema snapshot, without a database round-trip.
+
+    The statement is parsed with the MySQL dialect and every table and column reference is
+    resolved through its query scopes (CTEs, derived tables, correlated subqueries).
+
+    Args:
+        query (str): SQL statement
+        snapshot (CatalogSnapshot): Schema snapshot from the catalog
+
+    Returns:
+        List[ValidationIssue]: Problems found, empty if the statement looks valid
+    """
+    try:
+        parsed = sqlglot.parse(query, read=DIALECT)
+    except ParseError as e:
+        error = e.errors[0] if e.errors else {}
+        return [_syntax_error(error.get("line"), error.get("col"), error.get("description", str(e)))]
+
+    statements = [s for s in parsed if s is not None]
+    if not statements:
+        return [ValidationIssue("syntax", "Empty statement.")]
+
+    resolver = _Resolver(snapshot)
+    starts = _statement_starts(query)
+    for position, statement in enumerate(parsed):
+        if statement is None:
+            continue
+        if not isinstance(statement, STATEMENT_TYPES):
+            # A misspelled keyword, e.g. "SELEC * FRM film", can still parse as an expression.
+            start = starts[position] if len(starts) == len(parsed) else None
+            if start is None:
+                resolver.issues.append(_syntax_error(None, None, f"unrecognized statement "
+                                                                 f"'{statement.sql(DIALECT)[:50]}'."))
+            else:
+                resolver.issues.append(_syntax_error(
+                    start.line, start.col, f"'{start.text}' does not start a statement."
+                                           f"{_suggest(start.text, STATEMENT_KEYWORDS)}"))
+            continue
+        if not isinstance(statement, exp.Query):
+            # SHOW / DESCRIBE / DML and statements sqlglot keeps as raw commands are not resolved offline.
+            continue
+        for scope in traverse_scope(statement):
+            resolver.check_scope(scope)
+    return resolver.issues